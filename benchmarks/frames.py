@@ -0,0 +1,118 @@
+"""
+Benchmark reading large response frames from a socket.
+
+A local socket pair stands in for the Fishbowl server: a writer thread sends
+length-prefixed ``LightPartListRs`` frames of increasing size, and the
+:cls:`fishbowl.api.Fishbowl` frame reader reads and parses them. The old
+byte-at-a-time reader is included for comparison on the smaller frames, and
+the streaming :cls:`fishbowl.api.ResponseStream` path is measured alongside
+the buffered one.
+
+Run with::
+
+    python benchmarks/frames.py
+"""
+from __future__ import print_function, unicode_literals
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lxml import etree  # noqa: E402
+
+from fishbowl.api import Fishbowl, ResponseStream  # noqa: E402
+
+PART = (
+    '<LightPart><PartID>{0}</PartID><Num>P{0:07d}</Num>'
+    '<Description>Caf\xe9 part number {0}</Description><UOMID>1</UOMID>'
+    '<TypeID>10</TypeID><ActiveFlag>true</ActiveFlag></LightPart>')
+
+SIZES_MB = (1, 5, 20)
+LEGACY_MAX_MB = 1
+
+
+def make_frame(size_mb):
+    parts = []
+    total = 0
+    index = 0
+    while total < size_mb * 1024 * 1024:
+        part = PART.format(index)
+        parts.append(part)
+        total += len(part)
+        index += 1
+    xml = (
+        '<FbiXml><FbiMsgsRs statusCode="1000">'
+        '<LightPartListRs statusCode="1000">{}</LightPartListRs>'
+        '</FbiMsgsRs></FbiXml>').format(''.join(parts)).encode('latin-1')
+    return struct.pack('>L', len(xml)) + xml
+
+
+def legacy_receive(stream):
+    # The previous implementation, kept here for comparison.
+    length = struct.unpack('>L', stream.recv(4))[0]
+    response = bytearray()
+    while len(response) < length:
+        response.extend(stream.recv(1))
+    return etree.fromstring(response.decode('latin-1'))
+
+
+def new_receive(fishbowl):
+    root = etree.fromstring(
+        fishbowl.receive_message(), fishbowl.make_parser())
+    for node in root.iter('LightPart'):
+        node.findtext('Num')
+
+
+def stream_receive(fishbowl):
+    stream = ResponseStream(
+        fishbowl, ['LightPart'], response_node_name='LightPartListRs')
+    for node in stream:
+        node.findtext('Num')
+
+
+def run(size_mb, legacy=False, streaming=False, repeat=3):
+    frame = make_frame(size_mb)
+    server, client = socket.socketpair()
+    client.settimeout(30)
+    fishbowl = Fishbowl()
+    fishbowl.stream = client
+    fishbowl._connected = True
+
+    def write():
+        for _ in range(repeat):
+            server.sendall(frame)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    start = time.time()
+    for _ in range(repeat):
+        if legacy:
+            legacy_receive(client)
+        elif streaming:
+            stream_receive(fishbowl)
+        else:
+            new_receive(fishbowl)
+    elapsed = time.time() - start
+    writer.join()
+    server.close()
+    client.close()
+    return len(frame) * repeat / (1024.0 * 1024) / elapsed
+
+
+def main():
+    print('{:>8}  {:>12}  {:>12}  {:>12}'.format(
+        'frame', 'legacy MB/s', 'buffer MB/s', 'stream MB/s'))
+    for size_mb in SIZES_MB:
+        legacy = '-'
+        if size_mb <= LEGACY_MAX_MB:
+            legacy = '{:.2f}'.format(run(size_mb, legacy=True, repeat=1))
+        print('{:>6}MB  {:>12}  {:>12.2f}  {:>12.2f}'.format(
+            size_mb, legacy, run(size_mb), run(size_mb, streaming=True)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark the public :cls:`fishbowl.api.Fishbowl` methods end to end.
+
+Each method runs over a real socket against a
+:cls:`fishbowl.fakeserver.FakeFishbowlServer` holding 1k, 10k and 100k records.
+Methods that load records are called once; methods that send one request
+per call (such as ``add_inventory``) are called once per record. The
+server's responses are warmed up first, so the times are of the client.
+With ``--metrics``, the time of each phase of the requests (see
+:mod:`fishbowl.metrics`) is printed after each size.
+
+Run with::
+
+    python benchmarks/methods.py [--sizes 1000,10000] [--latency 0.001]
+        [--only customers] [--metrics]
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fishbowl.api import Fishbowl  # noqa: E402
+from fishbowl.metrics import Metrics  # noqa: E402
+from fishbowl.fakeserver import FakeFishbowlServer  # noqa: E402
+
+SIZES = (1000, 10000, 100000)
+
+PARTS_SQL = 'SELECT ID, NUM, DESCRIPTION, STDCOST FROM PART'
+
+
+def adjustments(size):
+    return [('P{:07d}'.format(i), 1, 1, 10, 5) for i in range(1, size + 1)]
+
+
+def counts(size):
+    return [('P{:07d}'.format(i), 1, 1) for i in range(1, size + 1)]
+
+
+def each(func):
+    """
+    A case that calls ``func(fishbowl)`` once per record.
+    """
+    def run(fishbowl, size):
+        for _ in range(size):
+            func(fishbowl)
+        return size
+    run.calls = True
+    return run
+
+
+def batch(fishbowl, size):
+    for start in range(0, size, 100):
+        with fishbowl.batch() as requests:
+            for _ in range(min(100, size - start)):
+                requests.add('UOMRq', single=False)
+    return size
+
+
+# Each case returns the number of records (or calls) it handled.
+CASES = (
+    ('get_parts', lambda fb, size: len(fb.get_parts())),
+    ('get_uom_map', each(lambda fb: fb.get_uom_map())),
+    ('get_taxrates', each(lambda fb: fb.get_taxrates())),
+    ('get_po_list', lambda fb, size: sum(
+        1 for po in fb.get_po_list(None).iter('PO'))),
+    ('get_customers', lambda fb, size: len(fb.get_customers())),
+    ('get_customers (hydrated)',
+        lambda fb, size: len(fb.get_customers(lazy=False))),
+    ('get_customers_fast', lambda fb, size: len(fb.get_customers_fast())),
+    ('get_customers_fast (compact)',
+        lambda fb, size: len(fb.get_customers_fast(compact=True))),
+    ('get_products', lambda fb, size: len(fb.get_products())),
+    ('get_products (hydrated)',
+        lambda fb, size: len(fb.get_products(lazy=False))),
+    ('get_products_fast', lambda fb, size: len(fb.get_products_fast())),
+    ('get_products_fast (paged)',
+        lambda fb, size: len(fb.get_products_fast(page_size=5000))),
+    ('get_pricing_rules', lambda fb, size: sum(
+        len(rules) for rules in fb.get_pricing_rules().values())),
+    ('send_query', lambda fb, size: len(list(fb.send_query(PARTS_SQL)))),
+    ('iter_query (tuples)', lambda fb, size: sum(
+        1 for row in fb.iter_query(PARTS_SQL, tuples=True))),
+    ('query_columns', lambda fb, size: fb.query_columns(
+        PARTS_SQL, types={'ID': int, 'STDCOST': float}).row_count),
+    ('iter_query_pages', lambda fb, size: sum(
+        1 for row in fb.iter_query_pages(PARTS_SQL, page_size=5000))),
+    ('table_columns', each(lambda fb: fb.table_columns('PART'))),
+    ('send_request', each(lambda fb: fb.send_request(
+        'UOMRq', response_node_name='UOMRs', single=False))),
+    ('batch', batch),
+    ('add_inventory', each(lambda fb: fb.add_inventory(
+        'P0000001', 1, 1, 10, 5))),
+    ('add_inventory_many',
+        lambda fb, size: len(fb.add_inventory_many(adjustments(size)))),
+    ('cycle_inventory', each(lambda fb: fb.cycle_inventory(
+        'P0000001', 1, 1))),
+    ('cycle_inventory_many',
+        lambda fb, size: len(fb.cycle_inventory_many(counts(size)))),
+)
+
+
+def run_case(server, func, size, metrics=None):
+    fishbowl = server.connect(Fishbowl(metrics=metrics))
+    try:
+        start = time.time()
+        count = func(fishbowl, size)
+        elapsed = time.time() - start
+    finally:
+        fishbowl.close()
+    return count, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--sizes', default=','.join(str(size) for size in SIZES),
+        help='comma separated numbers of records')
+    parser.add_argument(
+        '--latency', type=float, default=0,
+        help='seconds the server waits before each response')
+    parser.add_argument(
+        '--only', default='', help='only run methods containing this text')
+    parser.add_argument(
+        '--metrics', action='store_true',
+        help='print the time of each phase of the requests')
+    args = parser.parse_args()
+    cases = [case for case in CASES if args.only in case[0]]
+    metrics = Metrics() if args.metrics else None
+    print('{:<30}  {:>7}  {:>9}  {:>11}  {:>12}'.format(
+        'method', 'records', 'total s', 'latency ms', 'records/s'))
+    for size in [int(size) for size in args.sizes.split(',')]:
+        with FakeFishbowlServer(records=size, latency=args.latency) as server:
+            for name, func in cases:
+                per_call = getattr(func, 'calls', False)
+                # A first run fills the server's response cache.
+                run_case(server, func, min(size, 10) if per_call else size)
+                count, elapsed = run_case(server, func, size, metrics)
+                calls = count if per_call else 1
+                print('{:<30}  {:>7}  {:>9.3f}  {:>11.3f}  {:>12.0f}'.format(
+                    name, size, elapsed, elapsed * 1000 / max(calls, 1),
+                    count / elapsed if elapsed else 0))
+        if metrics is not None:
+            print()
+            print(metrics.summary())
+            print()
+            metrics.reset()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark parsing Fishbowl objects from XML and from query rows.
+
+Each object is built from the XML fixtures used by the object tests, and
+products and parts from a query row like those of
+:meth:`fishbowl.api.Fishbowl.get_products_fast`. The time shown is per
+object.
+
+Run with::
+
+    python benchmarks/objects.py
+"""
+from __future__ import print_function, unicode_literals
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lxml import etree  # noqa: E402
+
+from fishbowl import objects  # noqa: E402
+
+FIXTURES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'fishbowl', 'tests', 'objects')
+
+PRODUCT_ROW = {
+    'ID': '10', 'PARTID': '20', 'NUM': 'B201', 'DESCRIPTION': 'Widget',
+    'PRICE': '12.50', 'UOMID': '1', 'ACTIVEFLAG': 'true',
+    'TAXABLEFLAG': 'true', 'KITFLAG': 'false', 'STANDARDCOST': '7.25',
+    'TypeID': '10',
+}
+
+CASES = (
+    ('Customer', objects.Customer, 'customer.xml'),
+    ('Part', objects.Part, 'part.xml'),
+    ('SalesOrder', objects.SalesOrder, 'so.xml'),
+    ('Product (row)', objects.Product, PRODUCT_ROW),
+    ('Part (row)', objects.Part, PRODUCT_ROW),
+)
+
+
+def load(source):
+    if isinstance(source, dict):
+        return source
+    with open(os.path.join(FIXTURES, source)) as xml_file:
+        return etree.fromstring(xml_file.read())
+
+
+def run(cls, data, number=2000, repeat=5):
+    timer = timeit.Timer(lambda: cls(data))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def main():
+    print('{:<16}  {:>12}'.format('object', 'us/object'))
+    for name, cls, source in CASES:
+        print('{:<16}  {:>12.1f}'.format(
+            name, run(cls, load(source)) * 1000000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Time a :cls:`fishbowl.api.Fishbowl` method against a recorded session.
+
+Record a session with a :cls:`fishbowl.replay.Recorder` (see
+:mod:`fishbowl.replay`), then replay it here, profiling the method with
+``--profile``. Replays run as fast as possible unless ``--speed`` is given.
+
+Run with::
+
+    python benchmarks/replay.py session.fbrec get_customers_fast
+        [--speed 1] [--repeat 3] [--profile]
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fishbowl.replay import ReplayArchive, ReplayFishbowl  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('archive', help='a recorded session')
+    parser.add_argument('method', help='the Fishbowl method to call')
+    parser.add_argument(
+        '--speed', type=float, default=None,
+        help='replay this many times faster than recorded')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument(
+        '--profile', action='store_true', help='profile the last run')
+    args = parser.parse_args()
+    exchanges = ReplayArchive.load(args.archive).exchanges
+    for run in range(args.repeat):
+        fishbowl = ReplayFishbowl(ReplayArchive(exchanges), speed=args.speed)
+        fishbowl.connect('replay', '')
+        method = getattr(fishbowl, args.method)
+        profile = None
+        if args.profile and run == args.repeat - 1:
+            profile = cProfile.Profile()
+            profile.enable()
+        start = time.time()
+        result = method()
+        elapsed = time.time() - start
+        if profile is not None:
+            profile.disable()
+        count = len(result) if hasattr(result, '__len__') else '-'
+        print('{}: {} results in {:.3f}s'.format(
+            args.method, count, elapsed))
+        fishbowl.close()
+    if profile is not None:
+        pstats.Stats(profile).sort_stats('cumulative').print_stats(25)
+
+
+if __name__ == '__main__':
+    main()
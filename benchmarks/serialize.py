@@ -0,0 +1,89 @@
+"""
+Benchmark building and sending request messages.
+
+Each request type is built and serialized from its cached template, and
+then also sent with :meth:`fishbowl.api.Fishbowl.write_message` over a local
+socket pair (a reader thread drains the other end). The lxml tree and
+pretty printed output used before templates are included for comparison.
+
+Run with::
+
+    python benchmarks/serialize.py
+"""
+from __future__ import print_function, unicode_literals
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lxml import etree  # noqa: E402
+
+from fishbowl import xmlrequests  # noqa: E402
+from fishbowl.api import Fishbowl, message_tag  # noqa: E402
+
+KEY = 'eCWMhC5n/E48OP7307qmZg=='
+COUNT = 20000
+
+CASES = (
+    ('AddInventory', 'AddInventoryRq', lambda: xmlrequests.AddInventory(
+        'B201', 5, 1, 50.0, 386, key=KEY)),
+    ('CycleCount', 'CycleCountRq', lambda: xmlrequests.CycleCount(
+        'B201', 12, 1, key=KEY)),
+    ('SimpleRequest', 'ExecuteQueryRq', lambda: xmlrequests.SimpleRequest(
+        'ExecuteQueryRq', {'Query': 'SELECT * FROM UOM'}, key=KEY)),
+)
+
+
+def tree_message(request_tag, request):
+    # The previous implementation, kept here for comparison: build an lxml
+    # tree, pretty print it, and parse it again to log the request tag.
+    tree = xmlrequests.Request(KEY)
+    el = tree.add_request_element(request_tag)
+    tree.add_elements(el, request.elements)
+    msg = etree.tostring(tree.el_root, pretty_print=True)
+    message_tag(msg)
+    return msg
+
+
+def rate(func, count=COUNT):
+    start = time.time()
+    for _ in range(count):
+        func()
+    return count / (time.time() - start)
+
+
+def send_rate(fishbowl, make_request, count=COUNT):
+    return rate(lambda: fishbowl.write_message(make_request()), count)
+
+
+def main():
+    server, client = socket.socketpair()
+    fishbowl = Fishbowl()
+    fishbowl.stream = client
+    fishbowl._connected = True
+
+    def drain():
+        while server.recv(65536):
+            pass
+
+    reader = threading.Thread(target=drain)
+    reader.daemon = True
+    reader.start()
+    print('{:<14}  {:>12}  {:>12}  {:>12}'.format(
+        'request', 'tree rq/s', 'build rq/s', 'send rq/s'))
+    for name, request_tag, make_request in CASES:
+        request = make_request()
+        print('{:<14}  {:>12.0f}  {:>12.0f}  {:>12.0f}'.format(
+            name,
+            rate(lambda: tree_message(request_tag, request)),
+            rate(lambda: make_request().request),
+            send_rate(fishbowl, make_request)))
+    client.close()
+    server.close()
+
+
+if __name__ == '__main__':
+    main()
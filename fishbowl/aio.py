@@ -0,0 +1,360 @@
+"""
+An asyncio client for the Fishbowl API (Python 3.5+).
+
+:cls:`AsyncFishbowl` speaks the same length-prefixed protocol as
+:cls:`fishbowl.api.Fishbowl` over asyncio streams, sharing its request
+builders and response parsers.
+"""
+import asyncio
+import functools
+import logging
+import struct
+
+from lxml import etree
+import six
+
+from . import xmlrequests, objects
+from .api import (
+    Fishbowl, FishbowlTimeoutError, FishbowlConnectionError,
+    PRICING_RULES_SQL, CUSTOMER_GROUP_PRICING_RULES_SQL,
+    QueryRows, check_status, find_response, log_adjustment, login_key,
+    encode_password, attach_uoms, build_products, process_pricing_rules,
+    build_address_map, build_customers, table_query, products_query)
+from .wirelog import format_payload, redact
+
+logger = logging.getLogger(__name__)
+
+
+def require_connected(func):
+    """
+    A decorator to wrap :cls:`AsyncFishbowl` coroutines that can only be
+    called after a connection to the API server has been made.
+    """
+
+    @functools.wraps(func)
+    async def dec(self, *args, **kwargs):
+        if not self.connected:
+            raise OSError('Not connected')
+        return await func(self, *args, **kwargs)
+
+    return dec
+
+
+class AsyncFishbowl:
+    """
+    Fishbowl API for asyncio.
+
+    Messages on one connection are sent one at a time; use several instances
+    to run requests concurrently.
+
+    Example usage::
+
+        fishbowl = AsyncFishbowl()
+        await fishbowl.connect(username='admin', password='admin')
+        parts = await fishbowl.get_parts()
+        await fishbowl.close()
+    """
+    host = Fishbowl.host
+    port = Fishbowl.port
+    encoding = Fishbowl.encoding
+    log_payload_size = Fishbowl.log_payload_size
+    make_parser = Fishbowl.make_parser
+
+    def __init__(self):
+        self._connected = False
+        self.timeout = 5
+        self._table_columns = {}
+
+    @property
+    def connected(self):
+        return self._connected
+
+    async def make_stream(self, timeout=5):
+        """
+        Create a connection to communicate with the API, returning a
+        ``(reader, writer)`` pair.
+        """
+        logger.info('Connecting to {}:{}'.format(self.host, self.port))
+        try:
+            return await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), timeout)
+        except asyncio.TimeoutError:
+            raise FishbowlConnectionError('Connection timeout')
+        except OSError as e:
+            raise FishbowlConnectionError(e.strerror or str(e))
+
+    async def connect(
+            self, username, password, host=None, port=None, timeout=5):
+        """
+        Open the stream and log in.
+        """
+        password = encode_password(password, self.encoding)
+
+        if self.connected:
+            await self.close()
+
+        if host:
+            self.host = host
+        if port:
+            self.port = int(port)
+        self.timeout = float(timeout)
+        self.reader, self.writer = await self.make_stream(
+            timeout=self.timeout)
+        self.lock = asyncio.Lock()
+        self._connected = True
+
+        try:
+            self.key = None
+            login_xml = xmlrequests.Login(username, password).request
+            response = await self.send_message(login_xml)
+            self.key = login_key(response)
+        except Exception:
+            await self.close(skip_errors=True)
+            raise
+        self.username = username
+
+    async def close(self, skip_errors=False):
+        """
+        Close connection to Fishbowl API.
+        """
+        connected = self.connected
+        self._connected = False
+        self.key = None
+        try:
+            if not connected:
+                raise OSError('Not connected')
+            self.writer.close()
+            # StreamWriter.wait_closed is new in Python 3.7.
+            wait_closed = getattr(self.writer, 'wait_closed', None)
+            if wait_closed is not None:
+                await wait_closed()
+        except Exception:
+            if not skip_errors:
+                raise
+
+    @require_connected
+    async def send_message(self, msg):
+        """
+        Send a message to the API and return the root element of the XML that
+        comes back as a response.
+        """
+        tag = 'unknown'
+        if isinstance(msg, xmlrequests.Request):
+            tag = msg.request_tag or tag
+            msg = msg.request
+        logger.info('Sending message ({})'.format(tag))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Sending message:\n' + format_payload(
+                redact(msg), self.encoding, self.log_payload_size))
+        async with self.lock:
+            received_length = False
+            try:
+                self.writer.write(struct.pack('>L', len(msg)))
+                self.writer.write(msg)
+                await asyncio.wait_for(self.writer.drain(), self.timeout)
+                header = await asyncio.wait_for(
+                    self.reader.readexactly(4), self.timeout)
+                received_length = True
+                length = struct.unpack('>L', header)[0]
+                response = await asyncio.wait_for(
+                    self.reader.readexactly(length), self.timeout)
+            except asyncio.TimeoutError:
+                await self.close(skip_errors=True)
+                if received_length:
+                    msg = 'Connection timeout (after length received)'
+                else:
+                    msg = 'Connection timeout'
+                raise FishbowlTimeoutError(msg)
+            except asyncio.IncompleteReadError:
+                await self.close(skip_errors=True)
+                raise FishbowlConnectionError('Connection closed by server')
+            except BaseException:
+                # Anything else (including the task being cancelled) leaves
+                # the response, or part of it, unread on the stream.
+                await self.close(skip_errors=True)
+                raise
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Response received:\n' + format_payload(
+                response, self.encoding, self.log_payload_size))
+        return etree.fromstring(response, self.make_parser())
+
+    @require_connected
+    async def send_request(
+            self, request, value=None, response_node_name=None, single=True,
+            silence_errors=False):
+        """
+        Send a simple request to the API that follows the standard method.
+
+        See :meth:`fishbowl.api.Fishbowl.send_request` for the arguments.
+        """
+        if isinstance(request, six.string_types):
+            request = xmlrequests.SimpleRequest(request, value, key=self.key)
+        root = await self.send_message(request)
+        return find_response(
+            root, response_node_name, single=single,
+            silence_errors=silence_errors)
+
+    @require_connected
+    async def send_query(self, query):
+        """
+        Send a SQL query to be executed on the server, returning a
+        ``DictReader`` containing the rows returned as a list of dictionaries.
+        """
+        response = await self.send_request(
+            'ExecuteQueryRq', {'Query': query},
+            response_node_name='ExecuteQueryRs')
+        return QueryRows(response.iter('Row'))
+
+    @require_connected
+    async def table_columns(self, table):
+        """
+        Return the column names of a database table.
+
+        See :meth:`fishbowl.api.Fishbowl.table_columns`.
+        """
+        columns = self._table_columns.get(table)
+        if columns is None:
+            rows = await self.send_query(
+                'SELECT * FROM {} WHERE 1 = 0'.format(table))
+            columns = self._table_columns[table] = rows.columns
+        return columns
+
+    async def table_query(self, table, cls, fields=None):
+        return table_query(
+            table, await self.table_columns(table), cls, fields)
+
+    @require_connected
+    async def add_inventory(self, partnum, qty, uomid, cost, loctagnum):
+        """
+        Add inventory.
+        """
+        request = xmlrequests.AddInventory(
+            partnum, qty, uomid, cost, loctagnum, key=self.key)
+        response = await self.send_message(request)
+        for element in response.iter('AddInventoryRs'):
+            check_status(element, allow_none=True)
+            log_adjustment('add_inv', [partnum, qty, uomid, cost, loctagnum])
+
+    @require_connected
+    async def cycle_inventory(self, partnum, qty, locationid):
+        """
+        Cycle inventory of part in Fishbowl.
+        """
+        request = xmlrequests.CycleCount(
+            partnum, qty, locationid, key=self.key)
+        response = await self.send_message(request)
+        for element in response.iter('CycleCountRs'):
+            check_status(element, allow_none=True)
+            log_adjustment('cycle_inv', [partnum, qty, locationid])
+
+    @require_connected
+    async def get_po_list(self, locationgroup):
+        """
+        Get list of POs.
+        """
+        request = xmlrequests.GetPOList(locationgroup, key=self.key)
+        return await self.send_message(request)
+
+    @require_connected
+    async def get_taxrates(self):
+        """
+        Get tax rates.
+
+        :returns: A list of :cls:`fishbowl.objects.TaxRate` objects
+        """
+        response = await self.send_request(
+            'TaxRateGetRq', response_node_name='TaxRateGetRs', single=False)
+        return [objects.TaxRate(node) for node in response.iter('TaxRate')]
+
+    @require_connected
+    async def get_customers(self, silence_errors=True):
+        """
+        Get customers.
+
+        Unlike :meth:`fishbowl.api.Fishbowl.get_customers`, the customers are
+        loaded straight away rather than lazily.
+
+        :returns: A list of :cls:`fishbowl.objects.Customer` objects
+        """
+        response = await self.send_request(
+            'CustomerNameListRq', response_node_name='CustomerNameListRs',
+            single=False)
+        customers = []
+        for name in [tag.text for tag in response.iter('Name')]:
+            node = await self.send_request(
+                'CustomerGetRq', {'Name': name},
+                response_node_name='CustomerGetRs',
+                silence_errors=silence_errors)
+            customers.append(objects.Customer(node, name=name))
+        return customers
+
+    @require_connected
+    async def get_uom_map(self):
+        response = await self.send_request(
+            'UOMRq', response_node_name='UOMRs', single=False)
+        return dict(
+            (uom['UOMID'], uom) for uom in
+            [objects.UOM(node) for node in response.iter('UOM')])
+
+    @require_connected
+    async def get_parts(self, populate_uoms=True):
+        """
+        Get a light list of parts.
+
+        :param populate_uoms: Whether to populate the UOM for each part
+            (default ``True``)
+        :returns: A list of cls:`fishbowl.objects.Part`
+        """
+        response = await self.send_request(
+            'LightPartListRq', response_node_name='LightPartListRs',
+            single=False)
+        parts = [objects.Part(node) for node in response.iter('LightPart')]
+        if populate_uoms:
+            attach_uoms(parts, await self.get_uom_map())
+        return parts
+
+    @require_connected
+    async def get_products_fast(
+            self, populate_uoms=True, fields=None, compact=False):
+        uom_map = None
+        if populate_uoms:
+            uom_map = await self.get_uom_map()
+        query = products_query(await self.table_columns('PRODUCT'), fields)
+        return build_products(
+            await self.send_query(query), uom_map, compact=compact)
+
+    @require_connected
+    async def get_pricing_rules(self):
+        """
+        Get a list of pricing rules for products.
+
+        See :meth:`fishbowl.api.Fishbowl.get_pricing_rules`.
+        """
+        pricing_rules = {None: []}
+        process_pricing_rules(
+            await self.send_query(PRICING_RULES_SQL), pricing_rules)
+        process_pricing_rules(
+            await self.send_query(CUSTOMER_GROUP_PRICING_RULES_SQL),
+            pricing_rules)
+        return pricing_rules
+
+    @require_connected
+    async def get_customers_fast(
+            self, populate_addresses=True, populate_pricing_rules=False,
+            fields=None, compact=False):
+        address_map = None
+        if populate_addresses:
+            address_map = build_address_map(
+                await self.send_query(await self.table_query(
+                    'COUNTRYCONST', objects.Country)),
+                await self.send_query(await self.table_query(
+                    'STATECONST', objects.State)),
+                await self.send_query(await self.table_query(
+                    'ADDRESS', objects.Address)), compact=compact)
+        pricing_rules = None
+        if populate_pricing_rules:
+            pricing_rules = await self.get_pricing_rules()
+        return build_customers(
+            await self.send_query(await self.table_query(
+                'CUSTOMER', objects.Customer, fields)),
+            address_map, pricing_rules, compact=compact)
@@ -1,20 +1,38 @@
 from __future__ import unicode_literals
+import array
 import base64
+import codecs
+import collections
 import csv
+import datetime
+import decimal
 import socket
 import struct
 import hashlib
 import functools
 import logging
+import re
 import sys
-from functools import partial
+import threading
 from lxml import etree
 import six
 
 from . import xmlrequests, statuscodes, objects
+from .cache import query_cache_name
+from .metrics import clock
+from .transport import TCPTransport, send_frame
+from .wirelog import format_payload, redact
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 logger = logging.getLogger(__name__)
 
+# Size of the reads used when streaming a response.
+CHUNK_SIZE = 64 * 1024
+
 PRICING_RULES_SQL = (
     'SELECT p.id, p.isactive, product.num, '
     'p.patypeid, p.papercent, p.pabaseamounttypeid, p.paamount, '
@@ -36,6 +54,265 @@ CUSTOMER_GROUP_PRICING_RULES_SQL = (
     'WHERE p.productincltypeid = 2 AND p.customerincltypeid = 3')
 
 
+PRODUCTS_FROM_SQL = 'FROM PRODUCT P INNER JOIN PART ON P.PARTID = PART.ID'
+
+# Product query columns that come from the part rather than the product.
+PRODUCT_PART_COLUMNS = (
+    ('STANDARDCOST', 'PART.STDCOST AS StandardCost'),
+    ('TYPEID', 'PART.TYPEID as TypeID'),
+)
+
+PRODUCTS_SQL = 'SELECT P.*, {} {}'.format(
+    ', '.join(column for name, column in PRODUCT_PART_COLUMNS),
+    PRODUCTS_FROM_SQL)
+
+# Columns the fast loaders and the sync need to link rows together, on top of
+# the columns of the object fields.
+LINK_COLUMNS = {
+    'CUSTOMER': ['ACCOUNTID'],
+    'ADDRESS': ['ACCOUNTID', 'COUNTRYID', 'STATEID'],
+    'COUNTRYCONST': ['ID', 'ABBREVIATION'],
+    'STATECONST': ['ID'],
+    'PRODUCT': ['NUM', 'UOMID'],
+    'PART': ['STDCOST', 'TYPEID'],
+}
+
+
+def query_lines(rows):
+    """
+    Yield the CSV text of each ``Row`` element in a query response as a line
+    that ``csv.DictReader`` accepts.
+    """
+    for row in rows:
+        # csv.DictReader API changed
+        if sys.version_info < (3,):
+            # Python 2 wants utf-8 or ASCII bytes
+            yield row.text.encode('utf-8') + b'\n'
+        else:
+            # Python 3 wants a string
+            yield row.text + u'\n'
+
+
+QUERY_DATETIME_FORMATS = (
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d',
+)
+
+
+def query_datetime(text):
+    """
+    Parse a date/time value from a query result.
+    """
+    for fmt in QUERY_DATETIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    raise ValueError('Unknown date format: {}'.format(text))
+
+
+# Quoted strings, brackets and the clause keywords of a query.
+QUERY_TOKEN_RE = re.compile(
+    r"'(?:[^']|'')*'|\"[^\"]*\"|\(|\)|"
+    r"\b(FROM|WHERE|GROUP|ORDER|HAVING|UNION|LIMIT|ROWS|FETCH)\b",
+    re.IGNORECASE)
+
+
+def split_query(query):
+    """
+    Split a ``SELECT`` query into its select list, its ``FROM`` clause and
+    the condition of its ``WHERE`` clause (``None`` if it has none).
+
+    Only keywords outside brackets and quotes count, so subqueries are left
+    alone.
+
+    :raises ValueError: If the query has no ``FROM`` clause, or has clauses
+        other than ``FROM`` and ``WHERE`` (such as ``ORDER BY``)
+    """
+    depth = 0
+    clauses = []
+    for match in QUERY_TOKEN_RE.finditer(query):
+        token = match.group()
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif match.group(1) and depth == 0:
+            clauses.append((match.group(1).upper(), match.start()))
+    names = [name for name, position in clauses]
+    if names not in (['FROM'], ['FROM', 'WHERE']):
+        if 'FROM' not in names:
+            raise ValueError('Query has no FROM clause')
+        raise ValueError(
+            'Query has clauses that can\'t be paged: {}'.format(
+                ', '.join(name for name in names
+                          if name not in ('FROM', 'WHERE'))))
+    start = clauses[0][1]
+    if len(clauses) == 1:
+        return query[:start].strip(), query[start:].strip(), None
+    where = clauses[1][1]
+    return (
+        query[:start].strip(), query[start:where].strip(),
+        query[where + len('WHERE'):].strip())
+
+# Converters for the column types accepted by Fishbowl.iter_query.
+QUERY_TYPES = {
+    'str': None,
+    'int': int,
+    'float': float,
+    'decimal': decimal.Decimal,
+    'bool': objects.fishbowl_boolean,
+    'datetime': query_datetime,
+    six.text_type: None,
+    int: int,
+    float: float,
+    decimal.Decimal: decimal.Decimal,
+    bool: objects.fishbowl_boolean,
+    datetime.datetime: query_datetime,
+}
+
+
+class QueryRows(six.Iterator):
+    """
+    An iterator over the rows of a query response, parsed as they arrive.
+
+    The first ``Row`` of the response holds the column names, available as
+    :attr:`columns`. Column types are resolved to converters once, when the
+    header is read, rather than for every row.
+    """
+
+    def __init__(self, rows, types=None, tuples=False):
+        """
+        :param rows: An iterable of ``Row`` elements
+        :param types: An optional dictionary of column names (matched without
+            case sensitivity) to types: one of the keys of
+            :data:`QUERY_TYPES`, or any callable taking the text value. Empty
+            values in typed columns become ``None``.
+        :param tuples: Yield tuples in column order rather than dictionaries
+        """
+        self.reader = csv.reader(query_lines(rows))
+        try:
+            header = next(self.reader)
+        except StopIteration:
+            header = []
+        self.columns = [self.decode(name) for name in header]
+        self.tuples = tuples
+        self.converters = []
+        if types:
+            indexes = dict(
+                (name.lower(), index)
+                for index, name in enumerate(self.columns))
+            for name, column_type in types.items():
+                index = indexes.get(name.lower())
+                if index is None:
+                    continue
+                convert = QUERY_TYPES.get(column_type, column_type)
+                if convert is not None:
+                    self.converters.append((index, convert))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        values = next(self.reader)
+        if six.PY2:
+            values = [self.decode(value) for value in values]
+        for index, convert in self.converters:
+            value = values[index]
+            values[index] = convert(value) if value else None
+        if self.tuples:
+            return tuple(values)
+        return dict(zip(self.columns, values))
+
+    @staticmethod
+    def decode(value):
+        if six.PY2:
+            return value.decode('utf-8')
+        return value
+
+
+# Array type codes for the numeric column types of QueryColumns.
+try:
+    array.array(str('q'))
+    INT_TYPECODE = str('q')
+except ValueError:   # Python 2
+    INT_TYPECODE = str('l')
+COLUMN_ARRAY_TYPES = {
+    int: INT_TYPECODE,
+    float: str('d'),
+    objects.fishbowl_boolean: str('b'),
+}
+
+
+class QueryColumns(dict):
+    """
+    Query results by column: a dictionary of column names to sequences of
+    values, for analytics over many rows without a Python object per row.
+
+    Each typed column is converted in a single pass over its values. Integer,
+    float and boolean columns become ``array.array`` objects (or NumPy arrays
+    if ``use_numpy`` is set); other columns are lists. Empty values are
+    ``None`` in lists, ``nan`` in float arrays and ``False`` in boolean
+    arrays. An integer column with empty values is a list (or a NumPy float
+    array, using ``nan``).
+    """
+
+    def __init__(self, rows, types=None, use_numpy=False):
+        """
+        :param rows: A :cls:`QueryRows` iterator of untyped tuples
+        :param types: An optional dictionary of column names to types, as for
+            :cls:`QueryRows`
+        :param use_numpy: Use NumPy arrays for the numeric columns
+        """
+        super(QueryColumns, self).__init__()
+        if use_numpy and numpy is None:
+            raise ImportError('NumPy is needed for use_numpy')
+        self.columns = list(rows.columns)
+        values = list(zip(*rows)) or [() for name in self.columns]
+        self.row_count = len(values[0]) if values else 0
+        types = dict(
+            (name.lower(), column_type)
+            for name, column_type in (types or {}).items())
+        for name, column in zip(self.columns, values):
+            column_type = types.get(name.lower())
+            convert = QUERY_TYPES.get(column_type, column_type)
+            self[name] = convert_column(column, convert, use_numpy)
+
+    def rows(self):
+        """
+        Yield the rows as tuples, in column order.
+        """
+        return zip(*[self[name] for name in self.columns])
+
+
+def convert_column(values, convert, use_numpy=False):
+    """
+    Convert the text values of one query column (see :cls:`QueryColumns`).
+    """
+    if convert is None:
+        return list(values)
+    typecode = COLUMN_ARRAY_TYPES.get(convert)
+    if typecode is None:
+        return [convert(value) if value else None for value in values]
+    if convert is objects.fishbowl_boolean:
+        values = map(convert, values)
+        if use_numpy:
+            return numpy.fromiter(values, dtype=bool)
+        return array.array(typecode, values)
+    blanks = '' in values
+    if blanks and convert is int and not use_numpy:
+        return [int(value) if value else None for value in values]
+    if blanks:
+        values = [value or 'nan' for value in values]
+    if use_numpy:
+        if blanks or convert is float:
+            return numpy.fromiter(map(float, values), numpy.float64)
+        return numpy.fromiter(map(int, values), numpy.int64)
+    return array.array(typecode, map(convert, values))
+
+
 def UnicodeDictReader(utf8_data, **kwargs):
     csv_reader = csv.DictReader(utf8_data, **kwargs)
     for row in csv_reader:
@@ -54,6 +331,488 @@ class FishbowlConnectionError(FishbowlError):
     pass
 
 
+def recv_exact(stream, view):
+    """
+    Fill ``view`` (a writable memoryview) with bytes read from ``stream``.
+
+    Short reads are retried until the view is full, so the caller always gets
+    exactly ``len(view)`` bytes or an exception.
+    """
+    length = len(view)
+    received = 0
+    while received < length:
+        count = stream.recv_into(view[received:], length - received)
+        if not count:
+            raise FishbowlConnectionError('Connection closed by server')
+        received += count
+    return received
+
+
+class ResponseStream(six.Iterator):
+    """
+    An iterator over the elements of a response frame, parsed incrementally
+    with a pull parser as the frame is read from the stream.
+
+    Each yielded element is cleared (along with its preceding siblings) when
+    the next one is requested, so memory use stays flat however large the
+    response is.
+    """
+
+    def __init__(
+            self, fishbowl, tags, response_node_name=None,
+            silence_errors=False, chunk_size=CHUNK_SIZE):
+        self.fishbowl = fishbowl
+        self.tags = set(tags)
+        self.status_tags = set(['FbiMsgsRs'])
+        if response_node_name:
+            self.status_tags.add(response_node_name)
+        self.start_tag = response_node_name or 'FbiMsgsRs'
+        self.silence_errors = silence_errors
+        self.parser = etree.XMLPullParser(
+            events=('start', 'end'), tag=list(self.tags | self.status_tags),
+            encoding=codecs.lookup(fishbowl.encoding).name)
+        self.chunks = fishbowl.iter_frame_chunks(chunk_size)
+        self.metrics = fishbowl.metrics
+        self.tag = fishbowl._message_tag
+        self.parsing = 0.0
+        self.pending = collections.deque()
+        self.current = None
+        self.started = False
+        self.done = False
+        fishbowl._response_stream = self
+        # Read up to the start of the response node so that bad status codes
+        # are raised straight away.
+        while not (self.started or self.done):
+            self.pump()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.release()
+        while not self.pending and not self.done:
+            self.pump()
+        if not self.pending:
+            raise StopIteration
+        self.current = self.pending.popleft()
+        return self.current
+
+    def pump(self):
+        """
+        Feed the next chunk of the frame to the parser and handle the events
+        it produced.
+        """
+        start = None
+        try:
+            chunk = next(self.chunks)
+            if self.metrics is not None:
+                start = clock()
+            self.parser.feed(chunk)
+        except StopIteration:
+            self.finish()
+            self.parser.close()
+        except Exception:
+            self.close()
+            raise
+        for event, element in self.parser.read_events():
+            if event == 'start':
+                if element.tag in self.status_tags:
+                    self.check(element)
+                    if self.done:
+                        break
+                if element.tag == self.start_tag:
+                    self.started = True
+            elif element.tag in self.tags:
+                self.pending.append(element)
+        if start is not None:
+            self.parsing += clock() - start
+
+    def check(self, element):
+        try:
+            check_status(element, allow_none=True)
+        except FishbowlError:
+            self.close()
+            if not self.silence_errors:
+                raise
+
+    def release(self):
+        element = self.current
+        if element is None:
+            return
+        self.current = None
+        element.clear()
+        parent = element.getparent()
+        if parent is not None:
+            while element.getprevious() is not None:
+                del parent[0]
+
+    def finish(self):
+        if not self.done and self.metrics is not None:
+            self.metrics.observe(self.tag, 'parse', self.parsing)
+        self.done = True
+        if self.fishbowl._response_stream is self:
+            self.fishbowl._response_stream = None
+
+    def detach(self):
+        """
+        Read and parse the rest of the response frame, keeping the remaining
+        elements in memory so the connection can be used for another message
+        while iteration continues.
+        """
+        while not self.done:
+            self.pump()
+
+    def close(self):
+        """
+        Stop iterating, discarding the rest of the response frame.
+        """
+        if not self.done:
+            self.finish()
+            self.chunks.close()
+        self.pending.clear()
+        self.release()
+
+
+class BatchResult(object):
+    """
+    The response to one request sent as part of a :cls:`Batch`.
+
+    Each result has its own status: a failed request sets :attr:`error`
+    rather than affecting the other results in the batch.
+    """
+
+    def __init__(self, response_node_name, single=True):
+        self.response_node_name = response_node_name
+        self.single = single
+        self.sent = False
+        self.response = None
+        self.status_code = None
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.sent and self.error is None
+
+    @property
+    def status(self):
+        """
+        The decoded status message of the response.
+        """
+        if self.status_code is None:
+            return None
+        return statuscodes.get_status(self.status_code)
+
+    def result(self):
+        """
+        Return the response node, raising the request's error if it failed.
+        """
+        if not self.sent:
+            raise FishbowlError('Batch has not been sent')
+        if self.error is not None:
+            raise self.error
+        return self.response
+
+    def set_response(self, node):
+        self.sent = True
+        if node is None:
+            self.error = FishbowlError(
+                'No {} in response'.format(self.response_node_name))
+            return
+        self.status_code = node.get('statusCode')
+        try:
+            check_status(node, allow_none=True)
+        except FishbowlError as e:
+            self.error = e
+            return
+        if self.single:
+            if len(node):
+                node = node[0]
+            else:
+                node = etree.Element('empty')
+        self.response = node
+
+
+class Batch(object):
+    """
+    Several requests to be sent to the API in a single message.
+
+    Use :meth:`Fishbowl.batch` to create one.
+    """
+
+    def __init__(self, fishbowl):
+        self.fishbowl = fishbowl
+        self.items = []
+        self.sent = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None and not self.sent:
+            self.send()
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(
+            self, request, value=None, response_node_name=None, single=True):
+        """
+        Add a request to the batch.
+
+        Takes the same arguments as :meth:`Fishbowl.send_request`. If
+        ``response_node_name`` isn't given, the name of the request node is
+        used with its ``Rq`` suffix changed to ``Rs``.
+
+        :returns: A :cls:`BatchResult` which is populated once the batch is
+            sent
+        """
+        if self.sent:
+            raise FishbowlError('Batch has already been sent')
+        if isinstance(request, six.string_types):
+            request = xmlrequests.SimpleRequest(
+                request, value, key=self.fishbowl.key)
+        if not response_node_name:
+            request_name = request.request_tag
+            if request_name.endswith('Rq'):
+                request_name = request_name[:-2] + 'Rs'
+            response_node_name = request_name
+        result = BatchResult(response_node_name, single=single)
+        self.items.append((request, result))
+        return result
+
+    def send(self):
+        """
+        Send all the requests in one message.
+
+        :returns: A list of :cls:`BatchResult`, in the order the requests
+            were added
+        """
+        self.sent = True
+        results = [result for request, result in self.items]
+        if not self.items:
+            return results
+        request = xmlrequests.BatchRequest(
+            [request for request, result in self.items],
+            key=self.fishbowl.key)
+        root = self.fishbowl.send_message(request)
+        resp = root.find('FbiMsgsRs')
+        if resp is None:
+            raise FishbowlError('No FbiMsgsRs in response')
+        # "Some requests had errors" is reported on the individual results.
+        if resp.get('statusCode') != statuscodes.REQUEST_ERRORS:
+            check_status(resp, allow_none=True)
+        nodes = {}
+        for child in resp:
+            nodes.setdefault(child.tag, collections.deque()).append(child)
+        for result in results:
+            queue = nodes.get(result.response_node_name)
+            result.set_response(queue.popleft() if queue else None)
+        return results
+
+
+class LazyRequest(object):
+    """
+    A callable which sends a simple request when called, used as the
+    ``lazy_data`` of a :cls:`fishbowl.objects.FishbowlObject`.
+
+    Unlike a plain ``partial``, the request can be inspected so that many
+    lazy objects can be loaded together (see :meth:`Fishbowl.hydrate`).
+    """
+
+    def __init__(
+            self, fishbowl, request, value=None, response_node_name=None,
+            silence_errors=False, group=None):
+        self.fishbowl = fishbowl
+        self.request = request
+        self.value = value
+        self.response_node_name = response_node_name
+        self.silence_errors = silence_errors
+        self.group = group
+        self.index = None
+
+    def __call__(self):
+        if self.group is not None:
+            return self.group.load(self.index)
+        return self.fishbowl.send_request(
+            self.request, self.value,
+            response_node_name=self.response_node_name,
+            silence_errors=self.silence_errors)
+
+
+class LazyGroup(object):
+    """
+    The lazy objects returned together by one API call.
+
+    When one of them is loaded, up to ``window - 1`` of the unloaded objects
+    after it are loaded in the same batched message. The window doubles (up
+    to ``max_window``) each time the next miss follows on from the previous
+    prefetch, and drops back to its starting size when access jumps around.
+    """
+
+    def __init__(self, fishbowl, window=10, max_window=200):
+        self.fishbowl = fishbowl
+        self.objects = []
+        self.initial_window = window
+        self.window = window
+        self.max_window = max(window, max_window)
+        self.next_index = None
+
+    def add(self, obj):
+        """
+        Add a lazy object to the group.
+        """
+        obj._lazy_load.index = len(self.objects)
+        self.objects.append(obj)
+
+    def load(self, index):
+        """
+        Return the data for the object at ``index``, prefetching its unloaded
+        siblings.
+        """
+        if (self.next_index is not None and
+                self.next_index <= index < self.next_index + self.window):
+            self.window = min(self.window * 2, self.max_window)
+        else:
+            self.window = self.initial_window
+        siblings = []
+        position = index + 1
+        while (len(siblings) < self.window - 1 and
+                position < len(self.objects)):
+            obj = self.objects[position]
+            if not obj.loaded:
+                siblings.append(obj)
+            position += 1
+        self.next_index = position
+
+        lazy = self.objects[index]._lazy_load
+        batch = self.fishbowl.batch()
+        result = batch.add(
+            lazy.request, lazy.value,
+            response_node_name=lazy.response_node_name)
+        sibling_results = []
+        for obj in siblings:
+            sibling = obj._lazy_load
+            sibling_results.append(batch.add(
+                sibling.request, sibling.value,
+                response_node_name=sibling.response_node_name))
+        batch.send()
+        # Siblings that failed without silenced errors are left unloaded to
+        # raise their error when they are accessed.
+        for obj, sibling_result in zip(siblings, sibling_results):
+            if sibling_result.ok:
+                obj.load(sibling_result.response)
+            elif obj._lazy_load.silence_errors:
+                obj.load(etree.Element('empty'))
+        if result.ok:
+            return result.response
+        if lazy.silence_errors:
+            return etree.Element('empty')
+        raise result.error
+
+
+def hydrate_batch(fishbowl, fishbowl_objects):
+    """
+    Load lazy objects with a single batched message sent by ``fishbowl``.
+    """
+    batch = fishbowl.batch()
+    results = []
+    for obj in fishbowl_objects:
+        lazy = obj._lazy_load
+        results.append(batch.add(
+            lazy.request, lazy.value,
+            response_node_name=lazy.response_node_name))
+    batch.send()
+    start = clock()
+    error = None
+    for obj, result in zip(fishbowl_objects, results):
+        if result.ok:
+            obj.load(result.response)
+        elif obj._lazy_load.silence_errors:
+            obj.load(etree.Element('empty'))
+        elif error is None:
+            error = result.error
+    if fishbowl_objects:
+        fishbowl.observe_objects(
+            fishbowl_objects[0]._lazy_load.request, start,
+            len(fishbowl_objects))
+    if error is not None:
+        raise error
+
+
+AdjustmentResult = collections.namedtuple(
+    'AdjustmentResult',
+    ['index', 'line', 'ok', 'status_code', 'status', 'error'])
+AdjustmentResult.__doc__ = """
+The outcome of one line of :meth:`Fishbowl.add_inventory_many` or
+:meth:`Fishbowl.cycle_inventory_many`: the line's position and arguments,
+whether it succeeded, its status code (and decoded message) and any error.
+"""
+
+# The request class and argument names of each kind of inventory adjustment,
+# keyed by the name it is audit logged as.
+ADJUSTMENTS = {
+    'add_inv': (
+        xmlrequests.AddInventory,
+        ('partnum', 'qty', 'uomid', 'cost', 'loctagnum')),
+    'cycle_inv': (
+        xmlrequests.CycleCount, ('partnum', 'qty', 'locationid')),
+}
+
+
+def log_adjustment(action, values):
+    """
+    Write the audit log line of an inventory adjustment.
+    """
+    logger.info(','.join(
+        ['{}'.format(val) for val in [action] + list(values)]))
+
+
+def send_adjustments(fishbowl, action, lines):
+    """
+    Send ``(index, values)`` inventory adjustments of one kind as a single
+    batched message sent by ``fishbowl``.
+
+    :returns: A list of :cls:`AdjustmentResult`
+    """
+    request_class = ADJUSTMENTS[action][0]
+    try:
+        batch = fishbowl.batch()
+        results = [
+            batch.add(request_class(*values, key=fishbowl.key))
+            for index, values in lines]
+        batch.send()
+    except (FishbowlError, socket.error, OSError) as e:
+        # Including the session having been closed by an earlier batch
+        # timing out.
+        logger.warning('Batch of {} {} lines failed: {}'.format(
+            len(lines), action, e))
+        return [
+            AdjustmentResult(index, values, False, None, None, e)
+            for index, values in lines]
+    adjusted = []
+    for (index, values), result in zip(lines, results):
+        if result.ok:
+            log_adjustment(action, values)
+        adjusted.append(AdjustmentResult(
+            index, values, result.ok, result.status_code, result.status,
+            result.error))
+    return adjusted
+
+
+def message_tag(msg):
+    """
+    Return the tag of the first request in a serialized message, or
+    ``'unknown'``.
+    """
+    try:
+        request = etree.fromstring(msg).find('FbiMsgsRq')
+    except etree.XMLSyntaxError:
+        return 'unknown'
+    if request is not None and len(request):
+        return request[0].tag
+    return 'unknown'
+
+
 def require_connected(func):
     """
     A decorator to wrap :cls:`Fishbowl` methods that can only be called after a
@@ -64,7 +823,11 @@ def require_connected(func):
     def dec(self, *args, **kwargs):
         if not self.connected:
             raise OSError('Not connected')
-        return func(self, *args, **kwargs)
+        try:
+            return func(self, *args, **kwargs)
+        except FishbowlError as e:
+            self.dump_wire_log(e)
+            raise
 
     return dec
 
@@ -77,13 +840,41 @@ class Fishbowl:
 
         fishbowl = Fishbowl()
         fishbowl.connect(username='admin', password='admin')
+
+    To cache reference data that rarely changes, pass a
+    :cls:`fishbowl.cache.ResponseCache` as ``cache``. To time each phase of
+    the requests sent, pass a :cls:`fishbowl.metrics.Metrics` (or another
+    collector) as ``metrics``. To keep the last few messages for when
+    something goes wrong, pass a :cls:`fishbowl.wirelog.WireLog` as
+    ``wire_log``. To connect over TLS or a Unix socket, pass a transport from
+    :mod:`fishbowl.transport` as ``transport``.
     """
     host = 'localhost'
     port = 28192
     encoding = 'latin-1'
+    # The most bytes of each message logged at debug level.
+    log_payload_size = 4096
+
+    _response_stream = None
+    # The tag of the last message sent and when the send finished, for
+    # metrics.
+    _message_tag = None
+    _sent_at = None
+    # The wire log record awaiting a response.
+    _wire_record = None
 
-    def __init__(self):
+    def __init__(
+            self, cache=None, recorder=None, metrics=None, wire_log=None,
+            transport=None):
         self._connected = False
+        if transport is None:
+            transport = TCPTransport()
+        self.transport = transport
+        self.cache = cache
+        self.recorder = recorder
+        self.metrics = metrics
+        self.wire_log = wire_log
+        self._table_columns = {}
 
     @property
     def connected(self):
@@ -93,22 +884,22 @@ class Fishbowl:
         """
         Create a connection to communicate with the API.
         """
-        stream = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        logger.info('Connecting to {}:{}'.format(self.host, self.port))
+        logger.info('Connecting to {}'.format(
+            self.transport.address(self.host, self.port)))
         try:
-            stream.connect((self.host, self.port))
+            stream = self.transport.connect(self.host, self.port, timeout)
         except socket.error as e:
-            msg = getattr(e, 'strerror', None) or e.message
+            msg = getattr(e, 'strerror', None) or '{}'.format(e)
             raise FishbowlConnectionError(msg)
-        stream.settimeout(timeout)
+        if self.recorder is not None:
+            stream = self.recorder.wrap(stream)
         return stream
 
     def connect(self, username, password, host=None, port=None, timeout=5):
         """
         Open socket stream, set timeout, and log in.
         """
-        password = base64.b64encode(
-            hashlib.md5(password.encode(self.encoding)).digest()).decode('ascii')
+        password = encode_password(password, self.encoding)
 
         if self.connected:
             self.close()
@@ -124,17 +915,10 @@ class Fishbowl:
             self.key = None
             login_xml = xmlrequests.Login(username, password).request
             response = self.send_message(login_xml)
-            # parse xml, grab api key, check status
-            for element in response.iter():
-                if element.tag == 'Key':
-                    self.key = element.text
-                if element.tag in ('loginRs', 'LoginRs', 'FbiMsgsRs'):
-                    check_status(element, allow_none=True)
-
-            if not self.key:
-                raise FishbowlError('No login key in response')
-        except Exception:
+            self.key = login_key(response)
+        except Exception as e:
             self.close(skip_errors=True)
+            self.dump_wire_log(e)
             raise
         self.username = username
 
@@ -142,10 +926,13 @@ class Fishbowl:
         """
         Close connection to Fishbowl API.
         """
+        connected = self.connected
         self._connected = False
         self.key = None
+        if self._response_stream is not None:
+            self._response_stream.finish()
         try:
-            if not self.connected:
+            if not connected:
                 raise OSError('Not connected')
             self.stream.close()
         except Exception:
@@ -181,46 +968,224 @@ class Fishbowl:
             ``False``)
         """
         if isinstance(request, six.string_types):
+            if self.caches(request):
+                root = self.send_cached(request, value, response_node_name)
+                return find_response(
+                    root, response_node_name, single=single,
+                    silence_errors=silence_errors)
             request = xmlrequests.SimpleRequest(request, value, key=self.key)
         root = self.send_message(request)
-        if response_node_name:
-            try:
-                resp = root.find('FbiMsgsRs')
-                check_status(resp, allow_none=True)
-                root = resp.find(response_node_name)
-                check_status(root, allow_none=True)
-            except FishbowlError:
-                if silence_errors:
-                    return etree.Element('empty')
-                raise
-            if single:
-                if len(root):
-                    root = root[0]
-                else:
-                    root = etree.Element('empty')
-        return root
+        return find_response(
+            root, response_node_name, single=single,
+            silence_errors=silence_errors)
+
+    @require_connected
+    def batch(self):
+        """
+        Collect several requests to send to the API in a single message.
+
+        Example usage::
+
+            with fishbowl.batch() as batch:
+                uoms = batch.add('UOMRq', single=False)
+                customer = batch.add('CustomerGetRq', {'Name': 'Sam Ball'})
+            customer.result()
+
+        The batch is sent when the ``with`` block exits (or by calling
+        :meth:`Batch.send`). A request that fails doesn't affect the results
+        of the others; its :meth:`BatchResult.result` raises the error.
+
+        :returns: A :cls:`Batch`
+        """
+        return Batch(self)
+
+    @require_connected
+    def stream_request(
+            self, request, value=None, response_node_name=None, tags=(),
+            silence_errors=False):
+        """
+        Send a simple request to the API, streaming the elements matching
+        ``tags`` from the response as they are parsed.
+
+        Takes the same arguments as :meth:`send_request` (``tags`` replacing
+        ``single``). Each element is cleared once the iteration moves on, so
+        parse or copy what you need from it straight away. Matching tags
+        should not be nested inside each other.
+
+        Requests that are cached (see :meth:`caches`) are read in full, and
+        the elements are not cleared.
+
+        :returns: A :cls:`ResponseStream`, or an iterator over the elements
+            of a cached response
+        """
+        if isinstance(request, six.string_types):
+            if self.caches(request):
+                root = self.send_cached(request, value, response_node_name)
+                response = find_response(
+                    root, response_node_name, single=False,
+                    silence_errors=silence_errors)
+                return response.iter(*tags)
+            request = xmlrequests.SimpleRequest(request, value, key=self.key)
+        return self.stream_message(
+            request, tags, response_node_name=response_node_name,
+            silence_errors=silence_errors)
 
     @require_connected
     def send_query(self, query):
         """
         Send a SQL query to be executed on the server, returning a
         ``DictReader`` containing the rows returned as a list of dictionaries.
+
+        Rows are parsed as the response arrives, unless the query is cached
+        (see :func:`fishbowl.cache.query_cache_name`).
         """
-        response = self.send_request(
+        name = query_cache_name(query)
+        if self.caches(name):
+            rows = self.cache.get(name, query)
+            if rows is None:
+                rows = list(self.send_query_uncached(query))
+                self.cache.set(name, query, rows)
+            # Copy the rows, since callers are free to change them.
+            return (dict(row) for row in rows)
+        return self.send_query_uncached(query)
+
+    def send_query_uncached(self, query):
+        return self.iter_query(query)
+
+    @require_connected
+    def iter_query(self, query, types=None, tuples=False):
+        """
+        Send a SQL query to be executed on the server, returning an iterator
+        that yields each row as soon as it has been parsed.
+
+        :param types: An optional dictionary of column names to types, used to
+            convert the text values (see :cls:`QueryRows`)
+        :param tuples: Yield tuples rather than dictionaries; the column names
+            are in the ``columns`` attribute of the returned iterator
+        :returns: A :cls:`QueryRows` iterator
+        """
+        rows = self.stream_request(
             'ExecuteQueryRq', {'Query': query},
-            response_node_name='ExecuteQueryRs')
-        csvfile = six.StringIO()
-        for row in response.iter('Row'):
-            # csv.DictReader API changed
-            if sys.version_info < (3,):
-                # Python 2 wants utf-8 or ASCII bytes
-                text = row.text.encode('utf-8') + b'\n'
-            else:
-                # Python 3 wants a string
-                text = row.text + u'\n'
-            csvfile.write(text)
-        csvfile.seek(0)
-        return UnicodeDictReader(csvfile)
+            response_node_name='ExecuteQueryRs', tags=['Row'])
+        return QueryRows(rows, types=types, tuples=tuples)
+
+    @require_connected
+    def query_columns(self, query, types=None, use_numpy=False):
+        """
+        Send a SQL query to be executed on the server, returning the results
+        by column rather than by row.
+
+        :param types: An optional dictionary of column names to types, used to
+            convert each column (see :cls:`QueryColumns`)
+        :param use_numpy: Use NumPy arrays for the numeric columns (NumPy
+            must be installed)
+        :returns: A :cls:`QueryColumns` dictionary
+        """
+        if use_numpy and numpy is None:
+            raise ImportError('NumPy is needed for use_numpy')
+        return QueryColumns(
+            self.iter_query(query, tuples=True), types=types,
+            use_numpy=use_numpy)
+
+    @require_connected
+    def iter_query_pages(
+            self, query, key='ID', page_size=5000, pool=None, types=None,
+            tuples=False):
+        """
+        Run a query in pages of ``key`` values, yielding the rows of each page
+        in turn so that no single response is too large.
+
+        The range of ``key`` values is found first (using
+        ``SELECT MIN(key), MAX(key)`` with the same ``FROM`` and ``WHERE``
+        clauses), then split into pages covering ``page_size`` consecutive
+        values each. Pages can be sparse if the keys have gaps.
+
+        :param query: A ``SELECT`` query with only ``FROM`` and (optionally)
+            ``WHERE`` clauses; other clauses raise ``ValueError``
+        :param key: The integer column to page over (e.g. ``'P.ID'`` for a
+            table aliased as ``P``)
+        :param pool: An optional :cls:`fishbowl.pool.FishbowlPool`. If given,
+            up to one page per session is fetched in parallel, and each page
+            is read into memory before its rows are yielded.
+        :param types: See :meth:`iter_query`
+        :param tuples: See :meth:`iter_query`
+        """
+        select, from_clause, condition = split_query(query)
+        where = ''
+        if condition:
+            where = ' WHERE {}'.format(condition)
+        bounds_query = 'SELECT MIN({0}), MAX({0}) {1}{2}'.format(
+            key, from_clause, where)
+        bounds = list(self.iter_query(bounds_query, tuples=True))
+        if not bounds or not bounds[0][0]:
+            return
+        low, high = int(bounds[0][0]), int(bounds[0][1])
+        # The original condition is bracketed so that an OR in it can't
+        # escape the key range.
+        where = ' WHERE '
+        if condition:
+            where = ' WHERE ({}) AND '.format(condition)
+        pages = [
+            '{} {}{}{} >= {} AND {} < {}'.format(
+                select, from_clause, where, key, start, key,
+                start + page_size)
+            for start in range(low, high + 1, page_size)]
+
+        def fetch_page(fishbowl, page):
+            return list(fishbowl.iter_query(page, types=types, tuples=tuples))
+
+        if pool is None:
+            for page in pages:
+                for row in self.iter_query(page, types=types, tuples=tuples):
+                    yield row
+            return
+        for i in range(0, len(pages), pool.size):
+            for rows in pool.map(fetch_page, pages[i:i + pool.size]):
+                for row in rows:
+                    yield row
+
+    @require_connected
+    def table_columns(self, table):
+        """
+        Return the column names of a database table.
+
+        The columns are looked up with a query that returns no rows the first
+        time a table is asked for, and remembered after that. An empty list
+        is returned if the server doesn't send a header row.
+        """
+        columns = self._table_columns.get(table)
+        if columns is None:
+            rows = self.iter_query(
+                'SELECT * FROM {} WHERE 1 = 0'.format(table))
+            columns = rows.columns
+            for row in rows:
+                pass
+            self._table_columns[table] = columns
+        return columns
+
+    def caches(self, name):
+        """
+        Whether responses to requests with this name (or queries with this
+        :func:`fishbowl.cache.query_cache_name`) are cached.
+        """
+        return self.cache is not None and bool(self.cache.ttl(name))
+
+    def send_cached(self, request, value=None, response_node_name=None):
+        """
+        Send a simple request, returning the root element of the response
+        from :attr:`cache` if it's there. Only responses that pass their
+        status checks are cached.
+        """
+        root = self.cache.get(request, value)
+        if root is None:
+            root = self.send_message(
+                xmlrequests.SimpleRequest(request, value, key=self.key))
+            try:
+                find_response(root, response_node_name, single=False)
+            except FishbowlError:
+                return root
+            self.cache.set(request, value, root)
+        return root
 
     @require_connected
     def send_message(self, msg):
@@ -230,43 +1195,198 @@ class Fishbowl:
 
         For higher level usage, see :meth:`send_request`.
         """
+        self.write_message(msg)
+        response = self.receive_message()
+        if self.metrics is None:
+            return etree.fromstring(response, self.make_parser())
+        start = clock()
+        root = etree.fromstring(response, self.make_parser())
+        self.metrics.observe(self._message_tag, 'parse', clock() - start)
+        return root
+
+    @require_connected
+    def stream_message(
+            self, msg, tags, response_node_name=None, silence_errors=False):
+        """
+        Send a message to the API and return a :cls:`ResponseStream` which
+        yields the elements matching ``tags`` while the response is still
+        arriving.
+
+        Status codes of the ``FbiMsgsRs`` node and ``response_node_name`` (if
+        given) are checked before this method returns. If another message is
+        sent before the stream is exhausted, the rest of the response is read
+        into memory first; call :meth:`ResponseStream.close` to discard it
+        instead.
+        """
+        self.write_message(msg)
+        return ResponseStream(
+            self, tags, response_node_name=response_node_name,
+            silence_errors=silence_errors)
+
+    def write_message(self, msg):
+        """
+        Send a message to the API without reading the response.
+        """
+        if self._response_stream is not None:
+            # Finish reading any partially consumed response first so the
+            # stream stays in step with the server.
+            self._response_stream.detach()
+        metrics = self.metrics
+        start = clock() if metrics is not None else None
         if isinstance(msg, xmlrequests.Request):
+            tag = msg.request_tag or 'unknown'
             msg = msg.request
+        else:
+            tag = message_tag(msg)
+        logger.info('Sending message ({})'.format(tag))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Sending message:\n' + format_payload(
+                redact(msg), self.encoding, self.log_payload_size))
+        if self.wire_log is not None:
+            self._wire_record = self.wire_log.request(tag, msg)
+        if metrics is None:
+            send_frame(self.stream, msg)
+            return
+        built = clock()
+        sent = send_frame(self.stream, msg)
+        self._message_tag = tag
+        self._sent_at = clock()
+        metrics.observe(tag, 'build', built - start)
+        metrics.observe(tag, 'send', self._sent_at - built)
+        metrics.count(tag, 'requests')
+        metrics.count(tag, 'bytes_sent', sent)
 
-        tag = 'unknown'
+    def receive_length(self):
+        """
+        Read the 4-byte length header of a response frame.
+        """
+        try:
+            header = bytearray(4)
+            recv_exact(self.stream, memoryview(header))
+        except socket.timeout:
+            self.close(skip_errors=True)
+            raise FishbowlTimeoutError('Connection timeout')
+        # '>L' = 4 byte unsigned long, big endian format
+        length = struct.unpack('>L', bytes(header))[0]
+        if self.metrics is not None and self._sent_at is not None:
+            self.metrics.observe(
+                self._message_tag, 'wait', clock() - self._sent_at)
+            self.metrics.count(self._message_tag, 'bytes_received', length + 4)
+            self._sent_at = None
+        return length
+
+    def receive_message(self):
+        """
+        Read a single length-prefixed response frame from the stream,
+        returning the raw bytes as a ``bytearray``.
+
+        The body is read straight into a preallocated buffer rather than byte
+        by byte.
+        """
+        length = self.receive_length()
+        start = clock() if self.metrics is not None else None
+        response = bytearray(length)
+        try:
+            recv_exact(self.stream, memoryview(response))
+        except socket.timeout:
+            self.close(skip_errors=True)
+            raise FishbowlTimeoutError(
+                'Connection timeout (after length received)')
+        if start is not None:
+            self.metrics.observe(
+                self._message_tag, 'receive', clock() - start)
+        self.log_response(response)
+        return response
+
+    def log_response(self, response):
+        """
+        Log a response at debug level, and keep it in the wire log with the
+        request it answers.
+        """
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Response received:\n' + format_payload(
+                response, self.encoding, self.log_payload_size))
+        record = self._wire_record
+        if record is not None:
+            self._wire_record = None
+            self.wire_log.response(record, response)
+
+    def dump_wire_log(self, error):
+        """
+        Log the messages kept in the wire log (if there is one) because of
+        ``error``, once per error.
+        """
+        if self.wire_log is None or getattr(error, 'wire_logged', False):
+            return
         try:
-            xml = etree.fromstring(msg)
-            request_tag = xml.find('FbiMsgsRq')
-            if request_tag is not None and len(request_tag):
-                tag = request_tag[0].tag
-        except etree.XMLSyntaxError:
+            error.wire_logged = True
+        except AttributeError:
             pass
-        logger.info('Sending message ({})'.format(tag))
-        logger.debug('Sending message:\n' + msg.decode(self.encoding))
-        self.stream.send(self.pack_message(msg))
+        self.wire_log.dump(error)
+
+    def iter_frame_chunks(self, chunk_size=CHUNK_SIZE):
+        """
+        Read a single response frame from the stream, yielding the body in
+        chunks of at most ``chunk_size`` bytes as they arrive.
 
-        # Get response
-        byte_count = 0
-        response = bytearray()
-        received_length = False
+        If the generator is closed before the end of the frame, the rest of
+        the frame is read and discarded.
+        """
+        length = self.receive_length()
+        stream = self.stream
+        view = memoryview(bytearray(max(min(chunk_size, length), 1)))
+        remaining = length
+        metrics = self.metrics
+        tag = self._message_tag
+        # Only the time spent reading counts as receiving, not the time the
+        # consumer spends between chunks.
+        receiving = 0.0
+        # The chunks are only kept if they are going to be logged.
+        kept = None
+        if (self._wire_record is not None or
+                logger.isEnabledFor(logging.DEBUG)):
+            kept = []
         try:
-            packed_length = self.stream.recv(4)
-            length = struct.unpack('>L', packed_length)[0]
-            received_length = True
-            while byte_count < length:
-                byte = self.stream.recv(1)
-                byte_count += 1
-                response.append(ord(byte))
+            while remaining:
+                if metrics is not None:
+                    start = clock()
+                count = stream.recv_into(view, min(remaining, len(view)))
+                if metrics is not None:
+                    receiving += clock() - start
+                if not count:
+                    raise FishbowlConnectionError(
+                        'Connection closed by server')
+                remaining -= count
+                chunk = bytes(view[:count])
+                if kept is not None:
+                    kept.append(chunk)
+                yield chunk
+            if metrics is not None:
+                metrics.observe(tag, 'receive', receiving)
+            if kept is not None:
+                self.log_response(b''.join(kept))
         except socket.timeout:
             self.close(skip_errors=True)
-            if received_length:
-                msg = 'Connection timeout (after length received)'
-            else:
-                msg = 'Connection timeout'
-            raise FishbowlTimeoutError(msg)
-        response = response.decode(self.encoding)
-        logger.debug('Response received:\n' + response)
-        return etree.fromstring(response)
+            raise FishbowlTimeoutError(
+                'Connection timeout (after length received)')
+        except GeneratorExit:
+            # Only drain if the connection this frame arrived on is still the
+            # current one.
+            if self.connected and self.stream is stream:
+                try:
+                    while remaining:
+                        size = min(remaining, len(view))
+                        recv_exact(stream, view[:size])
+                        remaining -= size
+                except Exception:
+                    self.close(skip_errors=True)
+            raise
+
+    def make_parser(self):
+        """
+        Create an XML parser for response bytes in the API encoding.
+        """
+        return etree.XMLParser(encoding=codecs.lookup(self.encoding).name)
 
     @require_connected
     def add_inventory(self, partnum, qty, uomid, cost, loctagnum):
@@ -278,9 +1398,28 @@ class Fishbowl:
         response = self.send_message(request)
         for element in response.iter('AddInventoryRs'):
             check_status(element, allow_none=True)
-            logger.info(','.join([
-                '{}'.format(val)
-                for val in ['add_inv', partnum, qty, uomid, cost, loctagnum]]))
+            log_adjustment(
+                'add_inv', [partnum, qty, uomid, cost, loctagnum])
+
+    @require_connected
+    def add_inventory_many(self, lines, batch_size=100, pool=None):
+        """
+        Add inventory for many lines, sending ``batch_size`` of them per
+        message.
+
+        A line that fails doesn't stop the others; check the results. If a
+        batch times out, the session is closed and the lines of the batches
+        after it fail without being sent.
+
+        :param lines: An iterable of ``(partnum, qty, uomid, cost,
+            loctagnum)`` sequences, or dictionaries of those arguments of
+            :meth:`add_inventory`
+        :param batch_size: The number of lines per message (default ``100``)
+        :param pool: An optional :cls:`fishbowl.pool.FishbowlPool` to send
+            the batches in parallel over its sessions
+        :returns: A list of :cls:`AdjustmentResult`, one per line in order
+        """
+        return self.adjust_inventory_many('add_inv', lines, batch_size, pool)
 
     @require_connected
     def cycle_inventory(self, partnum, qty, locationid):
@@ -292,9 +1431,44 @@ class Fishbowl:
         response = self.send_message(request)
         for element in response.iter('CycleCountRs'):
             check_status(element, allow_none=True)
-            logger.info(','.join([
-                '{}'.format(val)
-                for val in ['cycle_inv', partnum, qty, locationid]]))
+            log_adjustment('cycle_inv', [partnum, qty, locationid])
+
+    @require_connected
+    def cycle_inventory_many(self, lines, batch_size=100, pool=None):
+        """
+        Cycle the inventory of many parts, sending ``batch_size`` counts per
+        message.
+
+        Takes the same arguments as :meth:`add_inventory_many`, with lines of
+        ``(partnum, qty, locationid)`` (see :meth:`cycle_inventory`).
+
+        :returns: A list of :cls:`AdjustmentResult`, one per line in order
+        """
+        return self.adjust_inventory_many(
+            'cycle_inv', lines, batch_size, pool)
+
+    @require_connected
+    def adjust_inventory_many(self, action, lines, batch_size=100, pool=None):
+        """
+        Send inventory adjustments of the kind named ``action`` (a key of
+        :data:`ADJUSTMENTS`) in batches.
+        """
+        names = ADJUSTMENTS[action][1]
+        lines = [
+            (index, [line[name] for name in names]
+                if isinstance(line, dict) else list(line))
+            for index, line in enumerate(lines)]
+        batches = [
+            lines[i:i + batch_size] for i in range(0, len(lines), batch_size)]
+
+        def send(fishbowl, batch):
+            return send_adjustments(fishbowl, action, batch)
+
+        if pool is not None:
+            results = pool.map(send, batches)
+        else:
+            results = [send(self, batch) for batch in batches]
+        return [result for batch in results for result in batch]
 
     @require_connected
     def get_po_list(self, locationgroup):
@@ -311,37 +1485,100 @@ class Fishbowl:
 
         :returns: A list of :cls:`fishbowl.objects.TaxRate` objects
         """
-        response = self.send_request(
-            'TaxRateGetRq', response_node_name='TaxRateGetRs', single=False)
-        return [objects.TaxRate(node) for node in response.iter('TaxRate')]
+        response = self.stream_request(
+            'TaxRateGetRq', response_node_name='TaxRateGetRs',
+            tags=['TaxRate'])
+        return self.build_objects(objects.TaxRate, response, 'TaxRateGetRq')
 
     @require_connected
-    def get_customers(self, silence_lazy_errors=True):
+    def get_customers(
+            self, silence_lazy_errors=True, lazy=True, batch_size=200,
+            pool=None, prefetch=10):
         """
         Get customers.
 
-        :returns: A list of lazy :cls:`fishbowl.objects.Customer` objects
+        :param silence_lazy_errors: Load an empty customer rather than raising
+            an error if a customer can't be loaded (default ``True``)
+        :param lazy: Whether the customers should be lazily loaded (default
+            ``True``). Otherwise they are loaded with :meth:`hydrate`.
+        :param batch_size: The number of customers loaded per message when
+            not lazy (default ``200``)
+        :param pool: An optional :cls:`fishbowl.pool.FishbowlPool` used to
+            load batches in parallel when not lazy
+        :param prefetch: When a lazy customer is loaded, also load up to this
+            many following customers in the same message, growing the number
+            while customers are accessed in order (see :cls:`LazyGroup`).
+            Set to ``0`` to load each customer separately.
+        :returns: A list of :cls:`fishbowl.objects.Customer` objects
         """
         customers = []
-        request = self.send_request(
+        group = LazyGroup(self, window=prefetch + 1) if prefetch else None
+        request = self.stream_request(
             'CustomerNameListRq', response_node_name='CustomerNameListRs',
-            single=False)
-        for tag in request.iter('Name'):
-            get_customer = partial(
-                self.send_request, 'CustomerGetRq', {'Name': tag.text},
+            tags=['Name'])
+        for tag in request:
+            get_customer = LazyRequest(
+                self, 'CustomerGetRq', {'Name': tag.text},
                 response_node_name='CustomerGetRs',
-                silence_errors=silence_lazy_errors)
+                silence_errors=silence_lazy_errors, group=group)
             customer = objects.Customer(lazy_data=get_customer, name=tag.text)
+            if group is not None:
+                group.add(customer)
             customers.append(customer)
+        if not lazy:
+            self.hydrate(customers, batch_size=batch_size, pool=pool)
         return customers
 
+    @require_connected
+    def hydrate(
+            self, fishbowl_objects, batch_size=200, pool=None, progress=None):
+        """
+        Load lazy objects (such as those from :meth:`get_customers`) in
+        batches of ``batch_size`` requests per message, rather than one
+        message per object.
+
+        Objects that are already loaded, or weren't created by this API, are
+        skipped. Objects that fail to load raise their error unless their
+        lazy request silences errors, in which case they are loaded empty.
+
+        :param pool: An optional :cls:`fishbowl.pool.FishbowlPool`; if given,
+            the batches are sent in parallel over its sessions instead of
+            this connection
+        :param progress: An optional callable, called as
+            ``progress(loaded, total)`` after each batch (from the pool's
+            worker threads if a pool is used)
+        :returns: ``fishbowl_objects``
+        """
+        pending = [
+            obj for obj in fishbowl_objects
+            if not obj.loaded and isinstance(obj._lazy_load, LazyRequest)]
+        batches = [
+            pending[i:i + batch_size]
+            for i in range(0, len(pending), batch_size)]
+        loaded = [0]
+        lock = threading.Lock()
+
+        def load(fishbowl, batch):
+            hydrate_batch(fishbowl, batch)
+            if progress is not None:
+                with lock:
+                    loaded[0] += len(batch)
+                    progress(loaded[0], len(pending))
+
+        if pool is not None:
+            pool.map(load, batches)
+        else:
+            for batch in batches:
+                load(self, batch)
+        return fishbowl_objects
+
     @require_connected
     def get_uom_map(self):
-        response = self.send_request(
-            'UOMRq', response_node_name='UOMRs', single=False)
+        response = self.stream_request(
+            'UOMRq', response_node_name='UOMRs', tags=['UOM'])
         return dict(
             (uom['UOMID'], uom) for uom in
-            [objects.UOM(node) for node in response.iter('UOM')])
+            self.build_objects(objects.UOM, response, 'UOMRq'))
 
     @require_connected
     def get_parts(self, populate_uoms=True):
@@ -352,23 +1589,18 @@ class Fishbowl:
             (default ``True``)
         :returns: A list of cls:`fishbowl.objects.Part`
         """
-        response = self.send_request(
+        response = self.stream_request(
             'LightPartListRq', response_node_name='LightPartListRs',
-            single=False)
-        parts = [objects.Part(node) for node in response.iter('LightPart')]
+            tags=['LightPart'])
+        parts = self.build_objects(objects.Part, response, 'LightPartListRq')
         if populate_uoms:
-            uom_map = self.get_uom_map()
-            for part in parts:
-                uomid = part.get('UOMID')
-                if not uomid:
-                    continue
-                uom = uom_map.get(uomid)
-                if uom:
-                    part.mapped['UOM'] = uom
+            attach_uoms(parts, self.get_uom_map())
         return parts
 
     @require_connected
-    def get_products(self, lazy=True):
+    def get_products(
+            self, lazy=True, prefetch=10, batch_size=200, pool=None,
+            progress=None):
         """
         Get a list of products, optionally lazy.
 
@@ -379,53 +1611,77 @@ class Fishbowl:
 
         :param lazy: Whether the products should be lazily loaded (default
             ``True``)
+        :param prefetch: When a lazy product is loaded, also load up to this
+            many following products in the same message (see
+            :meth:`get_customers`)
+        :param batch_size: The number of products loaded per message when not
+            lazy (default ``200``)
+        :param pool: An optional :cls:`fishbowl.pool.FishbowlPool` used to
+            load batches in parallel when not lazy
+        :param progress: An optional callable, called as
+            ``progress(loaded, total)`` as products are loaded when not lazy
         :returns: A list of cls:`fishbowl.objects.Product`
         """
         products = []
-        added = []
+        added = set()
+        group = None
+        if lazy and prefetch:
+            group = LazyGroup(self, window=prefetch + 1)
         for part in self.get_parts(populate_uoms=False):
             part_number = part.get('Num')
             # Skip parts without a number, and duplicates.
             if not part_number or part_number in added:
                 continue
+            added.add(part_number)
 
-            get_product = partial(
-                self.send_request, 'ProductGetRq', {'Number': part_number},
-                response_node_name='ProductGetRs')
-
-            product_kwargs = {
-                'name': part_number,
-            }
-            if lazy:
-                product_kwargs['lazy_data'] = get_product
-            else:
-                product_node = get_product()
-                if not len(product_node):
-                    continue
-                product_kwargs['data'] = product_node
-            product = objects.Product(**product_kwargs)
+            get_product = LazyRequest(
+                self, 'ProductGetRq', {'Number': part_number},
+                response_node_name='ProductGetRs', group=group)
+            product = objects.Product(lazy_data=get_product, name=part_number)
+            if group is not None:
+                group.add(product)
             product.part = part
             products.append(product)
-            added.append(part_number)
+        if not lazy:
+            self.hydrate(
+                products, batch_size=batch_size, pool=pool,
+                progress=progress)
+            # Skip parts that don't have a product.
+            products = [product for product in products if product]
         return products
 
     @require_connected
-    def get_products_fast(self, populate_uoms=True):
-        products = []
+    def get_products_fast(
+            self, populate_uoms=True, page_size=None, pool=None, fields=None,
+            compact=False):
+        """
+        Get a list of products (with their parts) using a single query.
+
+        Only the columns read by the :cls:`fishbowl.objects.Product` and
+        :cls:`fishbowl.objects.Part` fields are selected.
+
+        :param populate_uoms: Whether to populate the UOM for each product
+            (default ``True``)
+        :param fields: An optional list of product and part field names to
+            limit the query to
+        :param compact: Return read-only :cls:`fishbowl.objects.Record`
+            objects, which take much less memory for large result sets (see
+            :func:`build_products`)
+        :param page_size: If given, fetch the products in pages of this many
+            ids (see :meth:`iter_query_pages`)
+        :param pool: An optional :cls:`fishbowl.pool.FishbowlPool` to fetch
+            pages in parallel
+        :returns: A list of cls:`fishbowl.objects.Product`
+        """
+        uom_map = None
         if populate_uoms:
             uom_map = self.get_uom_map()
-        for row in self.send_query('SELECT P.*, PART.STDCOST AS StandardCost, PART.TYPEID as TypeID FROM PRODUCT P INNER JOIN PART ON P.PARTID = PART.ID'):
-            product = objects.Product(row, name=row.get('NUM'))
-            if not product:
-                continue
-            if populate_uoms:
-                uomid = row.get('UOMID')
-                if uomid:
-                    uom = uom_map.get(int(uomid))
-                    if uom:
-                        product.mapped['UOM'] = uom
-            product.part = objects.Part(row)
-            products.append(product)
+        query = products_query(self.table_columns('PRODUCT'), fields)
+        rows = self.paged_query(
+            query, key='P.ID', page_size=page_size, pool=pool)
+        start = clock()
+        products = build_products(rows, uom_map, compact=compact)
+        self.observe_objects('ExecuteQueryRq', start, len(products))
         return products
 
     @require_connected
@@ -438,71 +1694,360 @@ class Fishbowl:
             rules relevant to all customers.
         """
         pricing_rules = {None: []}
-        def process_rules(data, rules):
-            for row in data:
-                customer_type = row.pop('CUSTOMERINCLTYPEID')
-                customer_id = row.pop('CUSTOMERINCLID')
-                if customer_type == '1':
-                    customer_id = None
-                elif customer_type == '3':
-                    customer_id = int(row.pop('CUSTOMERID'))
-                else:
-                    customer_id = int(customer_id)
-                customer_pricing = rules.setdefault(customer_id, [])
-                customer_pricing.append(row)
-
-        process_rules(self.send_query(PRICING_RULES_SQL), pricing_rules)
-        process_rules(
+        process_pricing_rules(
+            self.send_query(PRICING_RULES_SQL), pricing_rules)
+        process_pricing_rules(
             self.send_query(CUSTOMER_GROUP_PRICING_RULES_SQL), pricing_rules)
-
         return pricing_rules
 
     @require_connected
     def get_customers_fast(
-            self, populate_addresses=True, populate_pricing_rules=False):
-        customers = []
+            self, populate_addresses=True, populate_pricing_rules=False,
+            page_size=None, pool=None, fields=None, compact=False):
+        """
+        Get a list of customers using queries rather than a request per
+        customer.
+
+        Only the columns read by the :cls:`fishbowl.objects.Customer` fields
+        (and those of its addresses) are selected.
+
+        :param populate_addresses: Whether to populate the addresses of each
+            customer (default ``True``)
+        :param populate_pricing_rules: Whether to populate the pricing rules
+            of each customer (default ``False``)
+        :param page_size: If given, fetch the customers and addresses in pages
+            of this many ids (see :meth:`iter_query_pages`)
+        :param pool: An optional :cls:`fishbowl.pool.FishbowlPool` to fetch
+            pages in parallel
+        :param fields: An optional list of customer field names to limit the
+            query to
+        :param compact: Return read-only :cls:`fishbowl.objects.Record`
+            objects for the customers and their addresses, which take much
+            less memory for large result sets
+        :returns: A list of cls:`fishbowl.objects.Customer`
+        """
         # contact_map = dict(
         #     (contact['ACCOUNTID'], contact['NAME']) for contact in
         #     self.send_query('SELECT * FROM CONTACT'))
+        address_map = None
         if populate_addresses:
-            country_map = {}
-            for country in self.send_query('SELECT * FROM COUNTRYCONST'):
-                country['CODE'] = country['ABBREVIATION']
-                country_map[country['ID']] = objects.Country(country)
-            state_map = dict(
-                (state['ID'], objects.State(state))
-                for state in self.send_query('SELECT * FROM STATECONST'))
-            address_map = {}
-            for addr in self.send_query('SELECT * FROM ADDRESS'):
-                addresses = address_map.setdefault(addr['ACCOUNTID'], [])
-                address = objects.Address(addr)
-                if address:
-                    country = country_map.get(addr['COUNTRYID'])
-                    if country:
-                        address.mapped['Country'] = country
-                    state = state_map.get(addr['STATEID'])
-                    if state:
-                        address.mapped['State'] = state
-                    addresses.append(address)
+            countries = list(self.send_query(self.table_query(
+                'COUNTRYCONST', objects.Country)))
+            states = list(self.send_query(self.table_query(
+                'STATECONST', objects.State)))
+            address_map = build_address_map(
+                countries, states, self.paged_query(
+                    self.table_query('ADDRESS', objects.Address),
+                    page_size=page_size, pool=pool), compact=compact)
+        pricing_rules = None
         if populate_pricing_rules:
             pricing_rules = self.get_pricing_rules()
-        for row in self.send_query('SELECT * FROM CUSTOMER'):
+        rows = self.paged_query(
+            self.table_query('CUSTOMER', objects.Customer, fields),
+            page_size=page_size, pool=pool)
+        start = clock()
+        customers = build_customers(
+            rows, address_map, pricing_rules, compact=compact)
+        self.observe_objects('ExecuteQueryRq', start, len(customers))
+        return customers
+
+    def build_objects(self, cls, nodes, tag):
+        """
+        Build an object of a :cls:`fishbowl.objects.FishbowlObject` class
+        from each of ``nodes``, recording the time spent building them (but
+        not reading ``nodes``) as the ``objects`` phase of ``tag``.
+
+        :returns: A list of objects
+        """
+        if self.metrics is None:
+            return [cls(node) for node in nodes]
+        built = []
+        elapsed = 0.0
+        for node in nodes:
+            start = clock()
+            built.append(cls(node))
+            elapsed += clock() - start
+        self.metrics.observe(tag, 'objects', elapsed)
+        self.metrics.count(tag, 'objects', len(built))
+        return built
+
+    def observe_objects(self, tag, start, count):
+        """
+        Record the ``objects`` phase of ``tag`` as having started at
+        ``start`` (from :func:`fishbowl.metrics.clock`) and built ``count``
+        objects.
+
+        Objects built from query rows are timed this way, so when the rows
+        are fetched in pages, the time includes fetching all but the first
+        page.
+        """
+        if self.metrics is not None:
+            self.metrics.observe(tag, 'objects', clock() - start)
+            self.metrics.count(tag, 'objects', count)
+
+    def table_query(self, table, cls, fields=None):
+        """
+        Build a query on a table that selects only the columns read by a
+        :cls:`fishbowl.objects.FishbowlObject` class (see
+        :func:`table_query`).
+        """
+        return table_query(table, self.table_columns(table), cls, fields)
+
+    def paged_query(self, query, key='ID', page_size=None, pool=None):
+        """
+        Run a query with :meth:`iter_query_pages` if ``page_size`` is given,
+        otherwise with :meth:`send_query`.
+        """
+        if page_size:
+            return self.iter_query_pages(
+                query, key=key, page_size=page_size, pool=pool)
+        return self.send_query(query)
+
+
+def find_response(
+        root, response_node_name=None, single=True, silence_errors=False):
+    """
+    Find the response node in the root element of a response, checking the
+    status codes along the way.
+
+    See :meth:`Fishbowl.send_request` for the arguments.
+    """
+    if not response_node_name:
+        return root
+    try:
+        resp = root.find('FbiMsgsRs')
+        check_status(resp, allow_none=True)
+        root = resp.find(response_node_name)
+        check_status(root, allow_none=True)
+    except FishbowlError:
+        if silence_errors:
+            return etree.Element('empty')
+        raise
+    if single:
+        if len(root):
+            root = root[0]
+        else:
+            root = etree.Element('empty')
+    return root
+
+
+def encode_password(password, encoding):
+    """
+    Encode a password the way the login request expects it.
+    """
+    return base64.b64encode(
+        hashlib.md5(password.encode(encoding)).digest()).decode('ascii')
+
+
+def login_key(response):
+    """
+    Find the API key in a login response, checking its status codes.
+    """
+    key = None
+    for element in response.iter():
+        if element.tag == 'Key':
+            key = element.text
+        if element.tag in ('loginRs', 'LoginRs', 'FbiMsgsRs'):
+            check_status(element, allow_none=True)
+    if not key:
+        raise FishbowlError('No login key in response')
+    return key
+
+
+def select_columns(table_columns, names, prefix=''):
+    """
+    Return a comma separated list of the columns in ``table_columns`` whose
+    upper case names are in ``names``, each starting with ``prefix``.
+
+    If the table columns aren't known, all columns (``*``) are selected.
+    """
+    if not table_columns:
+        return prefix + '*'
+    names = set(names)
+    return ', '.join(
+        prefix + column for column in table_columns
+        if column.upper() in names)
+
+
+def table_query(table, table_columns, cls, fields=None):
+    """
+    Build a ``SELECT`` query on a table for the columns read by the fields of
+    ``cls`` (limited to ``fields``, if given) and those in
+    :data:`LINK_COLUMNS`.
+    """
+    names = cls.column_names(fields) + LINK_COLUMNS.get(table, [])
+    return 'SELECT {} FROM {}'.format(
+        select_columns(table_columns, names), table)
+
+
+def products_query(product_columns, fields=None):
+    """
+    Build a query like ``PRODUCTS_SQL`` that only selects the columns read by
+    the product and part fields (limited to ``fields``, if given).
+    """
+    names = set(
+        objects.Product.column_names(fields) +
+        objects.Part.column_names(fields) + LINK_COLUMNS['PRODUCT'])
+    part_columns = [
+        column for name, column in PRODUCT_PART_COLUMNS if name in names]
+    names.difference_update(name for name, column in PRODUCT_PART_COLUMNS)
+    columns = [select_columns(product_columns, names, prefix='P.')]
+    return 'SELECT {} {}'.format(
+        ', '.join(columns + part_columns), PRODUCTS_FROM_SQL)
+
+
+def attach_uoms(parts, uom_map):
+    """
+    Populate the UOM of each part from a map of UOM ids to
+    :cls:`fishbowl.objects.UOM` objects.
+    """
+    for part in parts:
+        uomid = part.get('UOMID')
+        if not uomid:
+            continue
+        uom = uom_map.get(uomid)
+        if uom:
+            part.mapped['UOM'] = uom
+
+
+def build_products(rows, uom_map=None, compact=False):
+    """
+    Build :cls:`fishbowl.objects.Product` objects from the rows of
+    ``PRODUCTS_SQL``, optionally populating their UOMs.
+
+    :param compact: Build :cls:`fishbowl.objects.Record` objects instead,
+        with the part in the ``'Part'`` field rather than a ``part``
+        attribute
+    """
+    products = []
+    schema = part_schema = None
+    for row in rows:
+        uom = None
+        if uom_map is not None:
+            uomid = row.get('UOMID')
+            if uomid:
+                uom = uom_map.get(int(uomid))
+        if compact:
+            if schema is None:
+                schema = objects.RecordSchema(
+                    objects.Product, row, extra=('UOM', 'Part'),
+                    name_field='Num')
+                part_schema = objects.RecordSchema(objects.Part, row)
+            product = schema.record(row)
+            if product is None:
+                continue
+            product.attach(UOM=uom, Part=part_schema.record(row))
+            products.append(product)
+            continue
+        product = objects.Product(row, name=row.get('NUM'))
+        if not product:
+            continue
+        if uom:
+            product.mapped['UOM'] = uom
+        product.part = objects.Part(row)
+        products.append(product)
+    return products
+
+
+def process_pricing_rules(data, rules):
+    """
+    Add the pricing rule rows from a query to ``rules``, a dictionary of
+    customer ids to lists of rules.
+    """
+    for row in data:
+        customer_type = row.pop('CUSTOMERINCLTYPEID')
+        customer_id = row.pop('CUSTOMERINCLID')
+        if customer_type == '1':
+            customer_id = None
+        elif customer_type == '3':
+            customer_id = int(row.pop('CUSTOMERID'))
+        else:
+            customer_id = int(customer_id)
+        customer_pricing = rules.setdefault(customer_id, [])
+        customer_pricing.append(row)
+
+
+def build_address_map(countries, states, addresses, compact=False):
+    """
+    Build a map of account ids to lists of :cls:`fishbowl.objects.Address`
+    objects from country, state and address query rows.
+
+    :param compact: Build :cls:`fishbowl.objects.Record` objects for the
+        addresses instead
+    """
+    country_map = {}
+    for country in countries:
+        country['CODE'] = country['ABBREVIATION']
+        country_map[country['ID']] = objects.Country(country)
+    state_map = dict(
+        (state['ID'], objects.State(state)) for state in states)
+    address_map = {}
+    schema = None
+    for addr in addresses:
+        account_id = addr['ACCOUNTID']
+        addresses = address_map.setdefault(
+            int(account_id) if account_id else None, [])
+        country = country_map.get(addr['COUNTRYID'])
+        state = state_map.get(addr['STATEID'])
+        if compact:
+            if schema is None:
+                schema = objects.RecordSchema(
+                    objects.Address, addr, extra=('Country', 'State'))
+            address = schema.record(addr)
+            if address is not None:
+                address.attach(Country=country, State=state)
+                addresses.append(address)
+            continue
+        address = objects.Address(addr)
+        if address:
+            if country:
+                address.mapped['Country'] = country
+            if state:
+                address.mapped['State'] = state
+            addresses.append(address)
+    return address_map
+
+
+def build_customers(
+        rows, address_map=None, pricing_rules=None, compact=False):
+    """
+    Build :cls:`fishbowl.objects.Customer` objects from customer query rows,
+    optionally populating their addresses and pricing rules.
+
+    :param compact: Build :cls:`fishbowl.objects.Record` objects instead
+    """
+    customers = []
+    schema = None
+    for row in rows:
+        if compact:
+            if schema is None:
+                schema = objects.RecordSchema(
+                    objects.Customer, row,
+                    extra=('Addresses', 'PricingRules'), name_field='Name')
+            customer = schema.record(row)
+            if customer is None:
+                continue
+        else:
             customer = objects.Customer(row)
             if not customer:
                 continue
-            # contact = contact_map.get(row['ACCOUNTID'])
-            # if contact:
-            #     customer.mapped['Attn'] = contact['NAME']
-            if populate_addresses:
-                customer.mapped['Addresses'] = (
-                    address_map.get(customer['AccountID'], []))
-            if populate_pricing_rules:
-                rules = []
-                rules.extend(pricing_rules[None])
-                rules.extend(pricing_rules.get(customer['AccountID'], []))
-                customer.mapped['PricingRules'] = rules
-            customers.append(customer)
-        return customers
+        # contact = contact_map.get(row['ACCOUNTID'])
+        # if contact:
+        #     customer.mapped['Attn'] = contact['NAME']
+        extra = {}
+        if address_map is not None:
+            extra['Addresses'] = address_map.get(customer.get('AccountID'), [])
+        if pricing_rules is not None:
+            rules = []
+            rules.extend(pricing_rules[None])
+            rules.extend(pricing_rules.get(customer.get('AccountID'), []))
+            extra['PricingRules'] = rules
+        if compact:
+            customer.attach(**extra)
+        else:
+            customer.mapped.update(extra)
+        customers.append(customer)
+    return customers
 
 
 def check_status(element, expected=statuscodes.SUCCESS, allow_none=False):
@@ -0,0 +1,259 @@
+"""
+Chunked bulk imports.
+
+A Fishbowl import (``ImportRq``) is a header row followed by data rows, each
+a line of CSV. :cls:`BulkImport` reads the rows lazily from any iterable or
+CSV file and sends them as a series of imports, each no more than a given
+number of rows and bytes, with the header repeated at the start of each.
+
+Example usage::
+
+    bulk = BulkImport(fishbowl, 'ImportPartCost', 'prices.csv')
+    result = bulk.run()
+    if not result.ok:
+        # Fix the data, then carry on from the first failed chunk.
+        result = bulk.run(start_chunk=result.next_chunk)
+"""
+from __future__ import unicode_literals
+import collections
+import csv
+import io
+import itertools
+import logging
+
+import six
+
+from . import statuscodes, xmlrequests
+from .api import FishbowlError
+
+logger = logging.getLogger(__name__)
+
+# Bytes added to each row by its <Row></Row> element.
+ROW_OVERHEAD = len('<Row></Row>\n')
+
+ChunkResult = collections.namedtuple(
+    'ChunkResult', ['index', 'start_row', 'rows', 'ok', 'status', 'message'])
+
+
+def csv_line(values):
+    """
+    Format a sequence of values as a line of CSV (without a line ending).
+    """
+    if six.PY2:
+        output = io.BytesIO()
+        csv.writer(output).writerow(
+            [six.text_type(value).encode('utf-8') for value in values])
+        return output.getvalue().decode('utf-8').rstrip('\r\n')
+    output = io.StringIO()
+    csv.writer(output).writerow(values)
+    return output.getvalue().rstrip('\r\n')
+
+
+def read_csv(csv_file):
+    """
+    Yield the rows of a CSV file (a path or an open text file) as lines of
+    CSV, one per record even if fields span lines.
+    """
+    if isinstance(csv_file, six.string_types):
+        if six.PY2:
+            with open(csv_file, 'rb') as f:
+                for row in csv.reader(f):
+                    yield csv_line([value.decode('utf-8') for value in row])
+            return
+        with io.open(csv_file, newline='', encoding='utf-8') as f:
+            for line in read_csv(f):
+                yield line
+        return
+    for row in csv.reader(csv_file):
+        yield csv_line(row)
+
+
+def import_lines(rows):
+    """
+    Yield rows as lines of CSV. Rows can be lines already, or sequences of
+    values.
+    """
+    for row in rows:
+        if isinstance(row, six.string_types):
+            yield row
+        else:
+            yield csv_line(row)
+
+
+def iter_chunks(lines, max_rows=500, max_bytes=1024 * 1024, encoding='utf-8'):
+    """
+    Split lines into lists of no more than ``max_rows`` lines and (roughly)
+    ``max_bytes`` bytes. A single line larger than ``max_bytes`` gets a chunk
+    of its own.
+    """
+    chunk = []
+    size = 0
+    for line in lines:
+        line_size = len(line.encode(encoding)) + ROW_OVERHEAD
+        if chunk and (
+                len(chunk) >= max_rows or size + line_size > max_bytes):
+            yield chunk
+            chunk = []
+            size = 0
+        chunk.append(line)
+        size += line_size
+    if chunk:
+        yield chunk
+
+
+class BulkImportResult(object):
+    """
+    The outcome of a :meth:`BulkImport.run`: a :cls:`ChunkResult` for each
+    chunk sent, in order.
+    """
+
+    def __init__(self, chunks, start_chunk=0):
+        self.chunks = chunks
+        self.start_chunk = start_chunk
+
+    @property
+    def ok(self):
+        return all(chunk.ok for chunk in self.chunks)
+
+    @property
+    def failures(self):
+        return [chunk for chunk in self.chunks if not chunk.ok]
+
+    @property
+    def next_chunk(self):
+        """
+        The chunk to resume from: the first that failed, or the one after the
+        last chunk sent if they all succeeded.
+        """
+        for chunk in self.chunks:
+            if not chunk.ok:
+                return chunk.index
+        if self.chunks:
+            return self.chunks[-1].index + 1
+        return self.start_chunk
+
+    @property
+    def rows(self):
+        """
+        The number of rows imported successfully.
+        """
+        return sum(chunk.rows for chunk in self.chunks if chunk.ok)
+
+
+class BulkImport(object):
+    """
+    An import sent in chunks, in order on one session or in parallel on a
+    :cls:`fishbowl.pool.FishbowlPool`.
+    """
+
+    def __init__(
+            self, fishbowl, import_type, rows, header=None, max_rows=500,
+            max_bytes=1024 * 1024, pool=None, stop_on_error=True):
+        """
+        :param fishbowl: A connected :cls:`fishbowl.api.Fishbowl` (or
+            ``None`` if ``pool`` is given)
+        :param import_type: The import type, such as ``'ImportPart'``
+        :param rows: An iterable of rows (lines of CSV or sequences of
+            values), or the path of a CSV file. Unless ``header`` is given,
+            the first row is the header.
+        :param header: The header row, if it isn't the first of ``rows``
+        :param max_rows: The most data rows in a chunk
+        :param max_bytes: The (approximate) most bytes of rows in a chunk
+        :param pool: A :cls:`fishbowl.pool.FishbowlPool` to send up to
+            ``pool.size`` chunks at once. Chunks may then be imported out of
+            order.
+        :param stop_on_error: Stop sending chunks after one fails (default
+            ``True``)
+        """
+        self.fishbowl = fishbowl
+        self.import_type = import_type
+        self.rows = rows
+        self.header = header
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.pool = pool
+        self.stop_on_error = stop_on_error
+
+    def lines(self):
+        rows = self.rows
+        if isinstance(rows, six.string_types):
+            rows = read_csv(rows)
+        lines = import_lines(rows)
+        header = self.header
+        if header is None:
+            header = next(lines, None)
+        elif not isinstance(header, six.string_types):
+            header = csv_line(header)
+        return header, lines
+
+    def chunks(self, start_chunk=0):
+        """
+        Yield ``(index, start_row, header, lines)`` for each chunk from
+        ``start_chunk`` on. Earlier chunks are read but not kept.
+        """
+        header, lines = self.lines()
+        start_row = 0
+        chunks = iter_chunks(lines, self.max_rows, self.max_bytes)
+        for index, chunk in enumerate(chunks):
+            if index >= start_chunk:
+                yield index, start_row, header, chunk
+            start_row += len(chunk)
+
+    def send_chunk(self, fishbowl, chunk):
+        """
+        Send one chunk as an import, returning its :cls:`ChunkResult`.
+        """
+        index, start_row, header, lines = chunk
+        request = xmlrequests.ImportRequest(
+            self.import_type, [header] + lines, key=fishbowl.key)
+        try:
+            root = fishbowl.send_message(request)
+            # Use the status of the import, falling back to the envelope's.
+            element = root.find('FbiMsgsRs/ImportRs')
+            if element is None:
+                element = root.find('FbiMsgsRs')
+            if element is None:
+                element = root
+            status = element.get('statusCode')
+            message = (
+                element.get('statusMessage') or
+                statuscodes.get_status(status))
+            ok = status == statuscodes.SUCCESS
+        except FishbowlError as e:
+            ok, status, message = False, None, '{}'.format(e)
+        result = ChunkResult(index, start_row, len(lines), ok, status, message)
+        if ok:
+            logger.info('Imported chunk {} ({} rows from row {})'.format(
+                index, len(lines), start_row))
+        else:
+            logger.warning('Import of chunk {} failed: {}'.format(
+                index, message))
+        return result
+
+    def run(self, start_chunk=0):
+        """
+        Send the chunks from ``start_chunk`` on (such as the
+        :attr:`BulkImportResult.next_chunk` of a previous run).
+
+        :returns: A :cls:`BulkImportResult`
+        """
+        results = []
+        chunks = self.chunks(start_chunk)
+        if self.pool is None:
+            for chunk in chunks:
+                result = self.send_chunk(self.fishbowl, chunk)
+                results.append(result)
+                if not result.ok and self.stop_on_error:
+                    break
+            return BulkImportResult(results, start_chunk)
+        while True:
+            # Only one chunk per session is held in memory at a time.
+            window = list(itertools.islice(chunks, self.pool.size))
+            if not window:
+                break
+            window_results = self.pool.map(self.send_chunk, window)
+            results.extend(window_results)
+            if self.stop_on_error and not all(
+                    result.ok for result in window_results):
+                break
+        return BulkImportResult(results, start_chunk)
@@ -0,0 +1,126 @@
+from __future__ import unicode_literals
+import collections
+import re
+import threading
+import time
+
+import six
+
+# Seconds to keep responses for, by request name. Queries are named by their
+# table when they select from a single table (see :func:`query_cache_name`).
+DEFAULT_TTLS = {
+    'UOMRq': 60 * 60,
+    'TaxRateGetRq': 60 * 60,
+    'COUNTRYCONST': 24 * 60 * 60,
+    'STATECONST': 24 * 60 * 60,
+}
+
+SINGLE_TABLE_RE = re.compile(
+    r'^\s*SELECT\s.+?\sFROM\s+(\w+)(\s+WHERE\s.*)?\s*$',
+    re.IGNORECASE | re.DOTALL)
+
+
+def query_cache_name(query):
+    """
+    Return the name used to look up the TTL of a query: the upper case table
+    name for queries on a single table, otherwise ``'ExecuteQueryRq'``.
+    """
+    match = SINGLE_TABLE_RE.match(query)
+    if not match:
+        return 'ExecuteQueryRq'
+    return match.group(1).upper()
+
+
+def make_key(name, value):
+    """
+    Normalize a request name and value into a hashable cache key.
+    """
+    if isinstance(value, six.string_types):
+        # Ignore insignificant whitespace in SQL.
+        return name, ' '.join(value.split())
+    if isinstance(value, dict):
+        return name, tuple(sorted(
+            (k, make_key(name, v)[1]) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return name, tuple(make_key(name, v)[1] for v in value)
+    return name, value
+
+
+class ResponseCache(object):
+    """
+    A thread-safe cache of API responses with per-request TTLs and a least
+    recently used size bound.
+
+    Only requests whose name has a TTL in ``ttls`` are cached. Example
+    usage::
+
+        fishbowl = Fishbowl(cache=ResponseCache(maxsize=256))
+        fishbowl.get_uom_map()  # Sent to the server.
+        fishbowl.get_uom_map()  # Served from the cache.
+        fishbowl.cache.invalidate('UOMRq')
+    """
+
+    def __init__(self, ttls=None, maxsize=128, clock=time.time):
+        """
+        :param ttls: A dictionary of request names (or query table names) to
+            the number of seconds to cache them for (default
+            :data:`DEFAULT_TTLS`)
+        :param maxsize: The maximum number of responses to keep
+        """
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.maxsize = maxsize
+        self.clock = clock
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def ttl(self, name):
+        return self.ttls.get(name)
+
+    def get(self, name, value=None):
+        """
+        Return the cached data for a request, or ``None`` if it isn't cached
+        or has expired.
+        """
+        key = make_key(name, value)
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None or entry[0] <= self.clock():
+                self.misses += 1
+                return None
+            # Re-insert to mark the entry as the most recently used.
+            self.entries[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def set(self, name, value, data):
+        """
+        Cache the data for a request, if its name has a TTL.
+        """
+        ttl = self.ttl(name)
+        if not ttl:
+            return
+        key = make_key(name, value)
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (self.clock() + ttl, data)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, name=None, value=None):
+        """
+        Remove cached responses: all of them, all of those for a request name,
+        or (if ``value`` is given too) a single one.
+        """
+        with self.lock:
+            if name is None:
+                self.entries.clear()
+            elif value is not None:
+                self.entries.pop(make_key(name, value), None)
+            else:
+                for key in [key for key in self.entries if key[0] == name]:
+                    del self.entries[key]
@@ -0,0 +1,545 @@
+"""
+A loopback stand-in for the Fishbowl server, for tests and benchmarks.
+
+:cls:`FakeFishbowlServer` listens on a local port (or Unix socket) and
+speaks the same length-prefixed XML protocol as the Fishbowl server. It
+handles logins and answers the requests this package sends with synthetic
+data: ``records`` parts, products, customers (each with an address) and rows
+of most tables, plus a handful of UOMs, tax rates, countries and states.
+Queries are understood well enough for the column lists, ``COUNT``,
+``MIN``/``MAX`` and id range paging used by :cls:`fishbowl.api.Fishbowl`.
+
+Example usage::
+
+    with FakeFishbowlServer(records=10000, latency=0.002) as server:
+        fishbowl = server.connect()
+        parts = fishbowl.get_parts()
+"""
+from __future__ import unicode_literals
+import collections
+import csv
+import io
+import os
+import re
+import socket
+import struct
+import threading
+import time
+from xml.sax.saxutils import escape
+
+from lxml import etree
+import six
+from six.moves import socketserver
+
+from . import objects, statuscodes
+from .api import LINK_COLUMNS, Fishbowl, encode_password
+from .pool import FishbowlPool
+from .transport import UnixTransport
+
+# The last modified time of every synthetic row.
+MODIFIED = '2020-01-01 00:00:00'
+
+# Tables that only have a few rows, whatever the number of records.
+SMALL_TABLES = {
+    'UOM': 5,
+    'COUNTRYCONST': 2,
+    'STATECONST': 5,
+    'TAXRATE': 5,
+    'ACCOUNTGROUP': 5,
+}
+
+
+def synthetic_columns(*names):
+    """
+    The columns of a synthetic table: an ``ID``, the given names and a
+    ``DATELASTMODIFIED``.
+    """
+    columns = ['ID']
+    for name in names + ('DATELASTMODIFIED',):
+        if name not in columns:
+            columns.append(name)
+    return columns
+
+
+# The columns of ``SELECT *`` queries, by table.
+TABLE_COLUMNS = {
+    'CUSTOMER': synthetic_columns(
+        *objects.Customer.column_names() + LINK_COLUMNS['CUSTOMER']),
+    'ADDRESS': synthetic_columns(
+        *objects.Address.column_names() + LINK_COLUMNS['ADDRESS']),
+    'COUNTRYCONST': synthetic_columns('NAME', 'ABBREVIATION'),
+    'STATECONST': synthetic_columns('NAME', 'CODE', 'COUNTRYID'),
+    'PRODUCT': synthetic_columns(
+        *objects.Product.column_names() + LINK_COLUMNS['PRODUCT']),
+    'PART': synthetic_columns(*objects.Part.column_names() + ['STDCOST']),
+    'UOM': synthetic_columns('NAME', 'CODE', 'ACTIVEFLAG'),
+    'SO': synthetic_columns(*objects.SalesOrder.column_names()),
+    'SOITEM': synthetic_columns(*objects.SalesOrderItem.column_names()),
+}
+DEFAULT_COLUMNS = synthetic_columns('NAME', 'DESCRIPTION')
+
+# Columns that link to another table's row of the same number.
+LINKED_COLUMNS = set(['ID', 'ACCOUNTID', 'PARTID', 'CUSTOMERID', 'SOID'])
+BOOLEAN_COLUMNS = set([
+    'TAXEXEMPT', 'DEFAULT', 'RESIDENTIAL', 'HASBOM', 'CONFIGURABLE',
+    'INTEGRAL', 'ACTIVE', 'TAXABLE'])
+DECIMAL_COLUMNS = set([
+    'PRICE', 'STDCOST', 'STANDARDCOST', 'CREDITLIMIT', 'PAAMOUNT',
+    'PAPERCENT', 'RATE', 'COST', 'UNITPRICE', 'TOTALPRICE'])
+
+SELECT_RE = re.compile(
+    r'^\s*SELECT\s+(.*?)\s+FROM\s+(\w+)(.*)$', re.IGNORECASE | re.DOTALL)
+AGGREGATE_RE = re.compile(r'^(COUNT|MIN|MAX)\((.*)\)$', re.IGNORECASE)
+ALIAS_RE = re.compile(r'\s+AS\s+', re.IGNORECASE)
+EMPTY_RE = re.compile(r'\b1\s*=\s*0\b')
+RANGE_RE = re.compile(
+    r'([\w.]+)\s*>=\s*(\d+)\s+AND\s+\1\s*<\s*(\d+)', re.IGNORECASE)
+SINCE_RE = re.compile(r"\w+\s*>=\s*'([^']*)'")
+
+
+def column_value(name, index):
+    """
+    The synthetic value of a column in row ``index`` (counting from 1).
+    """
+    name = name.upper()
+    if name in LINKED_COLUMNS:
+        return six.text_type(index)
+    if name.endswith('ID'):
+        return '1'
+    if (name.endswith('FLAG') or name.startswith('IS') or
+            name in BOOLEAN_COLUMNS):
+        return 'true'
+    if name.startswith('DATE'):
+        return MODIFIED
+    if name in ('NUM', 'NUMBER'):
+        return part_number(index)
+    if name in DECIMAL_COLUMNS:
+        return '{}.{:02d}'.format(index % 1000, index % 100)
+    if 'NAME' in name:
+        return customer_name(index)
+    return '{} {}'.format(name.title(), index)
+
+
+def part_number(index):
+    return 'P{:07d}'.format(index)
+
+
+def customer_name(index):
+    return 'Customer {:07d}'.format(index)
+
+
+def record_index(text, prefix):
+    """
+    The row number in a synthetic part number or name, or ``None``.
+    """
+    if not text or not text.startswith(prefix):
+        return None
+    try:
+        return int(text[len(prefix):])
+    except ValueError:
+        return None
+
+
+def elements(values):
+    """
+    Serialize ``(name, text)`` pairs as elements.
+    """
+    return ''.join(
+        '<{0}>{1}</{0}>'.format(name, escape(value)) for name, value in values)
+
+
+def csv_row(values):
+    if six.PY2:
+        output = io.BytesIO()
+        csv.writer(output, quoting=csv.QUOTE_ALL).writerow(
+            [value.encode('utf-8') for value in values])
+        return output.getvalue().decode('utf-8').rstrip('\r\n')
+    output = io.StringIO()
+    csv.writer(output, quoting=csv.QUOTE_ALL).writerow(values)
+    return output.getvalue().rstrip('\r\n')
+
+
+class FakeFishbowlServer(object):
+    """
+    A local server that answers Fishbowl API requests with synthetic data.
+
+    Requests are counted by tag in :attr:`counts`. Responses to requests
+    that don't change anything are cached, so that the server spends as
+    little time as possible on repeated requests.
+    """
+    key = 'FAKEKEY'
+
+    def __init__(
+            self, records=1000, latency=0, username='admin',
+            password='admin', host='127.0.0.1', port=0, cache=True,
+            path=None):
+        """
+        :param records: The number of parts, products, customers and rows of
+            most tables
+        :param latency: Seconds to wait before sending each response
+        :param port: The port to listen on (default any free port)
+        :param cache: Whether to cache responses (default ``True``)
+        :param path: The path of a Unix socket to listen on instead of a
+            port
+        """
+        self.records = records
+        self.latency = latency
+        self.username = username
+        self.password = password
+        self.host = host
+        self.port = port
+        self.path = path
+        self.cache = {} if cache else None
+        self.counts = collections.Counter()
+        self.lock = threading.Lock()
+        self.server = None
+        self.handlers = {
+            'LoginRq': self.login,
+            'ExecuteQueryRq': self.execute_query,
+            'LightPartListRq': self.light_part_list,
+            'UOMRq': self.uoms,
+            'CustomerNameListRq': self.customer_names,
+            'CustomerGetRq': self.customer,
+            'ProductGetRq': self.product,
+            'TaxRateGetRq': self.tax_rates,
+            'GetPOListRq': self.po_list,
+            'AddInventoryRq': self.success,
+            'CycleCountRq': self.success,
+            'ImportRq': self.success,
+            'AddMemoRq': self.success,
+        }
+        # Requests whose responses never change.
+        self.cacheable = set(self.handlers) - set([
+            'LoginRq', 'AddInventoryRq', 'CycleCountRq', 'ImportRq',
+            'AddMemoRq'])
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        """
+        Start listening, serving connections on background threads.
+        """
+        if self.path:
+            server = socketserver.ThreadingUnixStreamServer(
+                self.path, FakeRequestHandler, bind_and_activate=False)
+        else:
+            server = socketserver.ThreadingTCPServer(
+                (self.host, self.port), FakeRequestHandler,
+                bind_and_activate=False)
+            server.allow_reuse_address = True
+        server.daemon_threads = True
+        server.fake = self
+        server.server_bind()
+        server.server_activate()
+        if not self.path:
+            self.port = server.server_address[1]
+        self.server = server
+        thread = threading.Thread(
+            target=server.serve_forever, kwargs={'poll_interval': 0.05})
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def transport(self):
+        """
+        The transport that connects to this server: a
+        :cls:`fishbowl.transport.UnixTransport` if it listens on a Unix
+        socket, otherwise ``None`` (the default).
+        """
+        if self.path:
+            return UnixTransport(self.path)
+        return None
+
+    def connect(self, fishbowl=None, timeout=30):
+        """
+        Log a :cls:`fishbowl.api.Fishbowl` (by default a new one) in to this
+        server.
+        """
+        if fishbowl is None:
+            fishbowl = Fishbowl(transport=self.transport())
+        fishbowl.connect(
+            self.username, self.password, host=self.host, port=self.port,
+            timeout=timeout)
+        return fishbowl
+
+    def pool(self, size=4, timeout=30, **kwargs):
+        """
+        Return a :cls:`fishbowl.pool.FishbowlPool` of sessions logged in to
+        this server.
+        """
+        kwargs.setdefault('transport', self.transport())
+        return FishbowlPool(
+            self.username, self.password, host=self.host, port=self.port,
+            timeout=timeout, size=size, **kwargs)
+
+    def respond(self, message):
+        """
+        Return the response to a serialized request message.
+        """
+        root = etree.fromstring(message)
+        requests = root.find('FbiMsgsRq')
+        if requests is None:
+            return self.envelope('1001', '')
+        key = root.findtext('Ticket/Key')
+        if key != self.key and (
+                len(requests) != 1 or requests[0].tag != 'LoginRq'):
+            return self.envelope('1131', '')
+        responses = []
+        failed = False
+        for request in requests:
+            with self.lock:
+                self.counts[request.tag] += 1
+            status, body = self.handle(request)
+            failed = failed or status != statuscodes.SUCCESS
+            tag = request.tag
+            if tag.endswith('Rq'):
+                tag = tag[:-2] + 'Rs'
+            responses.append('<{0} statusCode="{1}">{2}</{0}>'.format(
+                tag, status, body))
+        status = statuscodes.SUCCESS
+        if failed and len(responses) > 1:
+            status = statuscodes.REQUEST_ERRORS
+        ticket = ''
+        if requests[0].tag == 'LoginRq' and not failed:
+            ticket = '<Ticket><Key>{}</Key></Ticket>'.format(self.key)
+        return self.envelope(status, ''.join(responses), ticket)
+
+    def envelope(self, status, body, ticket=''):
+        return '<FbiXml>{}<FbiMsgsRs statusCode="{}">{}</FbiMsgsRs></FbiXml>'\
+            .format(ticket, status, body).encode('ascii', 'xmlcharrefreplace')
+
+    def handle(self, request):
+        """
+        Return the status code and body of the response to a request element.
+        """
+        handler = self.handlers.get(request.tag)
+        if handler is None:
+            return '1001', ''
+        if self.cache is None or request.tag not in self.cacheable:
+            return handler(request)
+        cache_key = etree.tostring(request)
+        response = self.cache.get(cache_key)
+        if response is None:
+            response = self.cache[cache_key] = handler(request)
+        return response
+
+    def table_size(self, table):
+        return SMALL_TABLES.get(table, self.records)
+
+    def success(self, request):
+        return statuscodes.SUCCESS, ''
+
+    def login(self, request):
+        if (request.findtext('UserName') != self.username or
+                request.findtext('UserPassword') != encode_password(
+                    self.password, Fishbowl.encoding)):
+            return '1120', ''
+        return statuscodes.SUCCESS, ''
+
+    def execute_query(self, request):
+        try:
+            columns, rows = self.query(request.findtext('Query') or '')
+        except ValueError:
+            return '1004', ''
+        lines = [csv_row(columns)]
+        lines.extend(csv_row(row) for row in rows)
+        return statuscodes.SUCCESS, '<Rows>{}</Rows>'.format(''.join(
+            '<Row>{}</Row>'.format(escape(line)) for line in lines))
+
+    def query(self, query):
+        """
+        Return the column names and rows of a ``SELECT`` query on the
+        synthetic tables. Only the first table in the ``FROM`` clause is
+        read; every row has the same last modified time.
+        """
+        match = SELECT_RE.match(query)
+        if not match:
+            raise ValueError('Unsupported query: {}'.format(query))
+        select, table, rest = match.groups()
+        table = table.upper()
+        low, high = 1, self.table_size(table) + 1
+        if EMPTY_RE.search(rest):
+            high = low
+        for key, start, end in RANGE_RE.findall(rest):
+            low, high = max(low, int(start)), min(high, int(end))
+        since = SINCE_RE.search(rest)
+        if since and since.group(1) > MODIFIED:
+            high = low
+        indexes = range(low, max(low, high))
+        columns = []
+        aggregates = []
+        for item in select.split(','):
+            item = item.strip()
+            aggregate = AGGREGATE_RE.match(item)
+            if aggregate:
+                function = aggregate.group(1).upper()
+                aggregates.append(function)
+                columns.append(function)
+            elif item == '*' or item.endswith('.*'):
+                columns.extend(TABLE_COLUMNS.get(table, DEFAULT_COLUMNS))
+            else:
+                # Like the server's database, names are returned in upper
+                # case.
+                columns.append(
+                    ALIAS_RE.split(item)[-1].split('.')[-1].upper())
+        if aggregates:
+            values = {
+                'COUNT': six.text_type(len(indexes)),
+                'MIN': six.text_type(indexes[0]) if indexes else '',
+                'MAX': six.text_type(indexes[-1]) if indexes else '',
+            }
+            return columns, [[values[function] for function in aggregates]]
+        return columns, (
+            [column_value(column, index) for column in columns]
+            for index in indexes)
+
+    def light_part_list(self, request):
+        return statuscodes.SUCCESS, ''.join(
+            '<LightPart>{}</LightPart>'.format(elements([
+                ('PartID', six.text_type(index)),
+                ('Num', part_number(index)),
+                ('Description', 'Part {}'.format(index)),
+                ('UOMID', '1'),
+                ('TypeID', '10'),
+                ('ActiveFlag', 'true'),
+            ]))
+            for index in range(1, self.records + 1))
+
+    def uoms(self, request):
+        return statuscodes.SUCCESS, ''.join(
+            '<UOM>{}</UOM>'.format(elements([
+                ('UOMID', six.text_type(index)),
+                ('Name', 'Unit {}'.format(index)),
+                ('Code', 'u{}'.format(index)),
+                ('Integral', 'true'),
+                ('Active', 'true'),
+                ('Type', 'Count'),
+            ]))
+            for index in range(1, SMALL_TABLES['UOM'] + 1))
+
+    def customer_names(self, request):
+        return statuscodes.SUCCESS, '<Customers>{}</Customers>'.format(
+            elements(
+                ('Name', customer_name(index))
+                for index in range(1, self.records + 1)))
+
+    def customer(self, request):
+        index = record_index(request.findtext('Name'), 'Customer ')
+        if index is None or not 1 <= index <= self.records:
+            return '1011', ''
+        # Fishbowl indents its responses, and nested lists are only read as
+        # lists when their elements have (blank) text.
+        address = (
+            '\n<Address>\n{}<State>\n{}</State>\n<Country>\n{}</Country>\n'
+            '</Address>\n').format(
+                elements([
+                    ('ID', six.text_type(index)),
+                    ('Name', 'Main Office'),
+                    ('Street', '{} Main St'.format(index)),
+                    ('City', 'Murray'),
+                    ('Zip', '84121'),
+                    ('Default', 'true'),
+                    ('Type', 'Main Office'),
+                ]),
+                elements([('Name', 'Utah'), ('Code', 'UT')]),
+                elements([('Name', 'United States'), ('Code', 'US')]))
+        return statuscodes.SUCCESS, '<Customer>\n{}<Addresses>{}</Addresses>'\
+            '\n</Customer>'.format(elements([
+                ('CustomerID', six.text_type(index)),
+                ('AccountID', six.text_type(index)),
+                ('Status', 'Normal'),
+                ('Name', customer_name(index)),
+                ('Number', 'C{:07d}'.format(index)),
+                ('CreditLimit', '1000.00'),
+                ('ActiveFlag', 'true'),
+                ('JobDepth', '1'),
+            ]), address)
+
+    def product(self, request):
+        index = record_index(request.findtext('Number'), 'P')
+        if index is None or not 1 <= index <= self.records:
+            return '1011', ''
+        return statuscodes.SUCCESS, '<Product>{}</Product>'.format(elements([
+            ('ID', six.text_type(index)),
+            ('PartID', six.text_type(index)),
+            ('Num', part_number(index)),
+            ('Description', 'Product {}'.format(index)),
+            ('Price', column_value('PRICE', index)),
+            ('ActiveFlag', 'true'),
+            ('TaxableFlag', 'true'),
+            ('KitFlag', 'false'),
+        ]))
+
+    def tax_rates(self, request):
+        return statuscodes.SUCCESS, ''.join(
+            '<TaxRate>{}</TaxRate>'.format(elements([
+                ('ID', six.text_type(index)),
+                ('Name', 'Tax {}'.format(index)),
+                ('Rate', '.0{}'.format(index)),
+                ('TypeID', '10'),
+                ('ActiveFlag', 'true'),
+            ]))
+            for index in range(1, SMALL_TABLES['TAXRATE'] + 1))
+
+    def po_list(self, request):
+        return statuscodes.SUCCESS, '<POs>{}</POs>'.format(''.join(
+            '<PO>{}</PO>'.format(elements([
+                ('ID', six.text_type(index)),
+                ('Num', 'PO{:07d}'.format(index)),
+                ('Status', 'Issued'),
+            ]))
+            for index in range(1, self.records + 1)))
+
+
+class FakeRequestHandler(socketserver.BaseRequestHandler):
+    """
+    Answers the length-prefixed messages of one client connection.
+    """
+
+    def handle(self):
+        fake = self.server.fake
+        while True:
+            header = self.read(4)
+            if header is None:
+                return
+            message = self.read(struct.unpack('>L', header)[0])
+            if message is None:
+                return
+            response = fake.respond(message)
+            if fake.latency:
+                time.sleep(fake.latency)
+            try:
+                # One write, so that Nagle's algorithm doesn't hold back the
+                # body until the header is acknowledged.
+                self.request.sendall(
+                    struct.pack('>L', len(response)) + response)
+            except socket.error:
+                return
+
+    def read(self, length):
+        """
+        Read exactly ``length`` bytes, or return ``None`` if the client
+        disconnects first.
+        """
+        data = bytearray()
+        while len(data) < length:
+            try:
+                chunk = self.request.recv(min(length - len(data), 65536))
+            except socket.error:
+                return None
+            if not chunk:
+                return None
+            data.extend(chunk)
+        return bytes(data)
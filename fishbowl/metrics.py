@@ -0,0 +1,266 @@
+"""
+Per-phase timing of the requests a Fishbowl session sends.
+
+Pass a collector as the ``metrics`` of a :cls:`fishbowl.api.Fishbowl` (or
+:cls:`fishbowl.pool.FishbowlPool`) and each request's time is split into
+phases, keyed by the request's tag (such as ``'ExecuteQueryRq'``):
+
+``build``
+    Serializing the request to XML
+``send``
+    Writing the request to the socket
+``wait``
+    From the end of the send to the first byte of the response
+``receive``
+    Reading the rest of the response
+``parse``
+    Parsing the response XML
+``objects``
+    Building :cls:`fishbowl.objects.FishbowlObject` objects from the
+    response, for the methods that return them
+
+The number of requests, bytes sent and received, and objects built are
+counted too.
+
+A collector is any object with the methods of :cls:`Metrics`:
+``observe(tag, phase, seconds)`` and ``count(tag, name, value)``. They are
+called from whichever thread sent the request. :cls:`Metrics` keeps a
+histogram of each phase in memory, which can be printed with
+:meth:`Metrics.summary` or exported for Prometheus with
+:meth:`Metrics.prometheus`.
+
+Example usage::
+
+    metrics = Metrics()
+    fishbowl = Fishbowl(metrics=metrics)
+    fishbowl.connect(username='admin', password='admin')
+    fishbowl.get_customers_fast()
+    print(metrics.summary())
+"""
+from __future__ import unicode_literals
+import bisect
+import collections
+import threading
+import time
+
+PHASES = ('build', 'send', 'wait', 'receive', 'parse', 'objects')
+
+# Upper bounds (in seconds) of the histogram buckets.
+BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+COUNTER_HELP = collections.OrderedDict([
+    ('requests', 'Requests sent.'),
+    ('bytes_sent', 'Bytes sent, including frame headers.'),
+    ('bytes_received', 'Bytes received, including frame headers.'),
+    ('objects', 'Objects built from responses.'),
+])
+
+# A monotonic clock where there is one (Python 3).
+clock = getattr(time, 'perf_counter', time.time)
+
+
+class Histogram(object):
+    """
+    Counts of observed values in buckets, with their sum and range.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        # The last count is of values above the last bucket.
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """
+        Estimate the ``q`` quantile (between 0 and 1) by interpolating within
+        the bucket it falls in.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = (
+                    self.buckets[index] if index < len(self.buckets)
+                    else self.max)
+                lower = max(lower, self.min)
+                upper = min(upper, self.max)
+                fraction = (rank - seen) / float(bucket_count)
+                return lower + (upper - lower) * fraction
+            seen += bucket_count
+        return self.max
+
+    def cumulative(self):
+        """
+        Yield ``(upper_bound, count)`` for each bucket, counting the values
+        less than or equal to the bound, ending with an infinite bound.
+        """
+        total = 0
+        for bound, bucket_count in zip(
+                self.buckets + (float('inf'),), self.counts):
+            total += bucket_count
+            yield bound, total
+
+
+class Metrics(object):
+    """
+    A collector keeping a :cls:`Histogram` of each phase of each request tag,
+    and totals of the counts. One collector can be shared by several
+    sessions (and threads).
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.histograms = {}
+        self.counters = collections.defaultdict(int)
+        self.lock = threading.Lock()
+
+    def observe(self, tag, phase, seconds):
+        """
+        Record ``seconds`` spent in ``phase`` of a ``tag`` request.
+        """
+        key = (tag, phase)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def count(self, tag, name, value=1):
+        """
+        Add ``value`` to the ``name`` counter of a ``tag`` request.
+        """
+        with self.lock:
+            self.counters[(tag, name)] += value
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def snapshot(self):
+        """
+        Copies of the histograms and counters, sorted by tag and phase.
+        """
+        with self.lock:
+            histograms = [
+                (key, copy_histogram(histogram))
+                for key, histogram in self.histograms.items()]
+            counters = sorted(self.counters.items())
+        histograms.sort(key=lambda item: (
+            item[0][0], phase_order(item[0][1])))
+        return histograms, counters
+
+    def summary(self):
+        """
+        A table of the count, total, mean, median, 95th percentile and
+        maximum time of each phase of each request tag, followed by the
+        counters.
+        """
+        histograms, counters = self.snapshot()
+        lines = ['{:<28}  {:<8}  {:>7}  {:>9}  {:>9}  {:>9}  {:>9}  {:>9}'
+                 .format('request', 'phase', 'count', 'total s', 'mean ms',
+                         'p50 ms', 'p95 ms', 'max ms')]
+        for (tag, phase), histogram in histograms:
+            lines.append(
+                '{:<28}  {:<8}  {:>7}  {:>9.3f}  {:>9.3f}  {:>9.3f}  '
+                '{:>9.3f}  {:>9.3f}'.format(
+                    tag, phase, histogram.count, histogram.sum,
+                    histogram.mean * 1000, histogram.quantile(0.5) * 1000,
+                    histogram.quantile(0.95) * 1000,
+                    (histogram.max or 0) * 1000))
+        if counters:
+            lines.append('')
+            lines.append('{:<28}  {:<16}  {:>12}'.format(
+                'request', 'counter', 'total'))
+            for (tag, name), value in counters:
+                lines.append('{:<28}  {:<16}  {:>12}'.format(tag, name, value))
+        return '\n'.join(lines)
+
+    def prometheus(self, prefix='fishbowl'):
+        """
+        The metrics in the Prometheus text exposition format: a
+        ``<prefix>_phase_seconds`` histogram labelled by ``request`` and
+        ``phase``, and a ``<prefix>_<counter>_total`` counter for each
+        counter labelled by ``request``.
+        """
+        histograms, counters = self.snapshot()
+        name = '{}_phase_seconds'.format(prefix)
+        lines = [
+            '# HELP {} Time spent in each phase of a request.'.format(name),
+            '# TYPE {} histogram'.format(name),
+        ]
+        for (tag, phase), histogram in histograms:
+            labels = 'request="{}",phase="{}"'.format(
+                escape_label(tag), escape_label(phase))
+            for bound, total in histogram.cumulative():
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(
+                    name, labels, format_value(bound), total))
+            lines.append('{}_sum{{{}}} {}'.format(
+                name, labels, format_value(histogram.sum)))
+            lines.append('{}_count{{{}}} {}'.format(
+                name, labels, histogram.count))
+        by_name = collections.OrderedDict(
+            (counter, []) for counter in COUNTER_HELP)
+        for (tag, counter), value in counters:
+            by_name.setdefault(counter, []).append((tag, value))
+        for counter, values in by_name.items():
+            if not values:
+                continue
+            name = '{}_{}_total'.format(prefix, counter)
+            lines.append('# HELP {} {}'.format(
+                name, COUNTER_HELP.get(counter, counter)))
+            lines.append('# TYPE {} counter'.format(name))
+            for tag, value in values:
+                lines.append('{}{{request="{}"}} {}'.format(
+                    name, escape_label(tag), value))
+        return '\n'.join(lines) + '\n'
+
+
+def copy_histogram(histogram):
+    copy = Histogram(histogram.buckets)
+    copy.counts = list(histogram.counts)
+    copy.count = histogram.count
+    copy.sum = histogram.sum
+    copy.min = histogram.min
+    copy.max = histogram.max
+    return copy
+
+
+def phase_order(phase):
+    try:
+        return PHASES.index(phase)
+    except ValueError:
+        return len(PHASES)
+
+
+def escape_label(value):
+    return (
+        value.replace('\\', '\\\\').replace('"', '\\"')
+        .replace('\n', '\\n'))
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
@@ -0,0 +1,409 @@
+"""
+A local SQLite mirror of the Fishbowl reference and catalog tables.
+
+:cls:`Mirror` keeps products, parts, UOMs, customers, addresses and pricing
+rules in a SQLite database, refreshed through
+:cls:`fishbowl.sync.SyncEngine` on a schedule or on demand. Reads are served
+from the database with the same builders as the fast loaders, so they keep
+working when the server is slow or unreachable.
+
+The mirrored tables have the names and columns of the Fishbowl tables, so
+the loader queries (such as ``PRODUCTS_SQL``) run against them unchanged.
+
+Example usage::
+
+    pool = FishbowlPool(username='admin', password='admin', size=2)
+    mirror = Mirror(pool, path='fishbowl.db', refresh_interval=15 * 60)
+    mirror.refresh()
+    mirror.start()
+    products = mirror.get_products()
+"""
+from __future__ import unicode_literals
+import itertools
+import logging
+import socket
+import sqlite3
+import threading
+import time
+
+from . import objects
+from .api import (
+    FishbowlError, PRICING_RULES_SQL, CUSTOMER_GROUP_PRICING_RULES_SQL,
+    PRODUCTS_SQL, query_datetime, build_products, process_pricing_rules,
+    build_address_map, build_customers)
+from .pool import FishbowlPool
+from .sync import Entity, SyncEngine
+
+logger = logging.getLogger(__name__)
+
+# Tables without a DATELASTMODIFIED column are reloaded in full.
+MIRROR_ENTITIES = (
+    Entity('UOM', 'UOM', modified=None),
+    Entity('PART', 'PART', objects.Part),
+    Entity('PRODUCT', 'PRODUCT', objects.Product),
+    Entity('CUSTOMER', 'CUSTOMER', objects.Customer),
+    Entity('COUNTRYCONST', 'COUNTRYCONST', objects.Country, modified=None),
+    Entity('STATECONST', 'STATECONST', objects.State, modified=None),
+    Entity('ADDRESS', 'ADDRESS', objects.Address, modified=None),
+    Entity('PRICINGRULE', 'PRICINGRULE', modified=None),
+    Entity('ACCOUNTGROUP', 'ACCOUNTGROUP', modified=None),
+    Entity('ACCOUNTGROUPRELATION', 'ACCOUNTGROUPRELATION', modified=None),
+)
+
+# Columns to index, by table. Indexes are only made for columns the table
+# has.
+MIRROR_INDEXES = {
+    'PART': ['NUM'],
+    'PRODUCT': ['NUM', 'PARTID'],
+    'CUSTOMER': ['NAME', 'NUMBER', 'ACCOUNTID'],
+    'ADDRESS': ['ACCOUNTID'],
+    'PRICINGRULE': ['PRODUCTINCLID', 'CUSTOMERINCLID'],
+    'ACCOUNTGROUPRELATION': ['ACCOUNTID', 'GROUPID'],
+}
+
+# Rows are written in chunks of this many, so readers aren't blocked while
+# rows arrive from the server.
+UPSERT_CHUNK_SIZE = 1000
+
+WATERMARK_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def quote(name):
+    """
+    Quote a SQLite identifier.
+    """
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+class SQLiteStore(object):
+    """
+    A :cls:`fishbowl.sync.SyncEngine` store that keeps rows in SQLite
+    tables, one per entity.
+
+    Tables get a ``_key`` primary key for the row id and a text column for
+    each column in the rows, added as new columns are seen. The connection
+    can be shared between threads.
+    """
+
+    def __init__(self, path=':memory:', indexes=None):
+        """
+        :param path: The database file (default an in-memory database)
+        :param indexes: A dictionary of table names to lists of columns to
+            index
+        """
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.indexes = indexes or {}
+        self.columns = {}
+        with self.lock, self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS _watermark '
+                '(name TEXT PRIMARY KEY, value TEXT)')
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def table_columns(self, name):
+        """
+        Return the columns of a table (without ``_key``), or ``None`` if the
+        table doesn't exist.
+        """
+        with self.lock:
+            if name not in self.columns:
+                info = self.connection.execute(
+                    'PRAGMA table_info({})'.format(quote(name))).fetchall()
+                if not info:
+                    return None
+                self.columns[name] = [
+                    column[1] for column in info if column[1] != '_key']
+            return self.columns[name]
+
+    def ensure_table(self, name, columns):
+        """
+        Create a table, or add any of ``columns`` it doesn't have yet, and
+        its indexes.
+        """
+        existing = self.table_columns(name)
+        if existing is None:
+            self.connection.execute('CREATE TABLE {} ({})'.format(
+                quote(name), ', '.join(
+                    ['_key INTEGER PRIMARY KEY'] +
+                    ['{} TEXT'.format(quote(column)) for column in columns])))
+            self.columns[name] = list(columns)
+        else:
+            known = set(column.upper() for column in existing)
+            for column in columns:
+                if column.upper() not in known:
+                    self.connection.execute(
+                        'ALTER TABLE {} ADD COLUMN {} TEXT'.format(
+                            quote(name), quote(column)))
+                    existing.append(column)
+        known = set(column.upper() for column in self.columns[name])
+        for column in self.indexes.get(name, []):
+            if column.upper() in known:
+                self.connection.execute(
+                    'CREATE INDEX IF NOT EXISTS {} ON {} ({})'.format(
+                        quote('ix_{}_{}'.format(name, column)), quote(name),
+                        quote(column)))
+
+    def get_watermark(self, name):
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT value FROM _watermark WHERE name = ?',
+                (name,)).fetchone()
+        if row is None:
+            return None
+        return query_datetime(row[0])
+
+    def set_watermark(self, name, value):
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO _watermark (name, value) '
+                'VALUES (?, ?)', (name, value.strftime(WATERMARK_FORMAT)))
+
+    def upsert(self, name, rows):
+        """
+        Add or replace rows, given as ``(id, row)`` pairs.
+        """
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, UPSERT_CHUNK_SIZE))
+            if not chunk:
+                return
+            columns = []
+            seen = set()
+            for key, row in chunk:
+                for column in row:
+                    if column not in seen:
+                        seen.add(column)
+                        columns.append(column)
+            with self.lock, self.connection:
+                self.ensure_table(name, columns)
+                self.connection.executemany(
+                    'INSERT OR REPLACE INTO {} ({}) VALUES ({})'.format(
+                        quote(name),
+                        ', '.join(['_key'] + [quote(c) for c in columns]),
+                        ', '.join('?' * (len(columns) + 1))),
+                    [(key,) + tuple(row.get(column) for column in columns)
+                     for key, row in chunk])
+
+    def delete(self, name, keys):
+        with self.lock, self.connection:
+            if self.table_columns(name) is None:
+                return
+            self.connection.executemany(
+                'DELETE FROM {} WHERE _key = ?'.format(quote(name)),
+                [(key,) for key in keys])
+
+    def keys(self, name):
+        with self.lock:
+            if self.table_columns(name) is None:
+                return set()
+            return set(key for key, in self.connection.execute(
+                'SELECT _key FROM {}'.format(quote(name))))
+
+    def get(self, name, key):
+        with self.lock:
+            if self.table_columns(name) is None:
+                return None
+            rows = self.query(
+                'SELECT * FROM {} WHERE _key = ?'.format(quote(name)), (key,))
+        return rows[0] if rows else None
+
+    def rows(self, name):
+        with self.lock:
+            if self.table_columns(name) is None:
+                return []
+            return self.query('SELECT * FROM {}'.format(quote(name)))
+
+    def query(self, sql, params=()):
+        """
+        Run a query, returning the rows as dictionaries with upper case
+        column names (as the Fishbowl server returns them).
+        """
+        with self.lock:
+            cursor = self.connection.execute(sql, params)
+            names = [column[0].upper() for column in cursor.description]
+            rows = cursor.fetchall()
+        return [
+            dict((name, value) for name, value in zip(names, row)
+                 if name != '_KEY')
+            for row in rows]
+
+
+class Mirror(object):
+    """
+    A local copy of the Fishbowl catalog and customer tables, with read
+    methods like those of :cls:`fishbowl.api.Fishbowl`.
+    """
+
+    def __init__(
+            self, fishbowl, path=':memory:', entities=MIRROR_ENTITIES,
+            refresh_interval=15 * 60, clock=time.time):
+        """
+        :param fishbowl: A :cls:`fishbowl.pool.FishbowlPool` to take a
+            session from for each refresh, or a connected
+            :cls:`fishbowl.api.Fishbowl` to refresh from (only on demand, as
+            a session can't be shared with a background thread)
+        :param path: The SQLite database file (default an in-memory
+            database)
+        :param refresh_interval: Seconds between refreshes, for
+            :meth:`refresh_if_due` and :meth:`start`
+        """
+        self.pool = None
+        if isinstance(fishbowl, FishbowlPool):
+            self.pool, fishbowl = fishbowl, None
+        self.store = SQLiteStore(path, indexes=MIRROR_INDEXES)
+        self.engine = SyncEngine(fishbowl, self.store, entities)
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self.last_refresh = None
+        self.refresh_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def refresh(self, names=None):
+        """
+        Bring some (or by default all) of the mirrored tables up to date.
+
+        :returns: A list of :cls:`fishbowl.sync.SyncResult` tuples
+        """
+        with self.refresh_lock:
+            if self.pool is None:
+                results = self.engine.sync(names)
+            else:
+                with self.pool.session() as fishbowl:
+                    self.engine.fishbowl = fishbowl
+                    try:
+                        results = self.engine.sync(names)
+                    finally:
+                        self.engine.fishbowl = None
+            self.last_refresh = self.clock()
+        return results
+
+    def refresh_if_due(self):
+        """
+        Refresh if the refresh interval has passed since the last refresh.
+
+        Errors talking to the server are logged rather than raised, and the
+        mirror keeps serving the data it has.
+
+        :returns: Whether the mirror was refreshed
+        """
+        if (self.last_refresh is not None and
+                self.clock() - self.last_refresh < self.refresh_interval):
+            return False
+        try:
+            self.refresh()
+        except (FishbowlError, socket.error) as e:
+            logger.warning('Mirror refresh failed: {}'.format(e))
+            return False
+        return True
+
+    def start(self):
+        """
+        Refresh in a background thread every ``refresh_interval`` seconds.
+
+        The mirror must have been made with a pool. Any error in a refresh is
+        logged, and the thread carries on.
+        """
+        if self.pool is None:
+            raise ValueError('Background refreshes need a FishbowlPool')
+        if self.thread is not None:
+            return
+        self.stopped.clear()
+
+        def run():
+            while True:
+                try:
+                    self.refresh_if_due()
+                except Exception:
+                    logger.exception('Mirror refresh failed')
+                if self.stopped.wait(self.refresh_interval):
+                    return
+
+        self.thread = threading.Thread(target=run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop the background refreshes.
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def close(self):
+        self.stop()
+        self.store.close()
+
+    def query(self, sql, params=()):
+        """
+        Run a query on the mirror, returning a list of row dictionaries.
+        """
+        return self.store.query(sql, params)
+
+    def table_query(self, sql, *tables):
+        """
+        Run a query on the mirror if all of ``tables`` have been synced,
+        otherwise return no rows.
+        """
+        for table in tables:
+            if self.store.table_columns(table) is None:
+                return []
+        return self.query(sql)
+
+    def get_uom_map(self):
+        """
+        :returns: A dictionary of UOM ids to :cls:`fishbowl.objects.UOM`
+        """
+        return dict(
+            (uom['UOMID'], uom) for uom in [
+                objects.UOM(row) for row in
+                self.table_query('SELECT *, ID AS UOMID FROM UOM', 'UOM')])
+
+    def get_products(self, populate_uoms=True, compact=False):
+        """
+        See :meth:`fishbowl.api.Fishbowl.get_products_fast`.
+        """
+        uom_map = self.get_uom_map() if populate_uoms else None
+        rows = self.table_query(PRODUCTS_SQL, 'PRODUCT', 'PART')
+        return build_products(rows, uom_map, compact=compact)
+
+    def get_pricing_rules(self):
+        """
+        See :meth:`fishbowl.api.Fishbowl.get_pricing_rules`.
+        """
+        pricing_rules = {None: []}
+        process_pricing_rules(
+            self.table_query(PRICING_RULES_SQL, 'PRICINGRULE', 'PRODUCT'),
+            pricing_rules)
+        process_pricing_rules(
+            self.table_query(
+                CUSTOMER_GROUP_PRICING_RULES_SQL, 'PRICINGRULE', 'PRODUCT',
+                'ACCOUNTGROUP', 'ACCOUNTGROUPRELATION', 'CUSTOMER'),
+            pricing_rules)
+        return pricing_rules
+
+    def get_customers(
+            self, populate_addresses=True, populate_pricing_rules=False,
+            compact=False):
+        """
+        See :meth:`fishbowl.api.Fishbowl.get_customers_fast`.
+        """
+        address_map = None
+        if populate_addresses:
+            address_map = build_address_map(
+                self.table_query('SELECT * FROM COUNTRYCONST', 'COUNTRYCONST'),
+                self.table_query('SELECT * FROM STATECONST', 'STATECONST'),
+                self.table_query('SELECT * FROM ADDRESS', 'ADDRESS'),
+                compact=compact)
+        pricing_rules = None
+        if populate_pricing_rules:
+            pricing_rules = self.get_pricing_rules()
+        return build_customers(
+            self.table_query('SELECT * FROM CUSTOMER', 'CUSTOMER'),
+            address_map, pricing_rules, compact=compact)
@@ -1,4 +1,5 @@
 from __future__ import unicode_literals
+import abc
 import collections
 import sys
 import inspect
@@ -28,8 +29,99 @@ def all_fishbowl_objects():
     ))
 
 
+# The object classes defined in this module, by name. Used to parse lists
+# whose field parser doesn't name the classes they may hold.
+registry = {}
+
+# Returned by field converters for values that should be left out.
+SKIP = object()
+
+
+def is_scalar(parser):
+    """
+    Whether a field parser reads a single value (rather than a nested object
+    or list).
+    """
+    return not (isinstance(parser, (dict, list)) or (
+        inspect.isclass(parser) and issubclass(parser, FishbowlObject)))
+
+
+def compile_fields(fields, id_field=None):
+    """
+    Compile a fields map into a parsing plan: a list of
+    ``(field_name, lower_case_name, convert)`` tuples, where ``convert`` is
+    ``None`` for text fields or else a callable taking the object being parsed
+    and the value.
+    """
+    items = list(fields.items())
+    if id_field and 'ID' not in fields:
+        items.append(('ID', int))
+    return [
+        (field_name, field_name.lower(), field_converter(parser, id_field))
+        for field_name, parser in items]
+
+
+def field_converter(parser, id_field=None):
+    """
+    Return a converter for a field parser (see :func:`compile_fields`).
+    """
+    if isinstance(parser, dict):
+        plan = compile_fields(parser, id_field)
+
+        def convert(obj, value):
+            if not value:
+                return SKIP
+            if isinstance(value, list):
+                value = value[0]
+            return obj.parse_plan(value, plan, id_field)
+
+        return convert
+    if isinstance(parser, list):
+        classes = dict((cls.__name__, cls) for cls in parser) or None
+
+        def convert(obj, value):
+            child_classes = classes or registry
+            if not isinstance(value, list):
+                value = [value]
+            new_value = []
+            for value_item in value:
+                for tag, child in value_item.items():
+                    child_parser = child_classes.get(tag)
+                    if child_parser:
+                        new_value.append(child_parser(child))
+            return new_value
+
+        return convert
+    if not parser:
+        return None
+
+    def convert(obj, value):
+        try:
+            return parser(value)
+        except Exception:
+            return SKIP
+
+    return convert
+
+
+class FishbowlObjectMeta(abc.ABCMeta):
+    """
+    Compiles the parsing plan for the ``fields`` of each object class when
+    the class is created.
+    """
+
+    def __init__(cls, name, bases, attrs):
+        super(FishbowlObjectMeta, cls).__init__(name, bases, attrs)
+        fields = getattr(cls, 'fields', None)
+        if fields is not None:
+            cls._plan = (fields, compile_fields(fields, cls.id_field))
+        if cls.__module__ == __name__:
+            registry[name] = cls
+
+
 @six.python_2_unicode_compatible
-class FishbowlObject(collections.Mapping):
+class FishbowlObject(
+        six.with_metaclass(FishbowlObjectMeta, collections.Mapping)):
     id_field = None
     name_attr = None
     encoding = 'latin-1'
@@ -67,56 +159,75 @@ class FishbowlObject(collections.Mapping):
     def mapped(self, value):
         self._mapped = value
 
+    @property
+    def loaded(self):
+        return hasattr(self, '_mapped')
+
+    def load(self, data):
+        """
+        Populate the object from its data, without using the lazy loader.
+        """
+        self.mapped = self.parse_fields(data, self.fields)
+
+    @classmethod
+    def column_names(cls, fields=None):
+        """
+        Return the upper case names of the fields that can be read straight
+        from a database column, i.e. those which aren't nested objects or
+        lists.
+
+        :param fields: An optional iterable of field names to limit the
+            result to
+        """
+        if fields is not None:
+            fields = set(field.lower() for field in fields)
+        names = []
+        for field_name, parser in cls.fields.items():
+            if not is_scalar(parser):
+                continue
+            if fields is not None and field_name.lower() not in fields:
+                continue
+            names.append(field_name.upper())
+        # The id field can also be read from an ID column.
+        if cls.id_field and 'ID' not in cls.fields and (
+                fields is None or cls.id_field.lower() in fields):
+            names.append('ID')
+        return names
+
     def parse_fields(self, data, fields):
+        cls = type(self)
+        plan_fields, plan = cls.__dict__.get('_plan', (None, None))
+        if fields is not plan_fields:
+            plan = compile_fields(fields, self.id_field)
+            if fields is cls.fields:
+                # The fields were replaced after the class was created.
+                cls._plan = (fields, plan)
+        return self.parse_plan(data, plan, self.id_field)
+
+    def parse_plan(self, data, plan, id_field=None):
+        """
+        Parse data using a plan from :func:`compile_fields`.
+        """
         if data is None:
             return {}
         if not isinstance(data, dict):
             data = self.get_xml_data(data)
         output = {}
-        items = list(fields.items())
-        if self.id_field and 'ID' not in fields:
-            items.append(('ID', int))
         # Load the data in without case sensitivity.
-        data_map = dict((k.lower(), k) for k in data)
-        for field_name, parser in items:
-            key = data_map.get(field_name.lower())
+        data = {k.lower(): v for k, v in data.items()}
+        for field_name, key, convert in plan:
             value = data.get(key)
             if value is None:
                 continue
-            if isinstance(parser, dict):
-                if not value:
+            if convert is not None:
+                value = convert(self, value)
+                if value is SKIP:
                     continue
-                if isinstance(value, list):
-                    value = value[0]
-                value = self.parse_fields(value, parser)
-            elif isinstance(parser, list):
-                new_value = []
-                if parser:
-                    classes = dict((cls.__name__, cls) for cls in parser)
-                else:
-                    classes = all_fishbowl_objects()
-                if not isinstance(value, list):
-                    value = [value]
-                for value_item in value:
-                    for tag, child in value_item.items():
-                        child_parser = classes.get(tag)
-                        if not child_parser:
-                            continue
-                        new_value.append(child_parser(child))
-                value = new_value
-            elif isinstance(parser, FishbowlObject):
-                value = parser(data)
-            else:
-                if parser:
-                    try:
-                        value = parser(value)
-                    except Exception:
-                        continue
             output[field_name] = value
-        if self.id_field and self.id_field not in output:
+        if id_field and id_field not in output:
             value = output.pop('ID', None)
             if value:
-                output[self.id_field] = value
+                output[id_field] = value
         return output
 
     def get_xml_data(self, base_el):
@@ -157,14 +268,144 @@ class FishbowlObject(collections.Mapping):
         return self.squash_obj(self.mapped)
 
     def squash_obj(self, obj):
-        if isinstance(obj, dict):
-            return dict(
-                (key, self.squash_obj(value)) for key, value in obj.items())
-        if isinstance(obj, list):
-            return [self.squash_obj(value) for value in obj]
-        if isinstance(obj, FishbowlObject):
-            return obj.squash()
-        return obj
+        return squash(obj)
+
+
+def squash(obj):
+    """
+    Convert objects (and records) to plain dictionaries, recursively.
+    """
+    if isinstance(obj, dict):
+        return dict((key, squash(value)) for key, value in obj.items())
+    if isinstance(obj, list):
+        return [squash(value) for value in obj]
+    if isinstance(obj, (FishbowlObject, Record)):
+        return obj.squash()
+    return obj
+
+
+# Text columns stop being interned once they have more distinct values than
+# this in one result set.
+INTERN_LIMIT = 1000
+
+
+class RecordSchema(object):
+    """
+    The layout shared by the :cls:`Record` objects built from the rows of one
+    query: the field names, one index of names to positions, the columns and
+    converters to read each field with, and the tables used to intern
+    repeated text values (such as status, currency and UOM codes).
+    """
+
+    def __init__(self, cls, columns, extra=(), name_field=None):
+        """
+        :param cls: The :cls:`FishbowlObject` class whose scalar fields to
+            read from the rows
+        :param columns: The column names of the rows (matched to field names
+            without case sensitivity)
+        :param extra: Names of fields to fill in later with
+            :meth:`Record.attach`, such as nested objects
+        :param name_field: The field used as the string value of a record
+        """
+        columns = dict((column.lower(), column) for column in columns)
+        self.readers = []
+        fields = []
+        for field_name, parser in cls.fields.items():
+            if not is_scalar(parser):
+                continue
+            column = columns.get(field_name.lower())
+            if column is None and field_name == cls.id_field:
+                column = columns.get('id')
+            if column is None:
+                continue
+            convert = field_converter(parser)
+            # Only text values are interned.
+            interned = {} if convert is None else None
+            self.readers.append((column, convert, interned))
+            fields.append(field_name)
+        self.fields = tuple(fields) + tuple(extra)
+        self.index = dict((name, i) for i, name in enumerate(self.fields))
+        self.padding = (SKIP,) * len(extra)
+        self.name_field = name_field
+
+    def record(self, row):
+        """
+        Build a record from a row dictionary, or return ``None`` if the row
+        has none of the fields.
+        """
+        values = []
+        found = False
+        for i, (column, convert, interned) in enumerate(self.readers):
+            value = row.get(column)
+            if value is None:
+                value = SKIP
+            elif convert is not None:
+                value = convert(None, value)
+            elif interned is not None:
+                value = interned.setdefault(value, value)
+                if len(interned) > INTERN_LIMIT:
+                    # Not a low cardinality column, so stop interning it.
+                    self.readers[i] = (column, convert, None)
+            if value is not SKIP:
+                found = True
+            values.append(value)
+        if not found:
+            return None
+        return Record(self, tuple(values) + self.padding)
+
+
+@six.python_2_unicode_compatible
+class Record(collections.Mapping):
+    """
+    A compact, read-only alternative to a :cls:`FishbowlObject` for bulk
+    query results.
+
+    The values are kept in a tuple, and the field names and their positions
+    in a :cls:`RecordSchema` shared by all the records of a result set.
+    Fields without a value are left out of the mapping, as they are for
+    objects.
+    """
+    __slots__ = ('schema', 'values')
+
+    def __init__(self, schema, values):
+        self.schema = schema
+        self.values = values
+
+    def __getitem__(self, key):
+        value = self.values[self.schema.index[key]]
+        if value is SKIP:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        for name, value in zip(self.schema.fields, self.values):
+            if value is not SKIP:
+                yield name
+
+    def __len__(self):
+        return len(self.values) - self.values.count(SKIP)
+
+    def __str__(self):
+        if not self.schema.name_field:
+            return ''
+        return self.get(self.schema.name_field) or ''
+
+    def __repr__(self):
+        return '<Record {!r}>'.format(dict(self))
+
+    def attach(self, **values):
+        """
+        Fill in extra fields of the schema, such as nested objects. Only
+        meant to be used while the record is being built.
+        """
+        new_values = list(self.values)
+        for name, value in values.items():
+            if value is not None:
+                new_values[self.schema.index[name]] = value
+        self.values = tuple(new_values)
+
+    def squash(self):
+        return dict((key, squash(value)) for key, value in self.items())
 
 
 class CustomListItem(FishbowlObject):
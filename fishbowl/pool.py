@@ -0,0 +1,298 @@
+from __future__ import unicode_literals
+import collections
+import contextlib
+import logging
+import socket
+import threading
+import time
+
+from . import xmlrequests
+from .api import (
+    Fishbowl, FishbowlError, FishbowlConnectionError, FishbowlTimeoutError)
+
+logger = logging.getLogger(__name__)
+
+
+class FishbowlPoolError(FishbowlError):
+    pass
+
+
+def default_health_check(fishbowl):
+    """
+    Check an idle session is still usable by sending a small request.
+
+    The request is built rather than named so a response cache shared by
+    the pool's sessions can't answer it without going to the server.
+    """
+    fishbowl.send_request(
+        xmlrequests.SimpleRequest('UOMRq', key=fishbowl.key),
+        response_node_name='UOMRs', single=False)
+
+
+class FishbowlPool(object):
+    """
+    A bounded pool of logged in :cls:`fishbowl.api.Fishbowl` sessions.
+
+    Each session holds one socket and one login key, so ``size`` caps the
+    number of logins the pool makes to the server. Sessions are handed out
+    one caller at a time through :meth:`session`.
+
+    Example usage::
+
+        pool = FishbowlPool(username='admin', password='admin', size=4)
+        with pool.session() as fishbowl:
+            fishbowl.get_taxrates()
+        pool.close()
+    """
+    fishbowl_class = Fishbowl
+
+    def __init__(
+            self, username, password, host=None, port=None, timeout=5,
+            size=4, initial=None, check_interval=60, health_check=None,
+            cache=None, recorder=None, metrics=None, wire_log=None,
+            transport=None):
+        """
+        :param size: The maximum number of sessions (and so logins) open at
+            once (default ``4``)
+        :param initial: How many sessions to log in concurrently when the
+            pool is created (default ``size``)
+        :param check_interval: Run ``health_check`` on a session that has
+            been idle for longer than this many seconds before handing it out
+            (default ``60``, ``None`` to disable)
+        :param health_check: A callable taking a session that raises if the
+            session is no longer usable (default
+            :func:`default_health_check`)
+        :param cache: An optional :cls:`fishbowl.cache.ResponseCache` shared
+            by all the sessions
+        :param recorder: An optional :cls:`fishbowl.replay.Recorder` that
+            records the traffic of all the sessions
+        :param metrics: An optional :cls:`fishbowl.metrics.Metrics` (or other
+            collector) that times the requests of all the sessions
+        :param wire_log: An optional :cls:`fishbowl.wirelog.WireLog` that
+            keeps the last messages of all the sessions
+        :param transport: An optional transport from
+            :mod:`fishbowl.transport` that the sessions connect with
+        """
+        if size < 1:
+            raise ValueError('Pool size must be at least 1')
+        self.connect_kwargs = {
+            'username': username,
+            'password': password,
+            'host': host,
+            'port': port,
+            'timeout': timeout,
+        }
+        self.size = size
+        self.check_interval = check_interval
+        self.health_check = health_check or default_health_check
+        self.cache = cache
+        self.recorder = recorder
+        self.metrics = metrics
+        self.wire_log = wire_log
+        self.transport = transport
+        self.idle = []
+        self.count = 0
+        self.closed = False
+        self.lock = threading.Condition()
+        if initial is None:
+            initial = size
+        self.open(min(initial, size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def create(self):
+        """
+        Create and log in a new session.
+        """
+        fishbowl = self.fishbowl_class(
+            cache=self.cache, recorder=self.recorder, metrics=self.metrics,
+            wire_log=self.wire_log, transport=self.transport)
+        fishbowl.connect(**self.connect_kwargs)
+        return fishbowl
+
+    def open(self, count):
+        """
+        Log in ``count`` new sessions concurrently and add them to the pool.
+
+        Sessions which fail to log in are logged and skipped; an error is only
+        raised if none of them could log in.
+        """
+        with self.lock:
+            count = min(count, self.size - self.count)
+            self.count += count
+        if count < 1:
+            return
+        sessions = []
+        errors = []
+
+        def login():
+            try:
+                sessions.append(self.create())
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=login) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with self.lock:
+            self.count -= len(errors)
+            now = time.time()
+            self.idle.extend((fishbowl, now) for fishbowl in sessions)
+            self.lock.notify_all()
+        for error in errors:
+            logger.warning('Pool session failed to log in: {}'.format(error))
+        if errors and not sessions:
+            raise errors[0]
+
+    def acquire(self, timeout=None):
+        """
+        Check out a session, waiting up to ``timeout`` seconds (or forever if
+        ``None``) for one to become available.
+
+        Sessions that have been idle longer than ``check_interval`` are health
+        checked first and replaced if the check fails.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self.lock:
+                while True:
+                    if self.closed:
+                        raise FishbowlPoolError('Pool is closed')
+                    if self.idle:
+                        fishbowl, last_used = self.idle.pop()
+                        create = False
+                        break
+                    if self.count < self.size:
+                        self.count += 1
+                        create = True
+                        break
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            raise FishbowlPoolError(
+                                'Timed out waiting for a pool session')
+                    self.lock.wait(remaining)
+            if create:
+                try:
+                    return self.create()
+                except Exception:
+                    self.discard(None)
+                    raise
+            if self.check(fishbowl, last_used):
+                return fishbowl
+            self.discard(fishbowl)
+
+    def check(self, fishbowl, last_used):
+        if not fishbowl.connected:
+            return False
+        if (self.check_interval is None or
+                time.time() - last_used < self.check_interval):
+            return True
+        try:
+            self.health_check(fishbowl)
+        except Exception as e:
+            logger.info('Pool session failed health check: {}'.format(e))
+            return False
+        return True
+
+    def release(self, fishbowl):
+        """
+        Check a session back in to the pool.
+        """
+        if self.closed or not fishbowl.connected:
+            self.discard(fishbowl)
+            return
+        with self.lock:
+            self.idle.append((fishbowl, time.time()))
+            self.lock.notify()
+
+    def discard(self, fishbowl):
+        """
+        Close a checked out session and free its slot in the pool.
+        """
+        if fishbowl is not None:
+            fishbowl.close(skip_errors=True)
+        with self.lock:
+            self.count -= 1
+            self.lock.notify()
+
+    @contextlib.contextmanager
+    def session(self, timeout=None):
+        """
+        A context manager which checks out a session and returns it to the
+        pool afterwards. Sessions that hit a connection error are closed
+        rather than returned.
+        """
+        fishbowl = self.acquire(timeout=timeout)
+        try:
+            yield fishbowl
+        except (
+                FishbowlConnectionError, FishbowlTimeoutError, socket.error):
+            self.discard(fishbowl)
+            raise
+        except Exception:
+            self.release(fishbowl)
+            raise
+        self.release(fishbowl)
+
+    def map(self, func, items, timeout=None):
+        """
+        Call ``func(session, item)`` for each of ``items``, spreading the
+        calls over up to ``size`` sessions on worker threads.
+
+        No new calls are started once one has raised; the first error is
+        raised after the running calls finish.
+
+        :returns: A list of the return values, in the order of ``items``
+        """
+        items = list(items)
+        results = [None] * len(items)
+        indexes = collections.deque(range(len(items)))
+        errors = []
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    if errors or not indexes:
+                        return
+                    index = indexes.popleft()
+                try:
+                    with self.session(timeout=timeout) as fishbowl:
+                        results[index] = func(fishbowl, items[index])
+                except Exception as e:
+                    with lock:
+                        errors.append(e)
+                    return
+
+        threads = [
+            threading.Thread(target=worker)
+            for i in range(min(self.size, len(items)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return results
+
+    def close(self):
+        """
+        Log out all idle sessions. Sessions that are checked out are closed
+        when they are released.
+        """
+        with self.lock:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.count -= len(idle)
+            self.lock.notify_all()
+        for fishbowl, last_used in idle:
+            fishbowl.close(skip_errors=True)
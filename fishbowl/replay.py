@@ -0,0 +1,413 @@
+"""
+Record the traffic of a Fishbowl session and replay it offline.
+
+Pass a :cls:`Recorder` to :cls:`fishbowl.api.Fishbowl` (or
+:cls:`fishbowl.pool.FishbowlPool`) to write each request frame, the
+response frame that answered it and how long the response took to an
+archive. A :cls:`ReplayFishbowl` then serves the archive back without a
+server, at the recorded speed or faster, so real payloads can be profiled
+anywhere.
+
+Example usage::
+
+    recorder = Recorder('customers.fbrec')
+    fishbowl = Fishbowl(recorder=recorder)
+    fishbowl.connect(username='admin', password='admin')
+    fishbowl.get_customers_fast()
+    fishbowl.close()
+    recorder.close()
+
+    fishbowl = ReplayFishbowl('customers.fbrec', speed=None)
+    fishbowl.connect(username='admin', password='admin')
+    fishbowl.get_customers_fast()
+
+Archives are gzipped sequences of exchanges, each a ``'>ddLL'`` header
+(seconds to the first byte of the response, seconds from then to the last
+byte, and the request and response lengths) followed by the request and
+response frames without their length prefixes. Passwords are blanked out of
+recorded login requests.
+"""
+from __future__ import unicode_literals
+import collections
+import functools
+import gzip
+import logging
+import re
+import struct
+import threading
+import time
+
+from .api import Fishbowl, FishbowlConnectionError, FishbowlError
+from .pool import FishbowlPool
+from .wirelog import redact
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'FBREC1\n'
+EXCHANGE_HEADER = struct.Struct('>ddLL')
+FRAME_HEADER = struct.Struct('>L')
+
+KEY_RE = re.compile(br'<Key>[^<]*</Key>')
+
+Exchange = collections.namedtuple(
+    'Exchange', ['request', 'response', 'wait', 'duration'])
+
+
+def request_key(request):
+    """
+    The key a request is matched on when replaying: the request without its
+    ticket key (and for logins, just the tag).
+    """
+    if b'<LoginRq>' in request:
+        return b'<LoginRq>'
+    return KEY_RE.sub(b'<Key/>', request, count=1)
+
+
+class Recorder(object):
+    """
+    Writes exchanges to an archive. One recorder can be shared by several
+    sessions (and threads).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = gzip.open(path, 'wb')
+        self.file.write(MAGIC)
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def wrap(self, stream):
+        """
+        Return a stream that records the traffic on ``stream``.
+        """
+        return RecordingStream(stream, self)
+
+    def write(self, request, response, wait, duration):
+        request = redact(request)
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(EXCHANGE_HEADER.pack(
+                wait, duration, len(request), len(response)))
+            self.file.write(request)
+            self.file.write(response)
+            self.count += 1
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class FrameBuffer(object):
+    """
+    Collects bytes and splits them into length-prefixed frames.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def __len__(self):
+        return len(self.data)
+
+    def extend(self, data):
+        self.data.extend(data)
+
+    def frames(self):
+        while len(self.data) >= FRAME_HEADER.size:
+            length = FRAME_HEADER.unpack_from(bytes(
+                self.data[:FRAME_HEADER.size]))[0]
+            end = FRAME_HEADER.size + length
+            if len(self.data) < end:
+                return
+            frame = bytes(self.data[FRAME_HEADER.size:end])
+            del self.data[:end]
+            yield frame
+
+
+class RecordingStream(object):
+    """
+    A socket wrapper that passes all traffic through, recording each request
+    frame with the response frame that follows it.
+    """
+
+    def __init__(self, stream, recorder, clock=time.time):
+        self.stream = stream
+        self.recorder = recorder
+        self.clock = clock
+        self.sent = FrameBuffer()
+        self.received = FrameBuffer()
+        # Requests awaiting a response, with the time they were sent.
+        self.pending = collections.deque()
+        self.first_byte = None
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def send(self, data):
+        count = self.stream.send(data)
+        self.sent_data(memoryview(data)[:count])
+        return count
+
+    def sendall(self, data):
+        self.stream.sendall(data)
+        self.sent_data(data)
+
+    def sendmsg(self, buffers, *args):
+        sendmsg = getattr(self.stream, 'sendmsg', None)
+        if sendmsg is None:
+            # Falls back to sendall in fishbowl.transport.send_frame.
+            raise NotImplementedError('sendmsg')
+        buffers = list(buffers)
+        count = sendmsg(buffers, *args)
+        self.sent_data(b''.join(bytes(buffer) for buffer in buffers)[:count])
+        return count
+
+    def sent_data(self, data):
+        self.sent.extend(data)
+        now = self.clock()
+        for frame in self.sent.frames():
+            self.pending.append((frame, now))
+
+    def recv(self, size, *args):
+        data = self.stream.recv(size, *args)
+        self.received_data(data)
+        return data
+
+    def recv_into(self, buffer, nbytes=0, *args):
+        count = self.stream.recv_into(buffer, nbytes, *args)
+        self.received_data(memoryview(buffer)[:count])
+        return count
+
+    def received_data(self, data):
+        if not len(data):
+            return
+        now = self.clock()
+        if self.first_byte is None:
+            self.first_byte = now
+        self.received.extend(data)
+        for response in self.received.frames():
+            if not self.pending:
+                logger.warning('Response received without a request')
+                continue
+            request, sent = self.pending.popleft()
+            self.recorder.write(
+                request, response, self.first_byte - sent,
+                now - self.first_byte)
+            self.first_byte = now if len(self.received) else None
+
+
+def read_archive(path):
+    """
+    Read the exchanges of an archive written by a :cls:`Recorder`.
+
+    :returns: A list of :cls:`Exchange` tuples, in the order recorded
+    """
+    exchanges = []
+    with gzip.open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise FishbowlError('{} is not a Fishbowl recording'.format(path))
+        while True:
+            header = f.read(EXCHANGE_HEADER.size)
+            if not header:
+                break
+            if len(header) < EXCHANGE_HEADER.size:
+                raise FishbowlError('Truncated recording: {}'.format(path))
+            wait, duration, request_length, response_length = \
+                EXCHANGE_HEADER.unpack(header)
+            request = f.read(request_length)
+            response = f.read(response_length)
+            if len(response) < response_length:
+                raise FishbowlError('Truncated recording: {}'.format(path))
+            exchanges.append(Exchange(request, response, wait, duration))
+    return exchanges
+
+
+class ReplayArchive(object):
+    """
+    The exchanges of a recording, handed out to the replay streams that ask
+    for them.
+
+    A request gets the first unplayed response recorded for the same request
+    (ignoring ticket keys). Requests that weren't recorded get the next
+    unplayed response in recorded order, so small changes to a request don't
+    stop a replay.
+    """
+
+    def __init__(self, exchanges):
+        self.exchanges = exchanges
+        self.played = [False] * len(exchanges)
+        self.by_request = {}
+        for index, exchange in enumerate(exchanges):
+            self.by_request.setdefault(
+                request_key(exchange.request),
+                collections.deque()).append(index)
+        self.next_index = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        return cls(read_archive(path))
+
+    def match(self, request):
+        """
+        Return the :cls:`Exchange` that answers a request.
+        """
+        with self.lock:
+            indexes = self.by_request.get(request_key(request))
+            while indexes and self.played[indexes[0]]:
+                indexes.popleft()
+            if indexes:
+                index = indexes.popleft()
+            else:
+                while (self.next_index < len(self.exchanges) and
+                        self.played[self.next_index]):
+                    self.next_index += 1
+                if self.next_index >= len(self.exchanges):
+                    raise FishbowlConnectionError(
+                        'No more responses in the recording')
+                index = self.next_index
+                logger.warning(
+                    'Request not in the recording, replaying exchange '
+                    '{}'.format(index))
+            self.played[index] = True
+            return self.exchanges[index]
+
+
+class ReplayStream(object):
+    """
+    A stand-in for the socket of a session, answering each request with its
+    recorded response.
+
+    With a ``speed``, each response starts after its recorded wait and then
+    arrives steadily over its recorded duration, both divided by ``speed``.
+    With a ``speed`` of ``None``, responses are available at once.
+    """
+
+    def __init__(self, archive, speed=1.0, clock=time.time, sleep=time.sleep):
+        self.archive = archive
+        self.speed = speed
+        self.clock = clock
+        self.sleep = sleep
+        self.sent = FrameBuffer()
+        self.responses = collections.deque()
+        self.closed = False
+
+    def settimeout(self, timeout):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def send(self, data):
+        self.sendall(data)
+        return len(data)
+
+    def sendall(self, data):
+        if self.closed:
+            raise FishbowlConnectionError('Replay stream is closed')
+        self.sent.extend(data)
+        for request in self.sent.frames():
+            exchange = self.archive.match(request)
+            self.responses.append((
+                FRAME_HEADER.pack(len(exchange.response)) +
+                exchange.response, self.clock(), exchange))
+
+    def available(self, frame, sent, exchange):
+        """
+        The number of bytes of a response frame that have arrived so far,
+        and when the next byte is due.
+        """
+        if not self.speed:
+            return len(frame), None
+        start = sent + exchange.wait / self.speed
+        duration = exchange.duration / self.speed
+        now = self.clock()
+        if now < start:
+            return 0, start
+        if now >= start + duration:
+            return len(frame), None
+        count = max(1, int(len(frame) * (now - start) / duration))
+        return count, start + duration * (count + 1) / len(frame)
+
+    def recv_into(self, buffer, nbytes=0, *args):
+        view = memoryview(buffer)
+        if not nbytes:
+            nbytes = len(view)
+        data = self.read(nbytes)
+        view[:len(data)] = data
+        return len(data)
+
+    def recv(self, size, *args):
+        return self.read(size)
+
+    def read(self, size):
+        if not self.responses:
+            return b''
+        frame, sent, exchange = self.responses[0]
+        while True:
+            count, due = self.available(frame, sent, exchange)
+            if count:
+                break
+            self.sleep(max(due - self.clock(), 0))
+        data = frame[:min(size, count)]
+        if len(data) == len(frame):
+            self.responses.popleft()
+        else:
+            self.responses[0] = self.remainder(frame, data, sent, exchange)
+        return data
+
+    def remainder(self, frame, data, sent, exchange):
+        """
+        The part of a frame still to be read, re-timed so that it finishes
+        arriving when the whole frame would have.
+        """
+        if not self.speed:
+            return frame[len(data):], sent, exchange
+        fraction = len(data) / float(len(frame))
+        elapsed = exchange.wait + exchange.duration * fraction
+        return frame[len(data):], sent, exchange._replace(
+            wait=elapsed, duration=exchange.duration * (1 - fraction))
+
+
+class ReplayFishbowl(Fishbowl):
+    """
+    A :cls:`fishbowl.api.Fishbowl` that is answered from a recording rather
+    than a server. Log in with :meth:`connect` as usual; the credentials
+    aren't checked.
+    """
+
+    def __init__(
+            self, archive, speed=1.0, cache=None, recorder=None,
+            metrics=None, wire_log=None, transport=None):
+        """
+        :param archive: The path of a recording, or a :cls:`ReplayArchive`
+            (which can be shared by several sessions)
+        :param speed: How many times faster than recorded to replay, or
+            ``None`` to replay as fast as possible
+        """
+        Fishbowl.__init__(
+            self, cache=cache, recorder=recorder, metrics=metrics,
+            wire_log=wire_log, transport=transport)
+        if not isinstance(archive, ReplayArchive):
+            archive = ReplayArchive.load(archive)
+        self.archive = archive
+        self.speed = speed
+
+    def make_stream(self, timeout=5):
+        return ReplayStream(self.archive, speed=self.speed)
+
+
+class ReplayPool(FishbowlPool):
+    """
+    A :cls:`fishbowl.pool.FishbowlPool` of :cls:`ReplayFishbowl` sessions
+    sharing one recording, for replaying traffic recorded from a pool.
+    """
+
+    def __init__(self, archive, speed=1.0, size=4, **kwargs):
+        if not isinstance(archive, ReplayArchive):
+            archive = ReplayArchive.load(archive)
+        self.fishbowl_class = functools.partial(
+            ReplayFishbowl, archive, speed)
+        FishbowlPool.__init__(self, 'replay', '', size=size, **kwargs)
@@ -1,6 +1,7 @@
 from __future__ import unicode_literals
 
 SUCCESS = "1000"
+REQUEST_ERRORS = "1003"
 
 CODES = {
     "1000": "Success!",
@@ -0,0 +1,228 @@
+"""
+Incremental sync of Fishbowl tables into a local store.
+
+Each table is synced by its ``DATELASTMODIFIED`` column: the first sync
+loads every row, and later ones only the rows changed since the latest
+modification time seen (the table's high-water mark). Deleted rows are
+found by comparing row counts, and only if the server has fewer rows than
+the store, by comparing the sets of ids.
+
+Example usage::
+
+    engine = SyncEngine(fishbowl)
+    for result in engine.sync():
+        print(result)
+    customers = engine.objects('customers')
+"""
+from __future__ import unicode_literals
+import collections
+import logging
+
+from . import objects
+from .api import LINK_COLUMNS, query_datetime, select_columns
+
+logger = logging.getLogger(__name__)
+
+# How high-water marks are written in the sync queries.
+WATERMARK_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+SyncResult = collections.namedtuple(
+    'SyncResult', ['name', 'changed', 'deleted', 'watermark'])
+
+
+class Entity(object):
+    """
+    A table to sync, and the object class its rows are read as.
+    """
+
+    def __init__(
+            self, name, table, object_class=None, key='ID',
+            modified='DATELASTMODIFIED'):
+        """
+        :param name: The name the rows are stored under
+        :param table: The database table
+        :param object_class: The :cls:`fishbowl.objects.FishbowlObject`
+            class to read rows as. Only the columns it reads (and the key and
+            modified columns) are synced. If ``None``, all columns are.
+        :param key: The integer id column
+        :param modified: The last modified date/time column, or ``None`` for
+            tables without one, which are reloaded in full on every sync
+        """
+        self.name = name
+        self.table = table
+        self.object_class = object_class
+        self.key = key
+        self.modified = modified
+
+    def query(self, table_columns, watermark=None):
+        """
+        Build the query for the rows changed since ``watermark`` (or all rows
+        if it is ``None``).
+        """
+        columns = '*'
+        if self.object_class is not None:
+            names = self.object_class.column_names() + LINK_COLUMNS.get(
+                self.table, []) + [self.key, self.modified]
+            columns = select_columns(table_columns, names)
+        query = 'SELECT {} FROM {}'.format(columns, self.table)
+        if watermark is not None and self.modified:
+            # Rows modified in the same second as the watermark are fetched
+            # again, since the server may store fractions of a second.
+            query += " WHERE {} >= '{}'".format(
+                self.modified, watermark.strftime(WATERMARK_FORMAT))
+        return query
+
+
+DEFAULT_ENTITIES = (
+    Entity('customers', 'CUSTOMER', objects.Customer),
+    Entity('products', 'PRODUCT', objects.Product),
+    Entity('parts', 'PART', objects.Part),
+    Entity('sales_orders', 'SO', objects.SalesOrder),
+    Entity('sales_order_items', 'SOITEM', objects.SalesOrderItem),
+)
+
+
+class MemoryStore(object):
+    """
+    A store that keeps synced rows in memory, as dictionaries of ids to rows.
+
+    Other stores (such as :cls:`fishbowl.mirror.SQLiteStore`) provide the
+    same methods.
+    """
+
+    def __init__(self):
+        self.tables = {}
+        self.watermarks = {}
+
+    def get_watermark(self, name):
+        return self.watermarks.get(name)
+
+    def set_watermark(self, name, value):
+        self.watermarks[name] = value
+
+    def upsert(self, name, rows):
+        """
+        Add or replace rows, given as ``(id, row)`` pairs.
+        """
+        table = self.tables.setdefault(name, {})
+        for key, row in rows:
+            table[key] = row
+
+    def delete(self, name, keys):
+        table = self.tables.get(name, {})
+        for key in keys:
+            table.pop(key, None)
+
+    def keys(self, name):
+        return set(self.tables.get(name, ()))
+
+    def get(self, name, key):
+        return self.tables.get(name, {}).get(key)
+
+    def rows(self, name):
+        return list(self.tables.get(name, {}).values())
+
+
+class SyncEngine(object):
+    """
+    Keeps a store up to date with the Fishbowl server, one entity (table) at
+    a time.
+    """
+
+    def __init__(
+            self, fishbowl, store=None, entities=DEFAULT_ENTITIES,
+            detect_deletions=True):
+        """
+        :param fishbowl: A connected :cls:`fishbowl.api.Fishbowl`
+        :param store: Where to keep the rows (default a new
+            :cls:`MemoryStore`)
+        :param entities: The :cls:`Entity` objects to sync (default
+            :data:`DEFAULT_ENTITIES`)
+        :param detect_deletions: Whether to remove rows deleted on the server
+            from the store (default ``True``)
+        """
+        self.fishbowl = fishbowl
+        self.store = MemoryStore() if store is None else store
+        self.entities = collections.OrderedDict(
+            (entity.name, entity) for entity in entities)
+        self.detect_deletions = detect_deletions
+
+    def sync(self, names=None):
+        """
+        Sync some (or by default all) of the entities.
+
+        :returns: A list of :cls:`SyncResult` tuples
+        """
+        if names is None:
+            names = list(self.entities)
+        return [self.sync_entity(self.entities[name]) for name in names]
+
+    def sync_entity(self, entity):
+        """
+        Pull the rows of an entity changed since its high-water mark into the
+        store, and remove those deleted on the server.
+        """
+        watermark = self.store.get_watermark(entity.name)
+        query = entity.query(
+            self.fishbowl.table_columns(entity.table), watermark)
+        latest = [watermark]
+        changed = [0]
+        seen = set()
+
+        def changed_rows():
+            # Queries are sent uncached, so a response cache can't hide
+            # changes.
+            for row in self.fishbowl.iter_query(query):
+                key = int(row[entity.key])
+                modified = entity.modified and row.get(entity.modified)
+                if modified:
+                    modified = query_datetime(modified)
+                    if latest[0] is None or modified > latest[0]:
+                        latest[0] = modified
+                if not entity.modified:
+                    seen.add(key)
+                changed[0] += 1
+                yield key, row
+
+        self.store.upsert(entity.name, changed_rows())
+        deleted = []
+        if not entity.modified:
+            # The whole table was loaded, so anything else was deleted.
+            deleted = sorted(self.store.keys(entity.name) - seen)
+        elif self.detect_deletions and watermark is not None:
+            deleted = self.find_deleted(entity)
+        if deleted:
+            self.store.delete(entity.name, deleted)
+        if latest[0] is not None:
+            self.store.set_watermark(entity.name, latest[0])
+        result = SyncResult(entity.name, changed[0], len(deleted), latest[0])
+        logger.info('Synced {}: {} changed, {} deleted'.format(
+            entity.name, result.changed, result.deleted))
+        return result
+
+    def find_deleted(self, entity):
+        """
+        Return the ids of the rows in the store that were deleted on the
+        server.
+
+        Every row on the server has been synced at some point, so the store
+        can only have rows the server doesn't if it has more rows. The ids
+        are only fetched when that is the case.
+        """
+        local = self.store.keys(entity.name)
+        count = list(self.fishbowl.iter_query(
+            'SELECT COUNT(*) FROM {}'.format(entity.table), tuples=True))
+        if int(count[0][0]) >= len(local):
+            return []
+        server = set(
+            int(row[0]) for row in self.fishbowl.iter_query(
+                'SELECT {} FROM {}'.format(entity.key, entity.table),
+                tuples=True))
+        return sorted(local - server)
+
+    def objects(self, name):
+        """
+        Return the stored rows of an entity as objects of its class.
+        """
+        object_class = self.entities[name].object_class
+        return [object_class(row) for row in self.store.rows(name)]
@@ -0,0 +1,64 @@
+from __future__ import unicode_literals
+from decimal import Decimal
+from unittest import TestCase
+
+from fishbowl import objects
+
+
+class RecordTest(TestCase):
+
+    def setUp(self):
+        self.rows = [
+            {'ID': '1', 'NUM': 'A100', 'PRICE': '1.50', 'PARTID': '',
+             'DATECREATED': '2016-01-01'},
+            {'ID': '2', 'NUM': 'B200', 'PRICE': 'bad'},
+        ]
+        self.schema = objects.RecordSchema(
+            objects.Product, self.rows[0], extra=('UOM',), name_field='Num')
+
+    def test_mapping(self):
+        record = self.schema.record(self.rows[0])
+        self.assertEqual(
+            dict(record), {'ID': 1, 'Num': 'A100', 'Price': Decimal('1.50')})
+        self.assertEqual(len(record), 3)
+        self.assertEqual(record.get('PartID'), None)
+        self.assertRaises(KeyError, lambda: record['UOM'])
+        self.assertRaises(KeyError, lambda: record['Missing'])
+        self.assertEqual(str(record), 'A100')
+        self.assertFalse(hasattr(record, '__dict__'))
+
+    def test_shared_schema(self):
+        first, second = [self.schema.record(row) for row in self.rows]
+        self.assertIs(first.schema, second.schema)
+        # Values that fail to convert are left out, as for objects.
+        self.assertEqual(dict(second), {'ID': 2, 'Num': 'B200'})
+
+    def test_empty_row(self):
+        self.assertIsNone(self.schema.record({'DATECREATED': '2016-01-01'}))
+
+    def test_attach(self):
+        record = self.schema.record(self.rows[0])
+        uom = objects.UOM({'UOMID': '1', 'Code': 'ea'})
+        record.attach(UOM=uom)
+        self.assertIs(record['UOM'], uom)
+        self.assertEqual(
+            record.squash()['UOM'], {'UOMID': 1, 'Code': 'ea'})
+
+    def test_id_field(self):
+        schema = objects.RecordSchema(objects.Part, ['ID', 'NUM'])
+        record = schema.record({'ID': '5', 'NUM': 'A100'})
+        self.assertEqual(dict(record), {'PartID': 5, 'Num': 'A100'})
+
+    def test_interned(self):
+        schema = objects.RecordSchema(objects.UOM, ['UOMID', 'CODE'])
+        first = schema.record({'UOMID': '1', 'CODE': ''.join(['e', 'a'])})
+        second = schema.record({'UOMID': '2', 'CODE': ''.join(['e', 'a'])})
+        self.assertIs(first['Code'], second['Code'])
+
+    def test_interning_stops(self):
+        schema = objects.RecordSchema(objects.UOM, ['CODE'])
+        for i in range(objects.INTERN_LIMIT + 1):
+            schema.record({'CODE': 'code {}'.format(i)})
+        first = schema.record({'CODE': ''.join(['e', 'a'])})
+        second = schema.record({'CODE': ''.join(['e', 'a'])})
+        self.assertIsNot(first['Code'], second['Code'])
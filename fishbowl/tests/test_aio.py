@@ -0,0 +1,127 @@
+from __future__ import unicode_literals
+from unittest import TestCase, skipIf
+import struct
+
+from fishbowl import api
+
+from .test_api import (
+    LOGIN_SUCCESS, ADD_INVENTORY_XML, ADD_INVENTORY_XML_FAIL, PART_LIST_XML,
+    QUERY_XML)
+
+try:
+    from unittest import mock
+except ImportError:   # < Python 3.3
+    import mock
+
+try:
+    import asyncio
+    from fishbowl import aio
+except (ImportError, SyntaxError):   # Python 2
+    aio = None
+
+
+@skipIf(aio is None, 'asyncio is not available')
+class AsyncAPITest(TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.reader = asyncio.StreamReader()
+        self.writer = mock.MagicMock()
+        self.writer.drain.side_effect = lambda: self.completed(None)
+        self.writer.wait_closed.side_effect = lambda: self.completed(None)
+        self.api = aio.AsyncFishbowl()
+        self.api.make_stream = mock.Mock(
+            return_value=self.completed((self.reader, self.writer)))
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def completed(self, value):
+        future = self.loop.create_future()
+        future.set_result(value)
+        return future
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def add_responses(self, *responses):
+        for response_xml in responses:
+            self.reader.feed_data(
+                struct.pack('>L', len(response_xml)) + response_xml)
+
+    def connect(self):
+        self.add_responses(LOGIN_SUCCESS)
+        self.run_async(self.api.connect(username='test', password='password'))
+
+    def test_connect(self):
+        self.assertFalse(self.api.connected)
+        self.connect()
+        self.assertTrue(self.api.connected)
+        self.assertEqual(self.api.key, 'ABC')
+        self.run_async(self.api.close())
+        self.assertTrue(self.writer.close.called)
+        self.assertTrue(self.writer.wait_closed.called)
+        self.assertFalse(self.api.connected)
+
+    def test_required_connected_method(self):
+        self.assertRaises(
+            OSError, self.run_async, self.api.send_message(b'<test/>'))
+
+    def test_send_message(self):
+        self.connect()
+        response_xml = b'<FbiXml><FbiMsgsRq/></FbiXml>'
+        self.add_responses(response_xml)
+        response = self.run_async(self.api.send_message(b'<test></test>'))
+        self.assertEqual(api.etree.tostring(response), response_xml)
+        self.writer.write.assert_called_with(b'<test></test>')
+
+    def test_connection_closed(self):
+        self.connect()
+        self.reader.feed_data(struct.pack('>L', 10) + b'<FbiXml>')
+        self.reader.feed_eof()
+        self.assertRaises(
+            api.FishbowlConnectionError, self.run_async,
+            self.api.send_message(b'<test></test>'))
+        self.assertFalse(self.api.connected)
+
+    def test_cancelled(self):
+        self.connect()
+        task = self.loop.create_task(self.api.send_message(b'<test></test>'))
+        # Let the request be written, then cancel it while it waits for the
+        # response.
+        for _ in range(5):
+            self.run_async(asyncio.sleep(0))
+        self.writer.write.assert_called_with(b'<test></test>')
+        task.cancel()
+        self.assertRaises(
+            asyncio.CancelledError, self.loop.run_until_complete, task)
+        self.assertFalse(self.api.connected)
+        self.assertTrue(self.writer.close.called)
+
+    def test_add_inventory(self):
+        self.connect()
+        self.add_responses(ADD_INVENTORY_XML, ADD_INVENTORY_XML_FAIL)
+        with mock.patch.object(api.logger, 'info') as info:
+            self.run_async(self.api.add_inventory(
+                partnum=1, qty=1, uomid=1, cost=100, loctagnum=1))
+        info.assert_called_with('add_inv,1,1,1,100,1')
+        self.assertRaises(
+            api.FishbowlError, self.run_async, self.api.add_inventory(
+                partnum=1, qty=1, uomid=1, cost=100, loctagnum=1))
+
+    def test_get_parts(self):
+        self.connect()
+        self.add_responses(PART_LIST_XML)
+        parts = self.run_async(self.api.get_parts(populate_uoms=False))
+        self.assertEqual(
+            [part['Num'] for part in parts], ['A100', 'B200', 'C300'])
+
+    def test_send_query(self):
+        self.connect()
+        self.add_responses(QUERY_XML)
+        rows = self.run_async(self.api.send_query('SELECT ID, NUM FROM PART'))
+        self.assertEqual(
+            list(rows),
+            [{'ID': '1', 'NUM': 'A100'}, {'ID': '2', 'NUM': 'B, 200'}])
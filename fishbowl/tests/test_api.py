@@ -1,9 +1,14 @@
 from __future__ import unicode_literals
-from unittest import TestCase
+from unittest import TestCase, skipIf
+from decimal import Decimal
 from lxml import etree
+import array
+import datetime
+import math
+import socket
 import struct
 
-from fishbowl import api, statuscodes
+from fishbowl import api, cache, objects, statuscodes
 
 try:
     from unittest import mock
@@ -30,6 +35,110 @@ ADD_INVENTORY_XML_FAIL = '''
 </FbiXml>
 '''.format('').encode('ascii')
 
+PART_LIST_XML = '''
+<FbiXml><FbiMsgsRs statusCode="1000">
+<LightPartListRs statusCode="1000">
+<LightPart><PartID>1</PartID><Num>A100</Num></LightPart>
+<LightPart><PartID>2</PartID><Num>B200</Num></LightPart>
+<LightPart><PartID>3</PartID><Num>C300</Num></LightPart>
+</LightPartListRs>
+</FbiMsgsRs></FbiXml>
+'''.encode('ascii')
+
+PART_LIST_XML_FAIL = '''
+<FbiXml><FbiMsgsRs statusCode="1000">
+<LightPartListRs statusCode="1012"><LightPart/></LightPartListRs>
+</FbiMsgsRs></FbiXml>
+'''.encode('ascii')
+
+QUERY_XML = '''
+<FbiXml><FbiMsgsRs statusCode="1000">
+<ExecuteQueryRs statusCode="1000"><Rows>
+<Row>"ID","NUM"</Row>
+<Row>"1","A100"</Row>
+<Row>"2","B, 200"</Row>
+</Rows></ExecuteQueryRs>
+</FbiMsgsRs></FbiXml>
+'''.encode('ascii')
+
+BATCH_XML = '''
+<FbiXml><FbiMsgsRs statusCode="1003">
+<CustomerGetRs statusCode="1000">
+<Customer><Name>A</Name></Customer>
+</CustomerGetRs>
+<CustomerGetRs statusCode="1011"/>
+<UOMRs statusCode="1000">
+<UOM><UOMID>1</UOMID></UOM><UOM><UOMID>2</UOMID></UOM>
+</UOMRs>
+</FbiMsgsRs></FbiXml>
+'''.encode('ascii')
+
+CUSTOMER_NAMES_XML = '''
+<FbiXml><FbiMsgsRs statusCode="1000">
+<CustomerNameListRs statusCode="1000"><Customers>
+<Name>Sam Ball</Name><Name>Missing</Name><Name>Jen Day</Name>
+</Customers></CustomerNameListRs>
+</FbiMsgsRs></FbiXml>
+'''.encode('ascii')
+
+CUSTOMERS_XML = '''
+<FbiXml><FbiMsgsRs statusCode="1003">
+<CustomerGetRs statusCode="1000">
+<Customer><Name>Sam Ball</Name><JobDepth>1</JobDepth></Customer>
+</CustomerGetRs>
+<CustomerGetRs statusCode="1011"/>
+<CustomerGetRs statusCode="1000">
+<Customer><Name>Jen Day</Name><JobDepth>2</JobDepth></Customer>
+</CustomerGetRs>
+</FbiMsgsRs></FbiXml>
+'''.encode('ascii')
+
+PRODUCT_PARTS_XML = '''
+<FbiXml><FbiMsgsRs statusCode="1000">
+<LightPartListRs statusCode="1000">
+<LightPart><PartID>1</PartID><Num>A100</Num></LightPart>
+<LightPart><PartID>2</PartID><Num>B200</Num></LightPart>
+<LightPart><PartID>3</PartID><Num>A100</Num></LightPart>
+<LightPart><PartID>4</PartID></LightPart>
+<LightPart><PartID>5</PartID><Num>C300</Num></LightPart>
+</LightPartListRs>
+</FbiMsgsRs></FbiXml>
+'''.encode('ascii')
+
+PRODUCTS_XML = ['''
+<FbiXml><FbiMsgsRs statusCode="1000">
+<ProductGetRs statusCode="1000">
+<Product><ID>10</ID><Num>A100</Num></Product>
+</ProductGetRs>
+<ProductGetRs statusCode="1000"/>
+</FbiMsgsRs></FbiXml>
+'''.encode('ascii'), '''
+<FbiXml><FbiMsgsRs statusCode="1000">
+<ProductGetRs statusCode="1000">
+<Product><ID>30</ID><Num>C300</Num></Product>
+</ProductGetRs>
+</FbiMsgsRs></FbiXml>
+'''.encode('ascii')]
+
+UOM_XML = '''
+<FbiXml><FbiMsgsRs statusCode="1000">
+<UOMRs statusCode="1000">
+<UOM><UOMID>1</UOMID><Code>ea</Code></UOM>
+<UOM><UOMID>2</UOMID><Code>ft</Code></UOM>
+</UOMRs>
+</FbiMsgsRs></FbiXml>
+'''.encode('ascii')
+
+TYPED_QUERY_XML = '''
+<FbiXml><FbiMsgsRs statusCode="1000">
+<ExecuteQueryRs statusCode="1000"><Rows>
+<Row>"ID","PRICE","ACTIVEFLAG","DATELASTMODIFIED","NUM"</Row>
+<Row>"1","12.50","1","2016-03-04 05:06:07.0","A100"</Row>
+<Row>"2","","0","2016-03-05 00:00:00","B200"</Row>
+</Rows></ExecuteQueryRs>
+</FbiMsgsRs></FbiXml>
+'''.encode('ascii')
+
 CYCLE_INVENTORY_XML = '''
 <FbiXml>
 <CycleCountRs statusCode="{0}"></CycleCountRs>
@@ -37,9 +146,29 @@ CYCLE_INVENTORY_XML = '''
 '''.format(statuscodes.SUCCESS).encode('ascii')
 
 
+def chunked_reader(data, chunk_size=None):
+    """
+    Build a ``recv_into`` side effect that serves ``data`` in chunks of at
+    most ``chunk_size`` bytes, then returns 0 (closed connection).
+    """
+    data = bytearray(data)
+    position = [0]
+
+    def recv_into(view, nbytes=0):
+        size = nbytes or len(view)
+        if chunk_size:
+            size = min(size, chunk_size)
+        chunk = data[position[0]:position[0] + size]
+        view[:len(chunk)] = chunk
+        position[0] += len(chunk)
+        return len(chunk)
+
+    return recv_into
+
+
 class APIStreamTest(TestCase):
 
-    @mock.patch('fishbowl.api.socket')
+    @mock.patch('fishbowl.transport.socket')
     def test_make_stream(self, mock_socket):
         api.Fishbowl().make_stream()
         self.assertTrue(mock_socket.socket.called)
@@ -48,12 +177,43 @@ class APIStreamTest(TestCase):
         # Check default timeout set.
         fake_socket.settimeout.assert_called_with(5)
 
+    def test_make_stream_error(self):
+        transport = mock.Mock()
+        transport.connect.side_effect = socket.error(111, 'Refused')
+        fishbowl = api.Fishbowl(transport=transport)
+        with self.assertRaises(api.FishbowlConnectionError) as cm:
+            fishbowl.make_stream()
+        self.assertEqual('{}'.format(cm.exception), 'Refused')
+        transport.connect.assert_called_with('localhost', 28192, 5)
+
+
+class SplitQueryTest(TestCase):
+
+    def test_split(self):
+        self.assertEqual(
+            api.split_query('SELECT * FROM PART'),
+            ('SELECT *', 'FROM PART', None))
+        self.assertEqual(
+            api.split_query(
+                "SELECT ID FROM PART p WHERE p.NUM IN "
+                "(SELECT NUM FROM PRODUCT WHERE NOTE = 'from here')"),
+            ('SELECT ID', 'FROM PART p',
+             "p.NUM IN (SELECT NUM FROM PRODUCT WHERE NOTE = 'from here')"))
+
+    def test_quoted_keywords(self):
+        self.assertEqual(
+            api.split_query(
+                "SELECT ID FROM PART WHERE DESCRIPTION = 'order by'"),
+            ('SELECT ID', 'FROM PART', "DESCRIPTION = 'order by'"))
+
 
 class APITest(TestCase):
 
     def setUp(self):
         self.api = api.Fishbowl()
         self.fake_stream = mock.MagicMock()
+        # Like a TLS socket, so frames are written with a single sendall.
+        del self.fake_stream.sendmsg
         self.api.make_stream = mock.Mock(return_value=self.fake_stream)
 
     def connect(self, login_return_value=LOGIN_SUCCESS, **kwargs):
@@ -113,24 +273,483 @@ class APITest(TestCase):
     def test_required_connected_method(self):
         self.assertRaises(OSError, self.api.close)
 
-    def set_response_xml(self, response_xml):
-        self.fake_stream.recv.side_effect = [
-            struct.pack('>L', len(response_xml))
-        ] + list(response_xml)
+    def set_response_xml(self, response_xml, chunk_size=None):
+        self.set_responses([response_xml], chunk_size=chunk_size)
+
+    def set_responses(self, responses, chunk_size=None):
+        self.fake_stream.recv_into.side_effect = chunked_reader(
+            b''.join(
+                struct.pack('>L', len(response_xml)) + response_xml
+                for response_xml in responses),
+            chunk_size)
 
     def test_send_message(self):
         self.connect()
         request_xml = b'<test></test>'
         response_xml = b'<FbiXml><FbiMsgsRq/></FbiXml>'
         self.set_response_xml(response_xml)
-        self.fake_stream.recv.side_effect = [
-            struct.pack('>L', len(response_xml))
-        ] + list(response_xml)
         response = self.api.send_message(request_xml)
         self.assertEqual(etree.tostring(response), response_xml)
-        self.fake_stream.send.assert_called_with(
+        self.fake_stream.sendall.assert_called_with(
             struct.pack('>L', len(request_xml)) + request_xml)
 
+    def test_send_message_short_reads(self):
+        self.connect()
+        response_xml = b'<FbiXml><FbiMsgsRs statusCode="1000"/></FbiXml>'
+        self.set_response_xml(response_xml, chunk_size=3)
+        response = self.api.send_message(b'<test></test>')
+        self.assertEqual(etree.tostring(response), response_xml)
+
+    def test_send_message_encoding(self):
+        self.connect()
+        self.set_response_xml('<FbiXml>Caf\xe9</FbiXml>'.encode('latin-1'))
+        response = self.api.send_message(b'<test></test>')
+        self.assertEqual(response.text, 'Caf\xe9')
+
+    def test_send_message_closed(self):
+        self.connect()
+        self.fake_stream.recv_into.side_effect = chunked_reader(
+            struct.pack('>L', 10) + b'<FbiXml>')
+        self.assertRaises(
+            api.FishbowlConnectionError, self.api.send_message,
+            b'<test></test>')
+
+    def test_send_message_timeout(self):
+        self.connect()
+        self.fake_stream.recv_into.side_effect = socket.timeout()
+        self.assertRaises(
+            api.FishbowlTimeoutError, self.api.send_message,
+            b'<test></test>')
+        self.assertFalse(self.api.connected)
+
+    def test_stream_request(self):
+        self.connect()
+        self.set_response_xml(PART_LIST_XML, chunk_size=7)
+        response = self.api.stream_request(
+            'LightPartListRq', response_node_name='LightPartListRs',
+            tags=['LightPart'])
+        self.assertEqual(
+            [node.findtext('Num') for node in response],
+            ['A100', 'B200', 'C300'])
+
+    def test_stream_request_error(self):
+        self.connect()
+        self.set_response_xml(PART_LIST_XML_FAIL)
+        self.assertRaises(
+            api.FishbowlError, self.api.stream_request, 'LightPartListRq',
+            response_node_name='LightPartListRs', tags=['LightPart'])
+
+    def test_stream_request_silence_errors(self):
+        self.connect()
+        self.set_response_xml(PART_LIST_XML_FAIL)
+        response = self.api.stream_request(
+            'LightPartListRq', response_node_name='LightPartListRs',
+            tags=['LightPart'], silence_errors=True)
+        self.assertEqual(list(response), [])
+
+    def test_stream_request_abandoned(self):
+        self.connect()
+        self.set_responses([PART_LIST_XML, ADD_INVENTORY_XML], chunk_size=5)
+        response = self.api.stream_request(
+            'LightPartListRq', response_node_name='LightPartListRs',
+            tags=['LightPart'])
+        self.assertEqual(next(response).findtext('Num'), 'A100')
+        # The rest of the first frame is read before the next message.
+        self.api.add_inventory(
+            partnum=1, qty=1, uomid=1, cost=100, loctagnum=1)
+        self.assertEqual(
+            [node.findtext('Num') for node in response], ['B200', 'C300'])
+
+    def test_stream_request_closed(self):
+        self.connect()
+        self.set_responses([PART_LIST_XML, ADD_INVENTORY_XML], chunk_size=5)
+        response = self.api.stream_request(
+            'LightPartListRq', response_node_name='LightPartListRs',
+            tags=['LightPart'])
+        response.close()
+        self.api.add_inventory(
+            partnum=1, qty=1, uomid=1, cost=100, loctagnum=1)
+        self.assertEqual(list(response), [])
+
+    def test_get_parts(self):
+        self.connect()
+        self.set_response_xml(PART_LIST_XML)
+        parts = self.api.get_parts(populate_uoms=False)
+        self.assertEqual(
+            [part['PartID'] for part in parts], [1, 2, 3])
+
+    def test_send_query(self):
+        self.connect()
+        self.set_response_xml(QUERY_XML)
+        self.assertEqual(
+            list(self.api.send_query('SELECT ID, NUM FROM PART')),
+            [{'ID': '1', 'NUM': 'A100'}, {'ID': '2', 'NUM': 'B, 200'}])
+
+    def test_batch(self):
+        self.connect()
+        self.set_response_xml(BATCH_XML)
+        with self.api.batch() as batch:
+            first = batch.add('CustomerGetRq', {'Name': 'A'})
+            second = batch.add('CustomerGetRq', {'Name': 'B'})
+            uoms = batch.add('UOMRq', single=False)
+        sent = etree.fromstring(self.fake_stream.sendall.call_args[0][0][4:])
+        self.assertEqual(
+            [el.tag for el in sent.find('FbiMsgsRq')],
+            ['CustomerGetRq', 'CustomerGetRq', 'UOMRq'])
+        self.assertTrue(first.ok)
+        self.assertEqual(first.result().findtext('Name'), 'A')
+        self.assertFalse(second.ok)
+        self.assertEqual(second.status_code, '1011')
+        self.assertEqual(second.status, statuscodes.get_status('1011'))
+        self.assertRaises(api.FishbowlError, second.result)
+        self.assertEqual(len(uoms.result().findall('UOM')), 2)
+
+    def test_batch_failed(self):
+        self.connect()
+        self.set_response_xml(
+            b'<FbiXml><FbiMsgsRs statusCode="1130"/></FbiXml>')
+        batch = self.api.batch()
+        result = batch.add('UOMRq')
+        self.assertRaises(api.FishbowlError, batch.send)
+        self.assertRaises(api.FishbowlError, result.result)
+
+    def test_get_customers_lazy(self):
+        self.connect()
+        self.set_response_xml(CUSTOMER_NAMES_XML)
+        customers = self.api.get_customers()
+        self.assertEqual(
+            [customer.name for customer in customers],
+            ['Sam Ball', 'Missing', 'Jen Day'])
+        self.assertFalse(any(customer.loaded for customer in customers))
+
+    def test_get_customers_hydrated(self):
+        self.connect()
+        self.set_responses([CUSTOMER_NAMES_XML, CUSTOMERS_XML])
+        customers = self.api.get_customers(lazy=False)
+        self.assertTrue(all(customer.loaded for customer in customers))
+        self.assertEqual(
+            [customer.get('JobDepth') for customer in customers],
+            [1, None, 2])
+        sent = etree.fromstring(self.fake_stream.sendall.call_args[0][0][4:])
+        self.assertEqual(len(sent.findall('FbiMsgsRq/CustomerGetRq')), 3)
+
+    def test_get_customers_prefetch(self):
+        self.connect()
+        self.set_responses([CUSTOMER_NAMES_XML, CUSTOMERS_XML])
+        customers = self.api.get_customers()
+        self.assertEqual(customers[0]['JobDepth'], 1)
+        # The siblings were loaded in the same message.
+        self.assertTrue(all(customer.loaded for customer in customers))
+        self.assertEqual(customers[2]['JobDepth'], 2)
+        self.assertEqual(self.fake_stream.sendall.call_count, 2)
+
+    def test_get_products(self):
+        self.connect()
+        self.set_responses([PRODUCT_PARTS_XML] + PRODUCTS_XML)
+        progress = mock.Mock()
+        products = self.api.get_products(
+            lazy=False, batch_size=2, progress=progress)
+        self.assertEqual([product['ID'] for product in products], [10, 30])
+        self.assertEqual(products[1].part['PartID'], 5)
+        self.assertEqual(
+            progress.call_args_list, [mock.call(2, 3), mock.call(3, 3)])
+
+    def test_hydrate_errors(self):
+        self.connect()
+        self.set_responses([CUSTOMER_NAMES_XML, CUSTOMERS_XML])
+        customers = self.api.get_customers(silence_lazy_errors=False)
+        self.assertRaises(api.FishbowlError, self.api.hydrate, customers)
+        self.assertEqual(customers[2]['JobDepth'], 2)
+        self.assertFalse(customers[1].loaded)
+
+    def test_iter_query_types(self):
+        self.connect()
+        self.set_response_xml(TYPED_QUERY_XML)
+        rows = self.api.iter_query('SELECT * FROM PRODUCT', types={
+            'id': int, 'Price': 'decimal', 'ACTIVEFLAG': bool,
+            'DateLastModified': 'datetime', 'missing': int})
+        self.assertEqual(list(rows), [
+            {
+                'ID': 1, 'PRICE': Decimal('12.50'), 'ACTIVEFLAG': True,
+                'DATELASTMODIFIED': datetime.datetime(2016, 3, 4, 5, 6, 7),
+                'NUM': 'A100',
+            },
+            {
+                'ID': 2, 'PRICE': None, 'ACTIVEFLAG': False,
+                'DATELASTMODIFIED': datetime.datetime(2016, 3, 5),
+                'NUM': 'B200',
+            },
+        ])
+
+    def test_iter_query_tuples(self):
+        self.connect()
+        self.set_response_xml(QUERY_XML)
+        rows = self.api.iter_query(
+            'SELECT ID, NUM FROM PART', types={'ID': 'int'}, tuples=True)
+        self.assertEqual(rows.columns, ['ID', 'NUM'])
+        self.assertEqual(list(rows), [(1, 'A100'), (2, 'B, 200')])
+
+    def test_query_columns(self):
+        self.connect()
+        self.set_response_xml(TYPED_QUERY_XML)
+        columns = self.api.query_columns(
+            'SELECT * FROM PRODUCT', types={
+                'ID': int, 'PRICE': 'float', 'ACTIVEFLAG': bool,
+                'DATELASTMODIFIED': 'datetime'})
+        self.assertEqual(columns.row_count, 2)
+        self.assertIsInstance(columns['ID'], array.array)
+        self.assertEqual(list(columns['ID']), [1, 2])
+        self.assertEqual(columns['PRICE'][0], 12.5)
+        self.assertTrue(math.isnan(columns['PRICE'][1]))
+        self.assertEqual(list(columns['ACTIVEFLAG']), [1, 0])
+        self.assertEqual(
+            columns['DATELASTMODIFIED'][1], datetime.datetime(2016, 3, 5))
+        self.assertEqual(columns['NUM'], ['A100', 'B200'])
+        self.assertEqual(
+            list(columns.rows())[0][:3], (1, 12.5, 1))
+
+    def test_query_columns_blank_ints(self):
+        self.connect()
+        self.set_responses([
+            self.query_response('"ID","QTY"', '"1","5"', '"2",""')])
+        columns = self.api.query_columns(
+            'SELECT ID, QTY FROM PART', types={'ID': 'decimal', 'QTY': int})
+        self.assertEqual(columns['ID'], [Decimal(1), Decimal(2)])
+        self.assertEqual(columns['QTY'], [5, None])
+
+    def test_query_columns_empty(self):
+        self.connect()
+        self.set_responses([self.query_response('"ID","NUM"')])
+        columns = self.api.query_columns(
+            'SELECT ID, NUM FROM PART', types={'ID': int})
+        self.assertEqual(columns.row_count, 0)
+        self.assertEqual(list(columns['ID']), [])
+        self.assertEqual(columns['NUM'], [])
+
+    @skipIf(api.numpy is None, 'NumPy is not installed')
+    def test_query_columns_numpy(self):
+        self.connect()
+        self.set_response_xml(TYPED_QUERY_XML)
+        columns = self.api.query_columns(
+            'SELECT * FROM PRODUCT', types={'ID': int, 'PRICE': float},
+            use_numpy=True)
+        self.assertEqual(columns['ID'].dtype, api.numpy.int64)
+        self.assertEqual(columns['ID'].sum(), 3)
+        self.assertTrue(api.numpy.isnan(columns['PRICE'][1]))
+
+    def query_response(self, *rows):
+        return (
+            '<FbiXml><FbiMsgsRs statusCode="1000">'
+            '<ExecuteQueryRs statusCode="1000"><Rows>{}</Rows>'
+            '</ExecuteQueryRs></FbiMsgsRs></FbiXml>'.format(''.join(
+                '<Row>{}</Row>'.format(row) for row in rows))).encode('ascii')
+
+    def sent_queries(self):
+        return [
+            etree.fromstring(call[0][0][4:]).findtext('.//Query')
+            for call in self.fake_stream.sendall.call_args_list]
+
+    def test_iter_query_pages(self):
+        self.connect()
+        self.set_responses([
+            self.query_response('"MIN","MAX"', '"3","12"'),
+            self.query_response('"ID"', '"3"', '"4"'),
+            self.query_response('"ID"'),
+            self.query_response('"ID"', '"11"', '"12"'),
+        ])
+        rows = self.api.iter_query_pages(
+            'SELECT ID FROM CUSTOMER WHERE ACTIVEFLAG = 1', page_size=4,
+            types={'ID': int})
+        self.assertEqual([row['ID'] for row in rows], [3, 4, 11, 12])
+        self.assertEqual(self.sent_queries(), [
+            'SELECT MIN(ID), MAX(ID) FROM CUSTOMER WHERE ACTIVEFLAG = 1',
+            'SELECT ID FROM CUSTOMER WHERE (ACTIVEFLAG = 1) '
+            'AND ID >= 3 AND ID < 7',
+            'SELECT ID FROM CUSTOMER WHERE (ACTIVEFLAG = 1) '
+            'AND ID >= 7 AND ID < 11',
+            'SELECT ID FROM CUSTOMER WHERE (ACTIVEFLAG = 1) '
+            'AND ID >= 11 AND ID < 15',
+        ])
+
+    def test_iter_query_pages_or(self):
+        self.connect()
+        self.set_responses([
+            self.query_response('"MIN","MAX"', '"1","6"'),
+            self.query_response('"ID"', '"1"'),
+            self.query_response('"ID"', '"6"'),
+        ])
+        rows = self.api.iter_query_pages(
+            'SELECT ID FROM SO WHERE STATUSID = 20 OR STATUSID = 25',
+            page_size=5)
+        self.assertEqual([row['ID'] for row in rows], ['1', '6'])
+        self.assertEqual(self.sent_queries(), [
+            'SELECT MIN(ID), MAX(ID) FROM SO '
+            'WHERE STATUSID = 20 OR STATUSID = 25',
+            'SELECT ID FROM SO WHERE (STATUSID = 20 OR STATUSID = 25) '
+            'AND ID >= 1 AND ID < 6',
+            'SELECT ID FROM SO WHERE (STATUSID = 20 OR STATUSID = 25) '
+            'AND ID >= 6 AND ID < 11',
+        ])
+
+    def test_iter_query_pages_subquery(self):
+        self.connect()
+        self.set_responses([
+            self.query_response('"MIN","MAX"', '"1","2"'),
+            self.query_response('"ID"', '"1"'),
+        ])
+        query = (
+            'SELECT ID, (SELECT COUNT(*) FROM ADDRESS A WHERE '
+            'A.ACCOUNTID = C.ACCOUNTID) AS ADDRESSES FROM CUSTOMER C')
+        list(self.api.iter_query_pages(query, key='C.ID', page_size=5))
+        self.assertEqual(self.sent_queries(), [
+            'SELECT MIN(C.ID), MAX(C.ID) FROM CUSTOMER C',
+            query + ' WHERE C.ID >= 1 AND C.ID < 6',
+        ])
+
+    def test_iter_query_pages_unsupported(self):
+        self.connect()
+        for query in (
+                'SELECT ID FROM CUSTOMER ORDER BY NAME',
+                'SELECT NAME, COUNT(*) FROM CUSTOMER GROUP BY NAME',
+                'SELECT 1'):
+            with self.assertRaises(ValueError):
+                list(self.api.iter_query_pages(query))
+
+    def test_iter_query_pages_empty(self):
+        self.connect()
+        self.set_responses([self.query_response('"MIN","MAX"', '"",""')])
+        self.assertEqual(
+            list(self.api.iter_query_pages('SELECT * FROM CUSTOMER')), [])
+
+    def test_iter_query_pages_pool(self):
+        self.connect()
+        self.set_responses([
+            self.query_response('"MIN","MAX"', '"1","5"'),
+            self.query_response('"ID"', '"1"'),
+            self.query_response('"ID"', '"3"'),
+            self.query_response('"ID"', '"5"'),
+        ])
+        pool = mock.Mock(size=2)
+        pool.map.side_effect = lambda func, items: [
+            func(self.api, item) for item in items]
+        rows = self.api.iter_query_pages(
+            'SELECT * FROM CUSTOMER', page_size=2, pool=pool, tuples=True)
+        self.assertEqual(list(rows), [('1',), ('3',), ('5',)])
+        self.assertEqual(pool.map.call_count, 2)
+
+    def test_get_customers_fast_columns(self):
+        self.connect()
+        self.set_responses([
+            self.query_response(
+                '"ID","ACCOUNTID","NAME","STATUSID","ACTIVEFLAG",'
+                '"CURRENCYID"'),
+            self.query_response(
+                '"ACCOUNTID","NAME","ACTIVEFLAG"', '"7","Sam Ball","true"'),
+        ])
+        customers = self.api.get_customers_fast(
+            populate_addresses=False, fields=['Name', 'ActiveFlag'])
+        self.assertEqual(self.sent_queries(), [
+            'SELECT * FROM CUSTOMER WHERE 1 = 0',
+            'SELECT ACCOUNTID, NAME, ACTIVEFLAG FROM CUSTOMER',
+        ])
+        self.assertEqual(
+            dict(customers[0]),
+            {'AccountID': 7, 'Name': 'Sam Ball', 'ActiveFlag': True})
+
+    def test_get_products_fast_columns(self):
+        self.connect()
+        self.set_responses([
+            self.query_response(
+                '"ID","PARTID","NUM","PRICE","UOMID","TYPEID","DATECREATED"'),
+            self.query_response(
+                '"ID","PARTID","NUM","PRICE","UOMID","StandardCost","TypeID"',
+                '"1","2","B201","1.50","1","0.75","10"'),
+            self.query_response('"NUM","PRICE","UOMID"', '"B201","1.50","1"'),
+        ])
+        products = self.api.get_products_fast(populate_uoms=False)
+        self.assertEqual(products[0]['Price'], Decimal('1.50'))
+        self.assertEqual(products[0].part['TypeID'], 10)
+        products = self.api.get_products_fast(
+            populate_uoms=False, fields=['Price'])
+        self.assertEqual(
+            dict(products[0]), {'Num': 'B201', 'Price': Decimal('1.50')})
+        # The table columns are only looked up once.
+        self.assertEqual(self.sent_queries(), [
+            'SELECT * FROM PRODUCT WHERE 1 = 0',
+            'SELECT P.ID, P.PARTID, P.NUM, P.PRICE, P.UOMID, '
+            'PART.STDCOST AS StandardCost, PART.TYPEID as TypeID '
+            'FROM PRODUCT P INNER JOIN PART ON P.PARTID = PART.ID',
+            'SELECT P.NUM, P.PRICE, P.UOMID '
+            'FROM PRODUCT P INNER JOIN PART ON P.PARTID = PART.ID',
+        ])
+
+    def test_get_products_fast_compact(self):
+        self.connect()
+        self.set_responses([
+            UOM_XML,
+            self.query_response('"ID","PARTID","NUM","UOMID"'),
+            self.query_response(
+                '"ID","PARTID","NUM","UOMID","StandardCost","TypeID"',
+                '"1","2","B201","1","0.75","10"',
+                '"2","3","C301","2","1.25","10"'),
+        ])
+        products = self.api.get_products_fast(compact=True)
+        self.assertIsInstance(products[0], objects.Record)
+        self.assertIs(products[0].schema, products[1].schema)
+        self.assertEqual(str(products[0]), 'B201')
+        self.assertEqual(products[0]['UOM']['Code'], 'ea')
+        self.assertEqual(products[1]['Part']['StandardCost'], Decimal('1.25'))
+
+    def test_get_customers_fast_compact(self):
+        self.connect()
+        self.set_responses([
+            self.query_response('"ID","NAME","ABBREVIATION"'),
+            self.query_response(
+                '"ID","NAME","ABBREVIATION"', '"2","USA","US"'),
+            self.query_response('"ID","CODE","NAME"'),
+            self.query_response('"ID","CODE","NAME"', '"3","UT","Utah"'),
+            self.query_response(
+                '"ID","ACCOUNTID","CITY","COUNTRYID","STATEID"'),
+            self.query_response(
+                '"ID","ACCOUNTID","CITY","COUNTRYID","STATEID"',
+                '"4","7","Murray","2","3"'),
+            self.query_response('"ID","ACCOUNTID","NAME"'),
+            self.query_response('"ID","ACCOUNTID","NAME"', '"1","7","Sam"'),
+        ])
+        customers = self.api.get_customers_fast(compact=True)
+        self.assertEqual(customers[0].squash(), {
+            'AccountID': 7,
+            'Name': 'Sam',
+            'Addresses': [{
+                'ID': 4, 'City': 'Murray',
+                'Country': {'ID': 2, 'Name': 'USA', 'Code': 'US'},
+                'State': {'ID': 3, 'Code': 'UT', 'Name': 'Utah'},
+            }],
+        })
+
+    def test_cached_request(self):
+        self.api.cache = cache.ResponseCache()
+        self.connect()
+        self.set_responses([UOM_XML, QUERY_XML])
+        for i in range(2):
+            self.assertEqual(sorted(self.api.get_uom_map()), [1, 2])
+            rows = list(self.api.send_query('SELECT ID, NUM FROM STATECONST'))
+            self.assertEqual(len(rows), 2)
+            rows[0].clear()
+        self.assertEqual(self.fake_stream.sendall.call_count, 2)
+        self.assertEqual(self.api.cache.hits, 2)
+
+    def test_cached_request_error(self):
+        self.api.cache = cache.ResponseCache()
+        self.connect()
+        self.set_responses([
+            b'<FbiXml><FbiMsgsRs statusCode="1000">'
+            b'<UOMRs statusCode="1012"/></FbiMsgsRs></FbiXml>',
+            UOM_XML])
+        self.assertRaises(api.FishbowlError, self.api.get_uom_map)
+        self.assertEqual(len(self.api.cache), 0)
+        self.assertEqual(sorted(self.api.get_uom_map()), [1, 2])
+
     def test_add_inventory(self):
         self.connect()
         self.set_response_xml(ADD_INVENTORY_XML)
@@ -148,3 +767,138 @@ class APITest(TestCase):
         self.connect()
         self.set_response_xml(CYCLE_INVENTORY_XML)
         self.api.cycle_inventory(partnum='abc', qty=2, locationid=1)
+
+    def test_add_inventory_many(self):
+        self.connect()
+        self.set_responses([
+            b'<FbiXml><FbiMsgsRs statusCode="1003">'
+            b'<AddInventoryRs statusCode="1000"/>'
+            b'<AddInventoryRs statusCode="1004"/>'
+            b'</FbiMsgsRs></FbiXml>',
+            b'<FbiXml><FbiMsgsRs statusCode="1000">'
+            b'<AddInventoryRs statusCode="1000"/>'
+            b'</FbiMsgsRs></FbiXml>',
+        ])
+        with mock.patch.object(api.logger, 'info') as info:
+            results = self.api.add_inventory_many([
+                ('A', 1, 1, 10, 5),
+                ('B', 2, 1, 20, 5),
+                {'partnum': 'C', 'qty': 3, 'uomid': 1, 'cost': 30,
+                 'loctagnum': 5},
+            ], batch_size=2)
+        sent = [
+            etree.fromstring(call[0][0][4:])
+            for call in self.fake_stream.sendall.call_args_list[-2:]]
+        self.assertEqual(
+            [len(msg.findall('FbiMsgsRq/AddInventoryRq')) for msg in sent],
+            [2, 1])
+        self.assertEqual(
+            sent[1].findtext('FbiMsgsRq/AddInventoryRq/PartNum'), 'C')
+        self.assertEqual([result.index for result in results], [0, 1, 2])
+        self.assertEqual(
+            [result.ok for result in results], [True, False, True])
+        self.assertEqual(results[1].status_code, '1004')
+        self.assertEqual(results[1].status, statuscodes.get_status('1004'))
+        self.assertEqual(results[2].line, ['C', 3, 1, 30, 5])
+        # Only the lines that succeeded are audit logged.
+        self.assertEqual(
+            [call[0][0] for call in info.call_args_list
+             if call[0][0].startswith('add_inv')],
+            ['add_inv,A,1,1,10,5', 'add_inv,C,3,1,30,5'])
+
+    def test_cycle_inventory_many_failed_batch(self):
+        self.connect()
+        self.set_response_xml(
+            b'<FbiXml><FbiMsgsRs statusCode="1010"/></FbiXml>')
+        results = self.api.cycle_inventory_many([('A', 1, 1), ('B', 2, 1)])
+        self.assertFalse(any(result.ok for result in results))
+        self.assertTrue(all(
+            isinstance(result.error, api.FishbowlError)
+            for result in results))
+
+    def test_cycle_inventory_many_timeout(self):
+        self.connect()
+        response = (
+            b'<FbiXml><FbiMsgsRs statusCode="1000">'
+            b'<CycleCountRs statusCode="1000"/>'
+            b'</FbiMsgsRs></FbiXml>')
+        reader = chunked_reader(struct.pack('>L', len(response)) + response)
+
+        def recv_into(view, nbytes=0):
+            size = reader(view, nbytes)
+            if not size:
+                raise socket.timeout()
+            return size
+
+        self.fake_stream.recv_into.side_effect = recv_into
+        results = self.api.cycle_inventory_many(
+            [('A', 1, 1), ('B', 2, 1), ('C', 3, 1)], batch_size=1)
+        self.assertEqual(
+            [result.ok for result in results], [True, False, False])
+        self.assertIsInstance(results[1].error, api.FishbowlTimeoutError)
+        # The timeout closed the session, so the last batch isn't sent.
+        self.assertIsInstance(results[2].error, OSError)
+        self.assertFalse(self.api.connected)
+        self.assertEqual(self.fake_stream.sendall.call_count, 2)
+
+    def test_cycle_inventory_many_pool(self):
+        self.connect()
+        self.set_responses([
+            b'<FbiXml><FbiMsgsRs statusCode="1000">'
+            b'<CycleCountRs statusCode="1000"/>'
+            b'</FbiMsgsRs></FbiXml>'] * 2)
+        pool = mock.Mock(size=2)
+        pool.map.side_effect = lambda func, items: [
+            func(self.api, item) for item in items]
+        results = self.api.cycle_inventory_many(
+            [('A', 1, 1), ('B', 2, 1)], batch_size=1, pool=pool)
+        self.assertEqual(pool.map.call_count, 1)
+        self.assertEqual([result.ok for result in results], [True, True])
+
+
+class LazyGroupTest(TestCase):
+
+    def setUp(self):
+        self.batch_sizes = []
+        self.fishbowl = mock.Mock()
+        self.fishbowl.batch.side_effect = self.make_batch
+        self.group = api.LazyGroup(self.fishbowl, window=3, max_window=10)
+        self.customers = []
+        for i in range(40):
+            lazy = api.LazyRequest(
+                self.fishbowl, 'CustomerGetRq', {'Name': str(i)},
+                response_node_name='CustomerGetRs', group=self.group)
+            customer = objects.Customer(lazy_data=lazy)
+            self.group.add(customer)
+            self.customers.append(customer)
+
+    def make_batch(self):
+        batch = mock.Mock()
+        results = []
+
+        def add(request, value, response_node_name):
+            response = etree.Element('Customer')
+            etree.SubElement(response, 'Name').text = value['Name']
+            results.append(mock.Mock(ok=True, response=response))
+            return results[-1]
+
+        batch.add.side_effect = add
+        batch.send.side_effect = lambda: self.batch_sizes.append(len(results))
+        return batch
+
+    def loaded(self):
+        return [
+            i for i, customer in enumerate(self.customers) if customer.loaded]
+
+    def test_sequential(self):
+        for customer in self.customers[:22]:
+            self.assertEqual(customer['Name'], str(customer._lazy_load.index))
+        self.assertEqual(self.batch_sizes, [3, 6, 10, 10])
+        self.assertEqual(self.loaded(), list(range(29)))
+
+    def test_random_access(self):
+        self.customers[0].mapped
+        self.customers[20].mapped
+        self.customers[3].mapped
+        self.assertEqual(self.batch_sizes, [3, 3, 3])
+        self.assertEqual(self.loaded(), [0, 1, 2, 3, 4, 5, 20, 21, 22])
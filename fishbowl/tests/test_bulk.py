@@ -0,0 +1,123 @@
+from __future__ import unicode_literals
+from unittest import TestCase
+import io
+import os
+import shutil
+import tempfile
+
+from lxml import etree
+
+from fishbowl import api, bulk
+
+try:
+    from unittest import mock
+except ImportError:   # < Python 3.3
+    import mock
+
+IMPORT_XML = (
+    '<FbiXml><FbiMsgsRs statusCode="1000">'
+    '<ImportRs statusCode="{}"/></FbiMsgsRs></FbiXml>')
+
+
+class FakeFishbowl(object):
+    """
+    Records the rows of each import, failing those that contain ``'bad'``.
+    """
+    key = 'ABC'
+
+    def __init__(self):
+        self.imports = []
+
+    def send_message(self, request):
+        rows = [row.text for row in request.el_rows]
+        self.imports.append(rows)
+        if any('bad' in row for row in rows):
+            code = '1012'
+        else:
+            code = '1000'
+        return etree.fromstring(IMPORT_XML.format(code))
+
+
+class BulkTest(TestCase):
+
+    def setUp(self):
+        self.fishbowl = FakeFishbowl()
+
+    def test_csv_line(self):
+        self.assertEqual(
+            bulk.csv_line(['B201', 'Caf\xe9, "large"', 1.5]),
+            'B201,"Caf\xe9, ""large""",1.5')
+
+    def test_chunks_by_rows(self):
+        rows = [['Num', 'Cost']] + [['P{}'.format(i), i] for i in range(5)]
+        result = bulk.BulkImport(
+            self.fishbowl, 'ImportPartCost', rows, max_rows=2).run()
+        self.assertTrue(result.ok)
+        self.assertEqual(result.rows, 5)
+        self.assertEqual(self.fishbowl.imports, [
+            ['Num,Cost', 'P0,0', 'P1,1'],
+            ['Num,Cost', 'P2,2', 'P3,3'],
+            ['Num,Cost', 'P4,4'],
+        ])
+        self.assertEqual(
+            [chunk.start_row for chunk in result.chunks], [0, 2, 4])
+
+    def test_chunks_by_bytes(self):
+        lines = ['x' * 10] * 4
+        chunks = list(bulk.iter_chunks(
+            lines, max_bytes=2 * (10 + bulk.ROW_OVERHEAD)))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2])
+        # Lines bigger than max_bytes get a chunk of their own.
+        chunks = list(bulk.iter_chunks(lines, max_bytes=1))
+        self.assertEqual([len(chunk) for chunk in chunks], [1, 1, 1, 1])
+
+    def test_failure_and_resume(self):
+        rows = ['Num,Cost', 'A,1', 'B,2', 'bad,3', 'C,4']
+        importer = bulk.BulkImport(
+            self.fishbowl, 'ImportPartCost', rows, max_rows=1)
+        result = importer.run()
+        self.assertFalse(result.ok)
+        self.assertEqual(len(result.chunks), 3)
+        failure, = result.failures
+        self.assertEqual(
+            (failure.index, failure.start_row, failure.status),
+            (2, 2, '1012'))
+        self.assertEqual(failure.message, 'General error.')
+        self.assertEqual(result.next_chunk, 2)
+
+        rows[3] = 'D,3'
+        self.fishbowl.imports = []
+        result = importer.run(start_chunk=result.next_chunk)
+        self.assertTrue(result.ok)
+        self.assertEqual(self.fishbowl.imports, [
+            ['Num,Cost', 'D,3'], ['Num,Cost', 'C,4']])
+        self.assertEqual(result.next_chunk, 4)
+
+    def test_connection_error(self):
+        self.fishbowl.send_message = mock.Mock(
+            side_effect=api.FishbowlTimeoutError('Connection timeout'))
+        result = bulk.BulkImport(
+            self.fishbowl, 'ImportPart', ['Num', 'A']).run()
+        self.assertEqual(result.failures[0].message, 'Connection timeout')
+
+    def test_pool(self):
+        pool = mock.Mock(size=2)
+        pool.map.side_effect = lambda func, items: [
+            func(self.fishbowl, item) for item in items]
+        rows = ['Num'] + ['P{}'.format(i) for i in range(5)]
+        result = bulk.BulkImport(
+            None, 'ImportPart', rows, max_rows=1, pool=pool).run()
+        self.assertEqual(result.rows, 5)
+        self.assertEqual(pool.map.call_count, 3)
+
+    def test_csv_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'parts.csv')
+        with io.open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write('Num,Description\r\nA,"Two\nlines"\r\n')
+        bulk.BulkImport(
+            self.fishbowl, 'ImportPart', path,
+            header=['Num', 'Details']).run()
+        self.assertEqual(self.fishbowl.imports, [
+            ['Num,Details', 'Num,Description', 'A,"Two\nlines"']])
@@ -0,0 +1,79 @@
+from __future__ import unicode_literals
+from unittest import TestCase
+
+from fishbowl import cache
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ResponseCacheTest(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = cache.ResponseCache(
+            ttls={'UOMRq': 10, 'COUNTRYCONST': 10}, maxsize=2,
+            clock=self.clock)
+
+    def test_hit_and_miss(self):
+        self.assertIsNone(self.cache.get('UOMRq'))
+        self.cache.set('UOMRq', None, 'uoms')
+        self.assertEqual(self.cache.get('UOMRq'), 'uoms')
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_uncached_name(self):
+        self.cache.set('CustomerGetRq', {'Name': 'A'}, 'customer')
+        self.assertEqual(len(self.cache), 0)
+
+    def test_ttl(self):
+        self.cache.set('UOMRq', None, 'uoms')
+        self.clock.now += 10
+        self.assertIsNone(self.cache.get('UOMRq'))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_lru(self):
+        self.cache.set('UOMRq', 1, 'one')
+        self.cache.set('UOMRq', 2, 'two')
+        self.cache.get('UOMRq', 1)
+        self.cache.set('UOMRq', 3, 'three')
+        self.assertEqual(self.cache.get('UOMRq', 1), 'one')
+        self.assertIsNone(self.cache.get('UOMRq', 2))
+        self.assertEqual(self.cache.get('UOMRq', 3), 'three')
+
+    def test_normalized_keys(self):
+        self.cache.set(
+            'COUNTRYCONST', 'SELECT *\n  FROM COUNTRYCONST', 'countries')
+        self.assertEqual(
+            self.cache.get('COUNTRYCONST', 'SELECT * FROM COUNTRYCONST'),
+            'countries')
+        self.cache.set('UOMRq', {'b': 1, 'a': 2}, 'uoms')
+        self.assertEqual(self.cache.get('UOMRq', {'a': 2, 'b': 1}), 'uoms')
+
+    def test_invalidate(self):
+        self.cache.set('UOMRq', 1, 'one')
+        self.cache.set('COUNTRYCONST', 'SELECT * FROM COUNTRYCONST', 'c')
+        self.cache.invalidate('UOMRq', 2)
+        self.assertEqual(len(self.cache), 2)
+        self.cache.invalidate('UOMRq')
+        self.assertEqual(len(self.cache), 1)
+        self.cache.invalidate()
+        self.assertEqual(len(self.cache), 0)
+
+    def test_query_cache_name(self):
+        self.assertEqual(
+            cache.query_cache_name('select * from countryconst'),
+            'COUNTRYCONST')
+        self.assertEqual(
+            cache.query_cache_name('SELECT ID FROM ADDRESS WHERE ID > 5'),
+            'ADDRESS')
+        self.assertEqual(
+            cache.query_cache_name(
+                'SELECT * FROM PRODUCT P '
+                'INNER JOIN PART ON P.PARTID = PART.ID'),
+            'ExecuteQueryRq')
@@ -0,0 +1,64 @@
+from __future__ import unicode_literals
+from unittest import TestCase
+
+from fishbowl import api
+from fishbowl.fakeserver import FakeFishbowlServer
+
+
+class FakeFishbowlServerTest(TestCase):
+    """
+    Runs the client over a real socket against the loopback server.
+    """
+
+    def setUp(self):
+        self.server = FakeFishbowlServer(records=30)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.fishbowl = self.server.connect()
+        self.addCleanup(self.fishbowl.close)
+
+    def test_login(self):
+        self.assertEqual(self.fishbowl.key, FakeFishbowlServer.key)
+        fishbowl = api.Fishbowl()
+        self.assertRaises(
+            api.FishbowlError, fishbowl.connect, 'admin', 'wrong',
+            host=self.server.host, port=self.server.port)
+
+    def test_invalid_key(self):
+        self.fishbowl.key = 'wrong'
+        self.assertRaises(api.FishbowlError, self.fishbowl.get_uom_map)
+
+    def test_requests(self):
+        parts = self.fishbowl.get_parts()
+        self.assertEqual(len(parts), 30)
+        self.assertEqual(parts[0]['Num'], 'P0000001')
+        self.assertEqual(parts[0]['UOM']['Code'], 'u1')
+        customers = self.fishbowl.get_customers(lazy=False)
+        self.assertEqual(customers[-1]['AccountID'], 30)
+        self.assertEqual(
+            customers[0]['Addresses'][0]['State']['Code'], 'UT')
+        self.assertEqual(len(self.fishbowl.get_taxrates()), 5)
+        self.assertEqual(self.server.counts['CustomerGetRq'], 30)
+
+    def test_queries(self):
+        customers = self.fishbowl.get_customers_fast(page_size=7)
+        self.assertEqual(len(customers), 30)
+        self.assertEqual(len(customers[4]['Addresses']), 1)
+        products = self.fishbowl.get_products_fast()
+        self.assertEqual(products[2]['Num'], 'P0000003')
+        self.assertEqual(products[2].part['TypeID'], 1)
+        rows = list(self.fishbowl.iter_query(
+            'SELECT COUNT(*) FROM PART', tuples=True))
+        self.assertEqual(rows, [('30',)])
+
+    def test_adjustments(self):
+        results = self.fishbowl.add_inventory_many(
+            [('P0000001', 1, 1, 10, 5)] * 3, batch_size=2)
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(self.server.counts['AddInventoryRq'], 3)
+
+    def test_pool(self):
+        with self.server.pool(size=2) as pool:
+            products = self.fishbowl.get_products_fast(
+                page_size=5, pool=pool)
+        self.assertEqual(len(products), 30)
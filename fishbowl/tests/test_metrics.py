@@ -0,0 +1,162 @@
+from __future__ import unicode_literals
+from unittest import TestCase
+
+from fishbowl import api, metrics, xmlrequests
+from fishbowl.fakeserver import FakeFishbowlServer
+
+
+class HistogramTest(TestCase):
+
+    def test_observe(self):
+        histogram = metrics.Histogram(buckets=(1, 2, 4))
+        for value in (0.5, 1, 1.5, 3, 10):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1, 1])
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.sum, 16)
+        self.assertEqual((histogram.min, histogram.max), (0.5, 10))
+        self.assertEqual(
+            list(histogram.cumulative()),
+            [(1, 2), (2, 3), (4, 4), (float('inf'), 5)])
+
+    def test_quantile(self):
+        histogram = metrics.Histogram(buckets=(1, 2))
+        self.assertEqual(histogram.quantile(0.5), 0)
+        for value in (1.25, 1.5, 1.75, 2):
+            histogram.observe(value)
+        # Interpolated between the smallest value and the bucket's bound.
+        self.assertEqual(histogram.quantile(0.5), 1.625)
+        self.assertEqual(histogram.quantile(1), 2)
+
+    def test_quantile_above_buckets(self):
+        histogram = metrics.Histogram(buckets=(1,))
+        histogram.observe(5)
+        self.assertEqual(histogram.quantile(0.95), 5)
+
+
+class MetricsTest(TestCase):
+
+    def make_metrics(self):
+        collector = metrics.Metrics(buckets=(0.01, 0.1))
+        collector.observe('UOMRq', 'parse', 0.05)
+        collector.observe('UOMRq', 'send', 0.005)
+        collector.observe('UOMRq', 'send', 0.25)
+        collector.count('UOMRq', 'requests')
+        collector.count('UOMRq', 'requests')
+        collector.count('UOMRq', 'bytes_sent', 120)
+        return collector
+
+    def test_summary(self):
+        lines = self.make_metrics().summary().splitlines()
+        self.assertEqual(lines[0].split()[:3], ['request', 'phase', 'count'])
+        # Phases are listed in the order they happen.
+        self.assertEqual(lines[1].split()[:3], ['UOMRq', 'send', '2'])
+        self.assertEqual(lines[2].split()[:3], ['UOMRq', 'parse', '1'])
+        self.assertEqual(lines[-2].split(), ['UOMRq', 'bytes_sent', '120'])
+        self.assertEqual(lines[-1].split(), ['UOMRq', 'requests', '2'])
+
+    def test_prometheus(self):
+        text = self.make_metrics().prometheus()
+        self.assertTrue(text.endswith('\n'))
+        lines = text.splitlines()
+        self.assertEqual(lines[:2], [
+            '# HELP fishbowl_phase_seconds Time spent in each phase of a '
+            'request.',
+            '# TYPE fishbowl_phase_seconds histogram',
+        ])
+        labels = 'request="UOMRq",phase="send"'
+        self.assertIn(
+            'fishbowl_phase_seconds_bucket{{{},le="0.01"}} 1'.format(labels),
+            lines)
+        self.assertIn(
+            'fishbowl_phase_seconds_bucket{{{},le="+Inf"}} 2'.format(labels),
+            lines)
+        self.assertIn(
+            'fishbowl_phase_seconds_sum{{{}}} 0.255'.format(labels), lines)
+        self.assertIn(
+            'fishbowl_phase_seconds_count{{{}}} 2'.format(labels), lines)
+        self.assertIn('# TYPE fishbowl_requests_total counter', lines)
+        self.assertIn('fishbowl_requests_total{request="UOMRq"} 2', lines)
+        self.assertIn(
+            'fishbowl_bytes_sent_total{request="UOMRq"} 120', lines)
+        self.assertNotIn('fishbowl_objects_total', text)
+
+    def test_prometheus_escapes_labels(self):
+        collector = metrics.Metrics()
+        collector.count('a"b\\c', 'requests')
+        self.assertIn(
+            'fishbowl_requests_total{request="a\\"b\\\\c"} 1',
+            collector.prometheus())
+
+    def test_reset(self):
+        collector = self.make_metrics()
+        collector.reset()
+        self.assertEqual(collector.summary().count('\n'), 0)
+
+
+class FishbowlMetricsTest(TestCase):
+
+    def setUp(self):
+        self.server = FakeFishbowlServer(records=20)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.metrics = metrics.Metrics()
+        self.fishbowl = self.server.connect(
+            api.Fishbowl(metrics=self.metrics))
+        self.addCleanup(self.fishbowl.close)
+
+    def phases(self, tag):
+        return dict(
+            (phase, histogram.count)
+            for (key, phase), histogram in self.metrics.histograms.items()
+            if key == tag)
+
+    def test_login(self):
+        self.assertEqual(self.phases('LoginRq'), {
+            'build': 1, 'send': 1, 'wait': 1, 'receive': 1, 'parse': 1})
+        self.assertEqual(self.metrics.counters[('LoginRq', 'requests')], 1)
+
+    def test_streamed_objects(self):
+        parts = self.fishbowl.get_parts(populate_uoms=False)
+        self.assertEqual(self.phases('LightPartListRq'), {
+            'build': 1, 'send': 1, 'wait': 1, 'receive': 1, 'parse': 1,
+            'objects': 1})
+        counters = self.metrics.counters
+        self.assertEqual(
+            counters[('LightPartListRq', 'objects')], len(parts))
+        self.assertGreater(counters[('LightPartListRq', 'bytes_sent')], 4)
+        self.assertGreater(
+            counters[('LightPartListRq', 'bytes_received')], 4)
+
+    def test_bytes_received(self):
+        self.fishbowl.write_message(
+            xmlrequests.SimpleRequest('UOMRq', key=self.fishbowl.key))
+        response = self.fishbowl.receive_message()
+        self.assertEqual(
+            self.metrics.counters[('UOMRq', 'bytes_received')],
+            len(response) + 4)
+
+    def test_query_objects(self):
+        customers = self.fishbowl.get_customers_fast(populate_addresses=False)
+        self.assertEqual(
+            self.metrics.counters[('ExecuteQueryRq', 'objects')],
+            len(customers))
+
+    def test_hydrate(self):
+        customers = self.fishbowl.get_customers(lazy=False)
+        self.assertEqual(
+            self.metrics.counters[('CustomerGetRq', 'objects')],
+            len(customers))
+        self.assertEqual(self.phases('CustomerGetRq')['parse'], 1)
+
+    def test_pool_shares_metrics(self):
+        with self.server.pool(size=2, metrics=self.metrics) as pool:
+            pool.map(lambda fishbowl, _: fishbowl.get_uom_map(), range(4))
+        self.assertEqual(self.metrics.counters[('UOMRq', 'requests')], 4)
+        self.assertEqual(self.metrics.counters[('LoginRq', 'requests')], 3)
+
+    def test_no_metrics(self):
+        fishbowl = self.server.connect()
+        self.addCleanup(fishbowl.close)
+        self.assertEqual(len(fishbowl.get_parts()), 20)
+        self.assertIsNone(fishbowl._message_tag)
@@ -0,0 +1,150 @@
+from __future__ import unicode_literals
+from unittest import TestCase
+from decimal import Decimal
+import re
+import sqlite3
+import threading
+
+try:
+    from unittest import mock
+except ImportError:   # < Python 3.3
+    import mock
+
+from fishbowl import api, mirror, pool
+
+TABLES = {
+    'UOM': [{'ID': '1', 'NAME': 'Each', 'CODE': 'ea'}],
+    'PART': [{
+        'ID': '20', 'NUM': 'B201', 'STDCOST': '0.75', 'TYPEID': '10',
+        'DATELASTMODIFIED': '2016-03-04 05:06:07.0'}],
+    'PRODUCT': [{
+        'ID': '10', 'PARTID': '20', 'NUM': 'B201', 'PRICE': '1.50',
+        'UOMID': '1', 'DATELASTMODIFIED': '2016-03-04 05:06:07.0'}],
+    'CUSTOMER': [{
+        'ID': '7', 'ACCOUNTID': '7', 'NAME': 'Sam Ball',
+        'DATELASTMODIFIED': '2016-03-04 05:06:07.0'}],
+    'COUNTRYCONST': [{'ID': '2', 'NAME': 'USA', 'ABBREVIATION': 'US'}],
+    'STATECONST': [{'ID': '3', 'NAME': 'Utah', 'CODE': 'UT'}],
+    'ADDRESS': [{
+        'ID': '4', 'ACCOUNTID': '7', 'CITY': 'Murray', 'COUNTRYID': '2',
+        'STATEID': '3'}],
+    'PRICINGRULE': [{
+        'ID': '5', 'ISACTIVE': '1', 'PRODUCTINCLID': '10',
+        'PRODUCTINCLTYPEID': '2', 'PATYPEID': '1', 'PAPERCENT': '0.1',
+        'PABASEAMOUNTTYPEID': '1', 'PAAMOUNT': '0',
+        'CUSTOMERINCLTYPEID': '3', 'CUSTOMERINCLID': '8'}],
+    'ACCOUNTGROUP': [{'ID': '8', 'NAME': 'Wholesale'}],
+    'ACCOUNTGROUPRELATION': [{'ID': '9', 'GROUPID': '8', 'ACCOUNTID': '7'}],
+}
+
+
+class FakeFishbowl(object):
+    """
+    Serves whole tables from ``TABLES``, or raises if ``offline`` is set.
+    """
+    offline = False
+    connected = True
+
+    def close(self, skip_errors=False):
+        self.connected = False
+
+    def table_columns(self, table):
+        if self.offline:
+            raise api.FishbowlConnectionError('Connection timeout')
+        return list(TABLES[table][0])
+
+    def iter_query(self, query, types=None, tuples=False):
+        table = re.search(r'FROM (\w+)', query).group(1)
+        if query.startswith('SELECT COUNT(*)'):
+            return [(str(len(TABLES[table])),)]
+        return [dict(row) for row in TABLES[table]]
+
+
+class FakePool(pool.FishbowlPool):
+
+    def create(self):
+        return FakeFishbowl()
+
+
+class MirrorTest(TestCase):
+
+    def setUp(self):
+        self.fishbowl = FakeFishbowl()
+        self.clock = [1000]
+        self.mirror = mirror.Mirror(
+            self.fishbowl, clock=lambda: self.clock[0])
+        self.mirror.refresh()
+
+    def tearDown(self):
+        self.mirror.close()
+
+    def test_products(self):
+        product, = self.mirror.get_products()
+        self.assertEqual(product['Num'], 'B201')
+        self.assertEqual(product['Price'], Decimal('1.50'))
+        self.assertEqual(product['UOM']['Code'], 'ea')
+        self.assertEqual(product.part['StandardCost'], Decimal('0.75'))
+
+    def test_customers(self):
+        customer, = self.mirror.get_customers(populate_pricing_rules=True)
+        self.assertEqual(customer['Name'], 'Sam Ball')
+        address, = customer['Addresses']
+        self.assertEqual(address['City'], 'Murray')
+        self.assertEqual(address['State']['Code'], 'UT')
+        rule, = customer['PricingRules']
+        self.assertEqual(rule['ACCOUNTGROUPNAME'], 'Wholesale')
+
+    def test_indexes(self):
+        indexes = set(row['NAME'] for row in self.mirror.query(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"))
+        self.assertTrue(set(['ix_PRODUCT_NUM', 'ix_CUSTOMER_NAME']) <= indexes)
+
+    def test_refresh_if_due(self):
+        self.assertFalse(self.mirror.refresh_if_due())
+        self.clock[0] += self.mirror.refresh_interval
+        self.assertTrue(self.mirror.refresh_if_due())
+
+    def test_offline(self):
+        self.fishbowl.offline = True
+        self.clock[0] += self.mirror.refresh_interval
+        self.assertFalse(self.mirror.refresh_if_due())
+        self.assertEqual(len(self.mirror.get_customers()), 1)
+
+    def test_start_needs_pool(self):
+        self.assertRaises(ValueError, self.mirror.start)
+
+
+class PoolMirrorTest(TestCase):
+
+    def setUp(self):
+        self.pool = FakePool(
+            username='test', password='password', size=1,
+            check_interval=None)
+        self.addCleanup(self.pool.close)
+        self.mirror = mirror.Mirror(self.pool, refresh_interval=0.01)
+        self.addCleanup(self.mirror.close)
+
+    def test_refresh(self):
+        self.mirror.refresh()
+        self.assertEqual(len(self.mirror.get_products()), 1)
+        self.assertIsNone(self.mirror.engine.fishbowl)
+        self.assertEqual(len(self.pool.idle), 1)
+
+    def test_background_errors(self):
+        refreshed = threading.Event()
+        calls = []
+
+        def sync(names):
+            calls.append(self.mirror.engine.fishbowl)
+            if len(calls) == 1:
+                raise sqlite3.OperationalError('database is locked')
+            refreshed.set()
+            return []
+
+        with mock.patch.object(self.mirror.engine, 'sync', sync), \
+                mock.patch.object(mirror.logger, 'exception') as exception:
+            self.mirror.start()
+            self.assertTrue(refreshed.wait(5))
+            self.mirror.stop()
+        self.assertEqual(exception.call_count, 1)
+        self.assertIsInstance(calls[0], FakeFishbowl)
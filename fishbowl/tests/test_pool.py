@@ -0,0 +1,129 @@
+from __future__ import unicode_literals
+from unittest import TestCase
+import threading
+
+from fishbowl import api, cache, pool
+
+try:
+    from unittest import mock
+except ImportError:   # < Python 3.3
+    import mock
+
+
+class FakeFishbowl(api.Fishbowl):
+    logins = 0
+    lock = threading.Lock()
+
+    def connect(self, username, password, host=None, port=None, timeout=5):
+        with self.lock:
+            FakeFishbowl.logins += 1
+        self.stream = mock.MagicMock()
+        self.key = 'ABC'
+        self._connected = True
+
+
+class FakePool(pool.FishbowlPool):
+    fishbowl_class = FakeFishbowl
+
+
+class PoolTest(TestCase):
+
+    def setUp(self):
+        FakeFishbowl.logins = 0
+
+    def make_pool(self, **kwargs):
+        return FakePool(username='test', password='password', **kwargs)
+
+    def test_initial_logins(self):
+        fishbowl_pool = self.make_pool(size=3)
+        self.assertEqual(FakeFishbowl.logins, 3)
+        self.assertEqual(len(fishbowl_pool.idle), 3)
+
+    def test_session_reused(self):
+        fishbowl_pool = self.make_pool(size=2, initial=0)
+        with fishbowl_pool.session() as fishbowl:
+            self.assertTrue(fishbowl.connected)
+        with fishbowl_pool.session() as second:
+            self.assertIs(second, fishbowl)
+        self.assertEqual(FakeFishbowl.logins, 1)
+
+    def test_size_limit(self):
+        fishbowl_pool = self.make_pool(size=1)
+        with fishbowl_pool.session():
+            self.assertRaises(
+                pool.FishbowlPoolError, fishbowl_pool.acquire, timeout=0.01)
+        self.assertEqual(FakeFishbowl.logins, 1)
+
+    def test_discard_on_connection_error(self):
+        fishbowl_pool = self.make_pool(size=1)
+        with self.assertRaises(api.FishbowlTimeoutError):
+            with fishbowl_pool.session() as fishbowl:
+                raise api.FishbowlTimeoutError()
+        self.assertFalse(fishbowl.connected)
+        self.assertEqual(fishbowl_pool.count, 0)
+        with fishbowl_pool.session() as second:
+            self.assertIsNot(second, fishbowl)
+
+    def test_keep_on_other_error(self):
+        fishbowl_pool = self.make_pool(size=1)
+        with self.assertRaises(api.FishbowlError):
+            with fishbowl_pool.session() as fishbowl:
+                raise api.FishbowlError()
+        with fishbowl_pool.session() as second:
+            self.assertIs(second, fishbowl)
+
+    def test_health_check(self):
+        health_check = mock.Mock(side_effect=api.FishbowlError())
+        fishbowl_pool = self.make_pool(
+            size=1, check_interval=0, health_check=health_check)
+        first = fishbowl_pool.idle[0][0]
+        with fishbowl_pool.session() as fishbowl:
+            self.assertIsNot(fishbowl, first)
+        health_check.assert_called_with(first)
+        self.assertFalse(first.connected)
+
+    def test_default_health_check_bypasses_cache(self):
+        fishbowl = FakeFishbowl(cache=cache.ResponseCache())
+        fishbowl.connect('test', 'password')
+        fishbowl.cache.set('UOMRq', None, api.etree.fromstring(
+            b'<FbiXml><FbiMsgsRs statusCode="1000"><UOMRs statusCode="1000"/>'
+            b'</FbiMsgsRs></FbiXml>'))
+        fishbowl.send_message = mock.Mock(
+            side_effect=api.FishbowlConnectionError())
+        with self.assertRaises(api.FishbowlConnectionError):
+            pool.default_health_check(fishbowl)
+
+    def test_close(self):
+        fishbowl_pool = self.make_pool(size=2)
+        fishbowl = fishbowl_pool.acquire()
+        fishbowl_pool.close()
+        self.assertEqual(fishbowl_pool.idle, [])
+        fishbowl_pool.release(fishbowl)
+        self.assertFalse(fishbowl.connected)
+        self.assertEqual(fishbowl_pool.count, 0)
+        self.assertRaises(pool.FishbowlPoolError, fishbowl_pool.acquire)
+
+    def test_map(self):
+        fishbowl_pool = self.make_pool(size=3)
+        sessions = set()
+
+        def func(fishbowl, item):
+            sessions.add(fishbowl)
+            return item * 2
+
+        self.assertEqual(
+            fishbowl_pool.map(func, range(20)), list(range(0, 40, 2)))
+        self.assertTrue(sessions <= set(
+            fishbowl for fishbowl, last_used in fishbowl_pool.idle))
+
+    def test_map_error(self):
+        fishbowl_pool = self.make_pool(size=2)
+
+        def func(fishbowl, item):
+            if item == 3:
+                raise api.FishbowlError('Bad item')
+            return item
+
+        self.assertRaises(
+            api.FishbowlError, fishbowl_pool.map, func, range(10))
+        self.assertEqual(len(fishbowl_pool.idle), 2)
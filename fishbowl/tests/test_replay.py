@@ -0,0 +1,101 @@
+from __future__ import unicode_literals
+from unittest import TestCase
+import gzip
+import os
+import shutil
+import tempfile
+
+from fishbowl import api, replay
+from fishbowl.fakeserver import FakeFishbowlServer
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class ReplayTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'session.fbrec')
+        self.server = FakeFishbowlServer(records=20)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+    def record(self, func):
+        recorder = replay.Recorder(self.path)
+        fishbowl = self.server.connect(api.Fishbowl(recorder=recorder))
+        try:
+            return func(fishbowl)
+        finally:
+            fishbowl.close()
+            recorder.close()
+
+    def test_record_and_replay(self):
+        def load(fishbowl):
+            return [
+                customer.squash()
+                for customer in fishbowl.get_customers_fast()]
+
+        recorded = self.record(load)
+        exchanges = replay.read_archive(self.path)
+        self.assertEqual(len(exchanges), 9)
+        self.assertIn(
+            b'<UserPassword></UserPassword>', exchanges[0].request)
+        self.assertTrue(all(
+            exchange.wait >= 0 and exchange.duration >= 0
+            for exchange in exchanges))
+
+        self.server.stop()
+        fishbowl = replay.ReplayFishbowl(self.path, speed=None)
+        fishbowl.connect('admin', 'other')
+        self.assertEqual(fishbowl.key, FakeFishbowlServer.key)
+        self.assertEqual(load(fishbowl), recorded)
+        self.assertRaises(api.FishbowlError, fishbowl.get_uom_map)
+
+    def test_pool(self):
+        def load(fishbowl):
+            with self.server.pool(size=2, recorder=fishbowl.recorder) as pool:
+                return fishbowl.get_products_fast(page_size=5, pool=pool)
+
+        recorded = self.record(load)
+        self.server.stop()
+        fishbowl = replay.ReplayFishbowl(self.path, speed=None)
+        fishbowl.connect('admin', 'admin')
+        with replay.ReplayPool(fishbowl.archive, speed=None, size=2) as pool:
+            products = fishbowl.get_products_fast(page_size=5, pool=pool)
+        self.assertEqual(
+            [product['Num'] for product in products],
+            [product['Num'] for product in recorded])
+
+    def test_timing(self):
+        archive = replay.ReplayArchive([
+            replay.Exchange(b'<a/>', b'0123456789', 2.0, 4.0)])
+        clock = FakeClock()
+        stream = replay.ReplayStream(
+            archive, speed=2.0, clock=clock, sleep=clock.sleep)
+        stream.sendall(b'\0\0\0\4<a/>')
+        # Nothing arrives for the first second (the wait, at double speed).
+        self.assertEqual(len(stream.recv(100)), 1)
+        self.assertEqual(clock.now, 1.0)
+        # Then the frame arrives steadily over the next two seconds.
+        clock.now = 2.0
+        self.assertEqual(len(stream.recv(100)), 6)
+        clock.now = 3.0
+        self.assertEqual(stream.recv(100), b'3456789')
+
+    def test_not_a_recording(self):
+        with gzip.open(self.path, 'wb') as f:
+            f.write(b'nonsense')
+        self.assertRaises(api.FishbowlError, replay.read_archive, self.path)
@@ -0,0 +1,103 @@
+from __future__ import unicode_literals
+from unittest import TestCase
+import datetime
+
+from fishbowl import objects, sync
+
+
+class FakeFishbowl(object):
+    """
+    Serves the rows of one table, recording the queries sent.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def table_columns(self, table):
+        return ['ID', 'ACCOUNTID', 'NAME', 'DATELASTMODIFIED', 'URL']
+
+    def iter_query(self, query, types=None, tuples=False):
+        self.queries.append(query)
+        if query.startswith('SELECT COUNT(*)'):
+            return [(str(len(self.rows)),)]
+        if query.startswith('SELECT ID FROM'):
+            return [(row['ID'],) for row in self.rows]
+        rows = self.rows
+        if ' >= ' in query:
+            since = query.split("'")[1]
+            rows = [row for row in rows if row['DATELASTMODIFIED'] >= since]
+        return [dict(row) for row in rows]
+
+
+def customer(id, name, modified):
+    return {
+        'ID': str(id), 'ACCOUNTID': str(id + 10), 'NAME': name,
+        'DATELASTMODIFIED': modified}
+
+
+class SyncTest(TestCase):
+
+    def setUp(self):
+        self.fishbowl = FakeFishbowl([
+            customer(1, 'Sam', '2016-03-04 05:06:07.0'),
+            customer(2, 'Jen', '2016-03-05 00:00:00.0'),
+        ])
+        self.engine = sync.SyncEngine(self.fishbowl, entities=[
+            sync.Entity('customers', 'CUSTOMER', objects.Customer)])
+
+    def test_initial_sync(self):
+        result, = self.engine.sync()
+        self.assertEqual(result, sync.SyncResult(
+            'customers', 2, 0, datetime.datetime(2016, 3, 5)))
+        self.assertEqual(self.fishbowl.queries, [
+            'SELECT ID, ACCOUNTID, NAME, DATELASTMODIFIED, URL '
+            'FROM CUSTOMER'])
+        self.assertEqual(
+            sorted(customer['Name'] for customer in
+                   self.engine.objects('customers')),
+            ['Jen', 'Sam'])
+
+    def test_incremental_sync(self):
+        self.engine.sync()
+        self.fishbowl.rows[0] = customer(1, 'Samuel', '2016-03-06 09:00:00.0')
+        self.fishbowl.queries = []
+        result, = self.engine.sync()
+        self.assertEqual(result.changed, 2)
+        self.assertEqual(result.watermark, datetime.datetime(2016, 3, 6, 9))
+        self.assertEqual(self.fishbowl.queries, [
+            'SELECT ID, ACCOUNTID, NAME, DATELASTMODIFIED, URL '
+            "FROM CUSTOMER WHERE DATELASTMODIFIED >= '2016-03-05 00:00:00'",
+            'SELECT COUNT(*) FROM CUSTOMER',
+        ])
+        self.assertEqual(
+            self.engine.store.get('customers', 1)['NAME'], 'Samuel')
+
+    def test_deletions(self):
+        self.engine.sync()
+        del self.fishbowl.rows[0]
+        self.fishbowl.rows.append(customer(3, 'Max', '2016-03-07 00:00:00'))
+        result, = self.engine.sync()
+        # Jen is fetched again, being modified at the high-water mark.
+        self.assertEqual((result.changed, result.deleted), (2, 1))
+        self.assertEqual(self.engine.store.keys('customers'), set([2, 3]))
+        self.assertEqual(
+            self.fishbowl.queries[-1], 'SELECT ID FROM CUSTOMER')
+
+    def test_no_deletions(self):
+        self.engine.sync()
+        result, = self.engine.sync()
+        self.assertEqual(result.deleted, 0)
+        # The ids are only fetched if the row counts differ.
+        self.assertEqual(
+            self.fishbowl.queries[-1], 'SELECT COUNT(*) FROM CUSTOMER')
+
+    def test_full_reload(self):
+        engine = sync.SyncEngine(self.fishbowl, entities=[
+            sync.Entity('customers', 'CUSTOMER', modified=None)])
+        engine.sync()
+        del self.fishbowl.rows[0]
+        result, = engine.sync()
+        self.assertEqual(result, sync.SyncResult('customers', 1, 1, None))
+        self.assertEqual(self.fishbowl.queries, [
+            'SELECT * FROM CUSTOMER', 'SELECT * FROM CUSTOMER'])
@@ -0,0 +1,152 @@
+from __future__ import unicode_literals
+from unittest import TestCase, skipUnless
+import os
+import shutil
+import socket
+import struct
+import tempfile
+
+try:
+    from unittest import mock
+except ImportError:   # < Python 3.3
+    import mock
+
+from fishbowl import api, transport
+from fishbowl.fakeserver import FakeFishbowlServer
+
+
+class FakeStream(object):
+    """
+    A stream whose ``sendmsg`` writes at most ``limit`` bytes per call.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.data = bytearray()
+        self.sendmsg_calls = 0
+
+    def sendmsg(self, buffers):
+        self.sendmsg_calls += 1
+        data = b''.join(bytes(buffer) for buffer in buffers)[:self.limit]
+        self.data.extend(data)
+        return len(data)
+
+    def sendall(self, data):
+        self.data.extend(data)
+
+
+class SendFrameTest(TestCase):
+
+    def frame(self, body):
+        return struct.pack('>L', len(body)) + body
+
+    def test_sendmsg(self):
+        stream = FakeStream()
+        self.assertEqual(transport.send_frame(stream, b'<a/>'), 8)
+        self.assertEqual(bytes(stream.data), self.frame(b'<a/>'))
+        self.assertEqual(stream.sendmsg_calls, 1)
+
+    def test_partial_sendmsg(self):
+        for limit in (0, 2, 4, 6):
+            stream = FakeStream(limit)
+            transport.send_frame(stream, b'<abc/>')
+            self.assertEqual(bytes(stream.data), self.frame(b'<abc/>'))
+
+    def test_sendall(self):
+        stream = mock.Mock(spec=['sendall'])
+        transport.send_frame(stream, b'<a/>')
+        stream.sendall.assert_called_once_with(self.frame(b'<a/>'))
+
+    def test_sendmsg_not_implemented(self):
+        stream = mock.Mock(spec=['sendmsg', 'sendall'])
+        stream.sendmsg.side_effect = NotImplementedError
+        transport.send_frame(stream, b'<a/>')
+        stream.sendall.assert_called_once_with(self.frame(b'<a/>'))
+
+
+class TCPTransportTest(TestCase):
+
+    def test_socket_options(self):
+        with FakeFishbowlServer(records=1) as server:
+            fishbowl = server.connect()
+            try:
+                stream = fishbowl.stream
+                self.assertTrue(stream.getsockopt(
+                    socket.IPPROTO_TCP, socket.TCP_NODELAY))
+                self.assertTrue(stream.getsockopt(
+                    socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+                if hasattr(socket, 'TCP_KEEPIDLE'):
+                    self.assertEqual(stream.getsockopt(
+                        socket.IPPROTO_TCP, socket.TCP_KEEPIDLE), 60)
+                self.assertEqual(stream.gettimeout(), 30)
+            finally:
+                fishbowl.close()
+
+    def test_options_off(self):
+        stream = mock.Mock()
+        transport.TCPTransport(nodelay=False, keepalive=False).configure(
+            stream)
+        self.assertFalse(stream.setsockopt.called)
+
+    def test_connection_refused(self):
+        with FakeFishbowlServer(records=1) as server:
+            port = server.port
+        fishbowl = api.Fishbowl()
+        with self.assertRaises(api.FishbowlConnectionError):
+            fishbowl.connect('admin', 'admin', host='127.0.0.1', port=port)
+
+
+class TLSTransportTest(TestCase):
+
+    @mock.patch('fishbowl.transport.socket')
+    def test_wraps_socket(self, mock_socket):
+        context = mock.Mock()
+        tls = transport.TLSTransport(context=context)
+        stream = tls.connect('fishbowl.example.com', 28192, timeout=10)
+        raw = mock_socket.socket()
+        raw.settimeout.assert_called_with(10)
+        context.wrap_socket.assert_called_with(
+            raw, server_hostname='fishbowl.example.com')
+        self.assertIs(stream, context.wrap_socket())
+
+    @mock.patch('fishbowl.transport.socket')
+    def test_handshake_failure_closes(self, mock_socket):
+        context = mock.Mock()
+        context.wrap_socket.side_effect = socket.error('handshake failed')
+        tls = transport.TLSTransport(
+            context=context, server_hostname='proxy')
+        with self.assertRaises(socket.error):
+            tls.connect('10.0.0.1', 28192)
+        self.assertTrue(mock_socket.socket().close.called)
+
+
+@skipUnless(hasattr(socket, 'AF_UNIX'), 'Unix sockets are not supported')
+class UnixTransportTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'fishbowl.sock')
+
+    def test_session(self):
+        with FakeFishbowlServer(records=10, path=self.path) as server:
+            fishbowl = server.connect()
+            try:
+                self.assertEqual(fishbowl.stream.family, socket.AF_UNIX)
+                self.assertEqual(len(fishbowl.get_parts()), 10)
+            finally:
+                fishbowl.close()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_pool(self):
+        with FakeFishbowlServer(records=10, path=self.path) as server:
+            with server.pool(size=2) as pool:
+                self.assertEqual(
+                    pool.map(
+                        lambda fishbowl, _: len(fishbowl.get_uom_map()),
+                        range(3)),
+                    [5, 5, 5])
+
+    def test_address(self):
+        unix = transport.UnixTransport(self.path)
+        self.assertEqual(unix.address('localhost', 28192), self.path)
@@ -0,0 +1,124 @@
+from __future__ import unicode_literals
+from unittest import TestCase
+import logging
+
+try:
+    from unittest import mock
+except ImportError:   # < Python 3.3
+    import mock
+
+from fishbowl import api, wirelog
+from fishbowl.fakeserver import FakeFishbowlServer
+
+
+class FormatTest(TestCase):
+
+    def test_redact(self):
+        request = (
+            b'<LoginRq><UserName>admin</UserName>'
+            b'<UserPassword>c2VjcmV0</UserPassword></LoginRq>')
+        self.assertEqual(
+            wirelog.redact(request),
+            b'<LoginRq><UserName>admin</UserName>'
+            b'<UserPassword></UserPassword></LoginRq>')
+        other = b'<UOMRq></UOMRq>'
+        self.assertIs(wirelog.redact(other), other)
+
+    def test_format_payload(self):
+        self.assertEqual(
+            wirelog.format_payload(bytearray(b'<a>\xe9</a>'), 'latin-1'),
+            '<a>\xe9</a>')
+        self.assertEqual(
+            wirelog.format_payload(b'0123456789', 'latin-1', limit=4),
+            '0123... (6 more bytes)')
+        self.assertEqual(
+            wirelog.format_payload(b'0123', 'latin-1', limit=4), '0123')
+
+
+class WireLogTest(TestCase):
+
+    def test_ring_buffer(self):
+        wire_log = wirelog.WireLog(size=2, clock=lambda: 0)
+        for number in range(3):
+            record = wire_log.request('UOMRq', '{}'.format(number).encode())
+            wire_log.response(record, b'response')
+        self.assertEqual(len(wire_log), 2)
+        self.assertEqual(
+            [record.request for record in wire_log.records], [b'1', b'2'])
+
+    def test_format(self):
+        wire_log = wirelog.WireLog(clock=lambda: 0)
+        record = wire_log.request('UOMRq', b'request')
+        wire_log.response(record, bytearray(b'response'))
+        wire_log.request('PartGetRq', b'0123456789')
+        self.assertEqual(wire_log.format(limit=8).splitlines(), [
+            '--- UOMRq sent 1970-01-01T00:00:00Z',
+            'request',
+            '--- response',
+            'response',
+            '--- PartGetRq sent 1970-01-01T00:00:00Z',
+            '01234567... (2 more bytes)',
+            '--- no response',
+        ])
+
+    def test_dump(self):
+        wire_log = wirelog.WireLog(dump_limit=3, clock=lambda: 0)
+        with mock.patch.object(wirelog.logger, 'error') as error:
+            wire_log.dump()
+            self.assertFalse(error.called)
+            wire_log.request('UOMRq', b'request')
+            wire_log.dump(ValueError('bad'))
+        message = error.call_args[0][0]
+        self.assertTrue(message.startswith(
+            "Last 1 messages before ValueError('bad'"))
+        self.assertIn('req... (4 more bytes)', message)
+
+
+class FishbowlWireLogTest(TestCase):
+
+    def setUp(self):
+        self.server = FakeFishbowlServer(records=5)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.wire_log = wirelog.WireLog()
+        self.fishbowl = self.server.connect(
+            api.Fishbowl(wire_log=self.wire_log))
+        self.addCleanup(self.fishbowl.close)
+
+    def test_login_redacted(self):
+        record = self.wire_log.records[0]
+        self.assertEqual(record.tag, 'LoginRq')
+        self.assertIn(b'<UserPassword></UserPassword>', record.request)
+        self.assertIn(b'<Key>', bytes(record.response))
+
+    def test_streamed_response_kept(self):
+        parts = self.fishbowl.get_parts(populate_uoms=False)
+        self.assertEqual(len(parts), 5)
+        record = self.wire_log.records[-1]
+        self.assertEqual(record.tag, 'LightPartListRq')
+        self.assertEqual(bytes(record.response).count(b'<LightPart>'), 5)
+
+    def test_dumped_once_on_error(self):
+        with mock.patch.object(wirelog.logger, 'error') as error:
+            with self.assertRaises(api.FishbowlError):
+                self.fishbowl.send_request(
+                    'BogusRq', response_node_name='BogusRs')
+        self.assertEqual(error.call_count, 1)
+        self.assertIn('--- BogusRq sent', error.call_args[0][0])
+
+    def test_debug_log_truncated(self):
+        self.fishbowl.log_payload_size = 10
+        logger = logging.getLogger('fishbowl.api')
+        with mock.patch.object(logger, 'isEnabledFor', return_value=True), \
+                mock.patch.object(logger, 'debug') as debug:
+            self.fishbowl.get_uom_map()
+        sent, received = [call[0][0] for call in debug.call_args_list]
+        self.assertTrue(sent.startswith('Sending message:\n<FbiXml><'))
+        self.assertIn('more bytes)', sent)
+        self.assertIn('more bytes)', received)
+
+    def test_debug_log_skipped(self):
+        with mock.patch.object(wirelog, 'format_payload') as format_payload, \
+                mock.patch.object(api, 'format_payload', format_payload):
+            self.fishbowl.get_uom_map()
+        self.assertFalse(format_payload.called)
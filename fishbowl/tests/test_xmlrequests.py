@@ -0,0 +1,75 @@
+from __future__ import unicode_literals
+from unittest import TestCase
+import datetime
+
+from lxml import etree
+
+from fishbowl import xmlrequests
+
+
+def tree_request(request_tag, elements, key='ABC'):
+    # Build the request as an lxml tree, for comparison.
+    request = xmlrequests.Request(key)
+    el = request.add_request_element(request_tag)
+    request.add_elements(el, elements)
+    return request
+
+
+def canonical(xml):
+    parser = etree.XMLParser(remove_blank_text=True)
+    return etree.tostring(etree.fromstring(xml, parser))
+
+
+class TemplateRequestTest(TestCase):
+
+    def test_matches_tree(self):
+        request = xmlrequests.AddInventory(
+            'B<&>', 1.5, 1, 10, 386, note='Caf\xe9\r\n', key='k&y')
+        expected = tree_request('AddInventoryRq', [
+            ('PartNum', 'B<&>'), ('Quantity', 1.5), ('UOMID', 1),
+            ('Cost', 10), ('Note', 'Caf\xe9\r\n'), ('Tracking', ''),
+            ('LocationTagNum', 386), ('TagNum', '0'),
+        ], key='k&y')
+        self.assertEqual(
+            canonical(request.request), canonical(expected.request))
+        root = etree.fromstring(request.request)
+        self.assertEqual(
+            root.findtext('FbiMsgsRq/AddInventoryRq/Note'), 'Caf\xe9\r\n')
+        self.assertEqual(request.request_tag, 'AddInventoryRq')
+        self.assertTrue(request.request.startswith(
+            b'<FbiXml><Ticket><Key>k&amp;y</Key></Ticket><FbiMsgsRq>'))
+
+    def test_simple_request(self):
+        when = datetime.datetime(2020, 1, 2, 3, 4, 5)
+        request = xmlrequests.SimpleRequest(
+            'ExecuteQueryRq', {'Query': 'SELECT 1', 'When': when, 'N': None},
+            key='ABC')
+        el = etree.fromstring(request.request).find(
+            'FbiMsgsRq/ExecuteQueryRq')
+        self.assertEqual(el.findtext('Query'), 'SELECT 1')
+        self.assertEqual(el.findtext('When'), '2020-01-02T03:04:05')
+        self.assertEqual(el.findtext('N'), '')
+        request = xmlrequests.SimpleRequest('PartGetRq', 5, key='ABC')
+        self.assertEqual(request.body, b'<PartGetRq>5</PartGetRq>')
+        self.assertRaises(TypeError, xmlrequests.SimpleRequest, 'UOMRq')
+
+    def test_tree_built_on_use(self):
+        request = xmlrequests.SimpleRequest('UOMRq', key='ABC')
+        etree.SubElement(request.el_request, 'CustomerGetRq')
+        self.assertEqual(
+            [el.tag for el in etree.fromstring(request.request)[1]],
+            ['UOMRq', 'CustomerGetRq'])
+
+    def test_batch(self):
+        batch = xmlrequests.BatchRequest([
+            xmlrequests.CycleCount('A', 1, 2, key='ABC'),
+            xmlrequests.ImportRequest('ImportPart', ['Num'], key='ABC'),
+        ], key='ABC')
+        self.assertEqual(batch.request_tag, 'CycleCountRq')
+        root = etree.fromstring(batch.request)
+        self.assertEqual(root.findtext('Ticket/Key'), 'ABC')
+        self.assertEqual(
+            [el.tag for el in root.find('FbiMsgsRq')],
+            ['CycleCountRq', 'ImportRq'])
+        self.assertEqual(
+            root.findtext('FbiMsgsRq/ImportRq/Rows/Row'), 'Num')
@@ -0,0 +1,181 @@
+"""
+The connections a :cls:`fishbowl.api.Fishbowl` session talks to the server
+over.
+
+A transport opens a socket-like stream for :meth:`Fishbowl.make_stream`.
+:cls:`TCPTransport` (the default) connects straight to the server,
+:cls:`TLSTransport` wraps the connection in TLS and :cls:`UnixTransport`
+connects to a Unix socket, such as that of a local relay.
+
+Example usage::
+
+    fishbowl = Fishbowl(transport=UnixTransport('/run/fishbowl-relay.sock'))
+    fishbowl.connect(username='admin', password='admin')
+
+Any object with an ``address(host, port)`` method describing where it
+connects, and a ``connect(host, port, timeout)`` method returning a stream
+with ``sendall``, ``recv_into``, ``settimeout`` and ``close`` methods, can be
+used as a transport.
+"""
+from __future__ import unicode_literals
+import logging
+import socket
+import struct
+
+try:
+    import ssl
+except ImportError:
+    ssl = None
+
+logger = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct('>L')
+
+
+def send_frame(stream, body):
+    """
+    Write a length-prefixed frame to a stream.
+
+    Where the stream has ``sendmsg`` (sockets on Python 3, other than TLS
+    sockets), the header and body are written together without joining
+    them, and anything a partial write missed is sent with ``sendall``.
+    Otherwise they are joined and written with ``sendall``.
+
+    :returns: The number of bytes written
+    """
+    header = FRAME_HEADER.pack(len(body))
+    sendmsg = getattr(stream, 'sendmsg', None)
+    if sendmsg is not None:
+        try:
+            sent = sendmsg([header, body])
+        except NotImplementedError:
+            pass
+        else:
+            if sent < len(header):
+                stream.sendall(header[sent:])
+                sent = len(header)
+            if sent - len(header) < len(body):
+                stream.sendall(memoryview(body)[sent - len(header):])
+            return len(header) + len(body)
+    stream.sendall(header + body)
+    return len(header) + len(body)
+
+
+class TCPTransport(object):
+    """
+    Connects over TCP, with Nagle's algorithm off (each message is sent as
+    soon as it is written) and keepalive probes on idle connections.
+    """
+
+    def __init__(
+            self, nodelay=True, keepalive=True, keepalive_idle=60,
+            keepalive_interval=10, keepalive_count=5):
+        """
+        :param nodelay: Set ``TCP_NODELAY`` (default ``True``)
+        :param keepalive: Set ``SO_KEEPALIVE`` (default ``True``)
+        :param keepalive_idle: Seconds a connection is idle before the
+            first probe, where the platform supports setting it
+        :param keepalive_interval: Seconds between probes, where supported
+        :param keepalive_count: Unanswered probes before the connection is
+            dropped, where supported
+        """
+        self.nodelay = nodelay
+        self.keepalive = keepalive
+        self.keepalive_idle = keepalive_idle
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_count = keepalive_count
+
+    def address(self, host, port):
+        return '{}:{}'.format(host, port)
+
+    def connect(self, host, port, timeout=5):
+        """
+        Open a connection to ``host`` and ``port``.
+        """
+        stream = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            stream.connect((host, port))
+            self.configure(stream)
+        except Exception:
+            stream.close()
+            raise
+        stream.settimeout(timeout)
+        return stream
+
+    def configure(self, stream):
+        """
+        Set the socket options of a connected socket.
+        """
+        if self.nodelay:
+            stream.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if not self.keepalive:
+            return
+        stream.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for name, value in (
+                ('TCP_KEEPIDLE', self.keepalive_idle),
+                ('TCP_KEEPINTVL', self.keepalive_interval),
+                ('TCP_KEEPCNT', self.keepalive_count)):
+            option = getattr(socket, name, None)
+            if option is None or value is None:
+                continue
+            try:
+                stream.setsockopt(socket.IPPROTO_TCP, option, int(value))
+            except socket.error as e:
+                logger.debug('Could not set {}: {}'.format(name, e))
+
+
+class TLSTransport(TCPTransport):
+    """
+    Connects over TCP wrapped in TLS, for a server behind a TLS terminating
+    proxy.
+    """
+
+    def __init__(self, context=None, server_hostname=None, **kwargs):
+        """
+        :param context: An ``ssl.SSLContext`` (default
+            ``ssl.create_default_context()``, which checks the server's
+            certificate)
+        :param server_hostname: The host name to check the certificate
+            against (default the host connected to)
+
+        The other arguments are those of :cls:`TCPTransport`.
+        """
+        if ssl is None:
+            raise RuntimeError('TLS needs Python built with the ssl module')
+        TCPTransport.__init__(self, **kwargs)
+        self.context = context
+        self.server_hostname = server_hostname
+
+    def connect(self, host, port, timeout=5):
+        stream = TCPTransport.connect(self, host, port, timeout)
+        context = self.context
+        if context is None:
+            context = self.context = ssl.create_default_context()
+        try:
+            return context.wrap_socket(
+                stream, server_hostname=self.server_hostname or host)
+        except Exception:
+            stream.close()
+            raise
+
+
+class UnixTransport(object):
+    """
+    Connects to a Unix socket, ignoring the host and port.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def address(self, host, port):
+        return self.path
+
+    def connect(self, host, port, timeout=5):
+        stream = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            stream.connect(self.path)
+        except Exception:
+            stream.close()
+            raise
+        stream.settimeout(timeout)
+        return stream
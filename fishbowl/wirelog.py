@@ -0,0 +1,146 @@
+"""
+Diagnostics for the messages a Fishbowl session exchanges with the server.
+
+With the ``fishbowl.api`` logger at ``DEBUG``, each request and response is
+logged, cut to :attr:`fishbowl.api.Fishbowl.log_payload_size` bytes. At any
+other level the messages aren't decoded or copied at all.
+
+To keep diagnostics on in production, pass a :cls:`WireLog` to
+:cls:`fishbowl.api.Fishbowl` (or :cls:`fishbowl.pool.FishbowlPool`). It
+keeps the last few request/response pairs in full, in memory, and logs them
+as an error when a request fails.
+
+Example usage::
+
+    wire_log = WireLog(size=10)
+    fishbowl = Fishbowl(wire_log=wire_log)
+    fishbowl.connect(username='admin', password='admin')
+    ...
+    # Or at any time:
+    print(wire_log.format())
+
+Passwords are blanked out of login requests before they are logged or kept.
+"""
+from __future__ import unicode_literals
+import collections
+import datetime
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_RE = re.compile(br'<UserPassword>[^<]*</UserPassword>')
+
+
+def redact(request):
+    """
+    Blank out the password of a login request.
+    """
+    if b'<UserPassword>' not in request:
+        return request
+    return PASSWORD_RE.sub(b'<UserPassword></UserPassword>', bytes(request))
+
+
+def format_payload(data, encoding, limit=None):
+    """
+    Decode a message for logging, cut to at most ``limit`` bytes.
+    """
+    if limit is not None and len(data) > limit:
+        return '{}... ({} more bytes)'.format(
+            bytes(data[:limit]).decode(encoding, 'replace'),
+            len(data) - limit)
+    return bytes(data).decode(encoding, 'replace')
+
+
+class WireRecord(object):
+    """
+    A request and (once it arrives) its response.
+    """
+    __slots__ = ('tag', 'sent', 'request', 'response')
+
+    def __init__(self, tag, sent, request):
+        self.tag = tag
+        self.sent = sent
+        self.request = request
+        self.response = None
+
+
+class WireLog(object):
+    """
+    A ring buffer of the last ``size`` request/response pairs. One wire log
+    can be shared by several sessions (and threads).
+    """
+
+    def __init__(
+            self, size=20, encoding='latin-1', dump_limit=None,
+            clock=time.time):
+        """
+        :param size: How many pairs to keep
+        :param encoding: The encoding of the messages
+        :param dump_limit: Cut each message to this many bytes when the
+            pairs are logged on an error (default ``None``, in full)
+        """
+        self.records = collections.deque(maxlen=size)
+        self.encoding = encoding
+        self.dump_limit = dump_limit
+        self.clock = clock
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.records)
+
+    def request(self, tag, data):
+        """
+        Keep a request that has been sent.
+
+        :returns: A :cls:`WireRecord` to pass its response to
+            :meth:`response`
+        """
+        record = WireRecord(tag, self.clock(), redact(data))
+        with self.lock:
+            self.records.append(record)
+        return record
+
+    def response(self, record, data):
+        """
+        Keep the response to a request kept with :meth:`request`.
+        """
+        record.response = data
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+
+    def format(self, limit=None):
+        """
+        The kept pairs as text, oldest first, with each message cut to at
+        most ``limit`` bytes.
+        """
+        with self.lock:
+            records = list(self.records)
+        lines = []
+        for record in records:
+            sent = datetime.datetime.utcfromtimestamp(record.sent)
+            lines.append('--- {} sent {}Z'.format(
+                record.tag, sent.isoformat()))
+            lines.append(format_payload(record.request, self.encoding, limit))
+            if record.response is None:
+                lines.append('--- no response')
+            else:
+                lines.append('--- response')
+                lines.append(format_payload(
+                    record.response, self.encoding, limit))
+        return '\n'.join(lines)
+
+    def dump(self, error=None):
+        """
+        Log the kept pairs as an error.
+        """
+        if not self.records:
+            return
+        logger.error('Last {} messages{}:\n{}'.format(
+            len(self.records),
+            ' before {!r}'.format(error) if error is not None else '',
+            self.format(self.dump_limit)))
@@ -3,39 +3,100 @@ from __future__ import unicode_literals
 import datetime
 from lxml import etree
 from collections import OrderedDict
+from xml.sax.saxutils import escape
 
 import six
 
+# The start and end of every message, around its requests.
+ENVELOPE_START = '<FbiXml><Ticket><Key>{}</Key></Ticket><FbiMsgsRq>'
+ENVELOPE_END = b'</FbiMsgsRq></FbiXml>'
+
+# Carriage returns would be read back as newlines if left unescaped.
+ESCAPES = {'\r': '&#13;'}
+
+# Body templates of TemplateRequest, keyed by the request tag and the names
+# of its child elements.
+templates = {}
+
+
+def element_text(value):
+    """
+    Format a value as the text of an element.
+    """
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%dT%H:%M:%S")
+    return six.text_type(value)
+
+
+def xml_bytes(text):
+    """
+    Encode XML text as lxml does by default: ASCII, with character
+    references for anything else.
+    """
+    return text.encode('ascii', 'xmlcharrefreplace')
+
+
+def get_template(request_tag, names):
+    """
+    Return the body template of a request element with the given children (or
+    just text if ``names`` is ``None``), built on first use.
+    """
+    template = templates.get((request_tag, names))
+    if template is None:
+        if names is None:
+            inner = '{}'
+        else:
+            inner = ''.join('<{0}>{{}}</{0}>'.format(name) for name in names)
+        template = '<{0}>{1}</{0}>'.format(request_tag, inner)
+        template = templates.setdefault((request_tag, names), template)
+    return template
+
 
 class Request(object):
     key_required = True
 
     def __init__(self, key=''):
-        if self.key_required and not key:
-            raise TypeError(
-                "An API key was not provided (not enough arguments for {0} "
-                "request)".format(self.__class__.__name__))
+        self.check_key(key)
         self.el_root = etree.Element('FbiXml')
         el_ticket = etree.SubElement(self.el_root, 'Ticket')
         el_key = etree.SubElement(el_ticket, 'Key')
         el_key.text = key
         self.el_request = etree.SubElement(self.el_root, 'FbiMsgsRq')
 
+    def check_key(self, key):
+        if self.key_required and not key:
+            raise TypeError(
+                "An API key was not provided (not enough arguments for {0} "
+                "request)".format(self.__class__.__name__))
+
     @property
     def request(self):
         return etree.tostring(self.el_root, pretty_print=True)
 
+    @property
+    def request_tag(self):
+        """
+        The tag of the (first) request element, such as ``'LoginRq'``.
+        """
+        if len(self.el_request):
+            return self.el_request[0].tag
+        return None
+
+    @property
+    def body(self):
+        """
+        The serialized request elements, without the envelope around them.
+        """
+        return b''.join(
+            etree.tostring(el, with_tail=False) for el in self.el_request)
+
     def add_elements(self, parent, elements):
         if isinstance(elements, dict):
             elements = elements.items()
         for name, value in elements:
             el = etree.SubElement(parent, name)
             if value is not None:
-                if isinstance(value, datetime.datetime):
-                    value = value.strftime("%Y-%m-%dT%H:%M:%S")
-                else:
-                    value = str(value)
-                el.text = value
+                el.text = element_text(value)
 
     def add_request_element(self, name):
         return etree.SubElement(self.el_request, name)
@@ -98,31 +159,139 @@ class Request(object):
         return '%s' % value
 
 
-class Login(Request):
+class SerializedRequest(Request):
+    """
+    A request serialized straight to compact bytes, without building an lxml
+    tree. The tree is only built (by parsing the bytes) if :attr:`el_root` or
+    :attr:`el_request` is used, after which it is what gets serialized.
+
+    Subclasses implement :meth:`render_body`.
+    """
+    _el_root = None
+
+    def __init__(self, key=''):
+        self.check_key(key)
+        self.key = key
+
+    def render_body(self):
+        raise NotImplementedError
+
+    @property
+    def el_root(self):
+        if self._el_root is None:
+            self._el_root = etree.fromstring(self.request)
+        return self._el_root
+
+    @property
+    def el_request(self):
+        return self.el_root.find('FbiMsgsRq')
+
+    @property
+    def body(self):
+        if self._el_root is not None:
+            return Request.body.fget(self)
+        return self.render_body()
+
+    @property
+    def request(self):
+        if self._el_root is not None:
+            return etree.tostring(self._el_root)
+        return b''.join([
+            xml_bytes(ENVELOPE_START.format(
+                escape(self.key or '', ESCAPES))),
+            self.body,
+            ENVELOPE_END,
+        ])
+
+
+class TemplateRequest(SerializedRequest):
+    """
+    A request element containing either text or child elements of text,
+    serialized from a cached template.
+    """
+
+    def __init__(self, request_tag, elements=None, text=None, key=''):
+        """
+        :param request_tag: The tag of the request element
+        :param elements: A dictionary (or sequence of pairs) of child element
+            names and values. ``None`` values leave the element empty.
+        :param text: The text of the request element, if it has no children
+        """
+        SerializedRequest.__init__(self, key)
+        self._request_tag = request_tag
+        if isinstance(elements, dict):
+            elements = elements.items()
+        self.elements = list(elements or ())
+        self.text = text
+
+    @property
+    def request_tag(self):
+        if self._el_root is not None:
+            return Request.request_tag.fget(self)
+        return self._request_tag
+
+    def render_body(self):
+        if self.elements:
+            names = tuple(name for name, value in self.elements)
+            values = [
+                '' if value is None else escape(element_text(value), ESCAPES)
+                for name, value in self.elements]
+        else:
+            names = None
+            values = [
+                '' if self.text is None else
+                escape(element_text(self.text), ESCAPES)]
+        template = get_template(self._request_tag, names)
+        return xml_bytes(template.format(*values))
+
+
+class BatchRequest(SerializedRequest):
+    """
+    Several requests combined into a single ``FbiMsgsRq`` envelope.
+    """
+
+    def __init__(self, requests=(), key=''):
+        SerializedRequest.__init__(self, key)
+        self.requests = []
+        for request in requests:
+            self.add_request(request)
+
+    def add_request(self, request):
+        self.requests.append(request)
+
+    @property
+    def request_tag(self):
+        if self._el_root is not None:
+            return Request.request_tag.fget(self)
+        if self.requests:
+            return self.requests[0].request_tag
+        return None
+
+    def render_body(self):
+        return b''.join(request.body for request in self.requests)
+
+
+class Login(TemplateRequest):
     key_required = False
 
     def __init__(self, username, password, key=''):
-        Request.__init__(self, key)
-        el_rq = self.add_request_element('LoginRq')
-        self.add_elements(el_rq, {
-            'IAID': '22',
-            'IAName': 'PythonApp',
-            'IADescription': 'Connection for Python Wrapper',
-            'UserName': username,
-            'UserPassword': password,
-        })
+        TemplateRequest.__init__(self, 'LoginRq', [
+            ('IAID', '22'),
+            ('IAName', 'PythonApp'),
+            ('IADescription', 'Connection for Python Wrapper'),
+            ('UserName', username),
+            ('UserPassword', password),
+        ], key=key)
 
 
-class SimpleRequest(Request):
+class SimpleRequest(TemplateRequest):
 
     def __init__(self, request_name, value=None, key=''):
-        Request.__init__(self, key)
-        el = self.add_request_element(request_name)
-        if value is not None:
-            if isinstance(value, dict):
-                self.add_elements(el, value)
-            else:
-                el.text = str(value)
+        if isinstance(value, dict):
+            TemplateRequest.__init__(self, request_name, value, key=key)
+        else:
+            TemplateRequest.__init__(
+                self, request_name, text=value, key=key)
 
 
 class ImportRequest(Request):
@@ -142,35 +311,31 @@ class ImportRequest(Request):
         self.add_elements(self.el_rows, [('Row', row) for row in rows])
 
 
-class AddInventory(Request):
+class AddInventory(TemplateRequest):
 
     def __init__(
             self, partnum, qty, uomid, cost, loctagnum, note='', tracking='',
             key=''):
-        Request.__init__(self, key)
-        el_rq = self.add_request_element('AddInventoryRq')
-        self.add_elements(el_rq, {
-            'PartNum': partnum,
-            'Quantity': qty,
-            'UOMID': uomid,
-            'Cost': cost,
-            'Note': note,
-            'Tracking': tracking,
-            'LocationTagNum': loctagnum,
-            'TagNum': '0',
-        })
+        TemplateRequest.__init__(self, 'AddInventoryRq', [
+            ('PartNum', partnum),
+            ('Quantity', qty),
+            ('UOMID', uomid),
+            ('Cost', cost),
+            ('Note', note),
+            ('Tracking', tracking),
+            ('LocationTagNum', loctagnum),
+            ('TagNum', '0'),
+        ], key=key)
 
 
-class CycleCount(Request):
+class CycleCount(TemplateRequest):
 
     def __init__(self, partnum, qty, locationid, tracking='', key=''):
-        Request.__init__(self, key)
-        el_rq = self.add_request_element('CycleCountRq')
-        self.add_elements(el_rq, {
-            'PartNum': partnum,
-            'Quantity': qty,
-            'LocationID': locationid,
-        })
+        TemplateRequest.__init__(self, 'CycleCountRq', [
+            ('PartNum', partnum),
+            ('Quantity', qty),
+            ('LocationID', locationid),
+        ], key=key)
 
 
 class GetPOList(Request):
@@ -19,4 +19,5 @@ setup(
     license='MIT',
     packages=['fishbowl'],
     install_requires=['lxml', 'six'],
+    extras_require={'numpy': ['numpy']},
 )